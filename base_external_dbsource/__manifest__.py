@@ -3,7 +3,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 {
     'name': 'External Database Sources',
-    'version': '11.0.1.0.0',
+    'version': '11.0.1.5.0',
     'category': 'Tools',
     'author': "Daniel Reis, "
               "LasLabs, "
@@ -18,7 +18,10 @@
     ],
     'data': [
         'views/base_external_dbsource.xml',
+        'views/base_external_dbsource_sync.xml',
+        'views/base_external_dbsource_snapshot.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
     ],
     'demo': [
         'demo/base_external_dbsource.xml',
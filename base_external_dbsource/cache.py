@@ -0,0 +1,138 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import collections
+import sys
+import threading
+import time
+
+MISSING = object()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def freeze(value):
+    """ It returns a hashable equivalent of query parameters. """
+
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [freeze(v) for v in value]
+        if isinstance(value, (set, frozenset)):
+            items.sort(key=repr)
+        return type(value).__name__, tuple(items)
+    return value
+
+
+def estimate_size(rows):
+    """ It returns the approximate memory size of a list of rows. """
+
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class ResultCache(object):
+    """ It provides a thread-safe LRU cache with expiry and size bounds.
+
+    Limits are given on every ``set`` call, so that they always reflect the
+    current configuration of the data source the cache belongs to.
+    """
+
+    def __init__(self):
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ It returns the value cached for ``key``, or ``MISSING``. """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] and entry[0] < time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, ttl=0, max_entries=0, max_bytes=0, size=None):
+        """ It caches a value, evicting the least recently used ones.
+
+        Args:
+            key: (hashable) Cache key.
+            value: (mixed) Value to cache.
+            ttl: (int) Seconds the value is valid for, ``0`` for ever.
+            max_entries: (int) Maximum number of entries, ``0`` for no limit.
+            max_bytes: (int) Maximum size of the entries, ``0`` for no limit.
+            size: (int) Size of the value, estimated if not provided.
+        Returns:
+            (bool) Whether the value was cached.
+        """
+
+        if size is None:
+            size = estimate_size(value)
+        if max_bytes and size > max_bytes:
+            return False
+        expires = time.time() + ttl if ttl else 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = expires, size, value
+            self.size += size
+            while self._entries and (
+                max_entries and len(self._entries) > max_entries or
+                max_bytes and self.size > max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, predicate):
+        """ It drops the entries whose key matches ``predicate``. """
+
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[1]
+
+
+def get_cache(key):
+    """ It returns the process-wide cache for ``key``, creating it if needed.
+
+    Args:
+        key: (tuple) ``(dbname, dbsource_id, ...)`` identifying the cache.
+    """
+
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ResultCache()
+        return cache
+
+
+def drop_caches(dbname, dbsource_id):
+    """ It drops every cache belonging to the given data source. """
+
+    with _caches_lock:
+        for key in [k for k in _caches if k[:2] == (dbname, dbsource_id)]:
+            _caches.pop(key).clear()
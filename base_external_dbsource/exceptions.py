@@ -10,3 +10,7 @@ class ConnectionFailedError(UserError):
 
 class ConnectionSuccessError(UserError):
     pass
+
+
+class StatementTimeoutError(UserError):
+    pass
@@ -0,0 +1,120 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import math
+
+from .spill import SpilledRows
+
+# Maximum number of partitions of a join spilled to disk, each one using a
+# temporary file per side
+MAX_PARTITIONS = 64
+
+
+def hash_join(build, probe, build_index, probe_index, build_width,
+              probe_width, build_left=True, outer=False, max_bytes=0):
+    """ It yields the rows of the equi-join of two sets of rows.
+
+    The rows of the build side are indexed by key in a hash table, then
+    the rows of the probe side are looked up in it as they are read, so
+    that each side is read once. If the build side did not fit in memory,
+    which ``build`` tells by having spilled rows to disk, both sides are
+    first split by hash of their keys into partitions stored on disk, small
+    enough to be joined in memory one after the other.
+
+    Rows whose key is ``None`` never match, like NULL values in SQL.
+
+    Args:
+        build: (SpilledRows) Rows of the build side. They are closed once
+            partitioned, if they spilled to disk.
+        probe: (iter) Rows of the probe side.
+        build_index: (int) Position of the key in the rows of the build
+            side.
+        probe_index: (int) Position of the key in the rows of the probe
+            side.
+        build_width: (int) Number of columns of the build side.
+        probe_width: (int) Number of columns of the probe side.
+        build_left: (bool) Whether the build side is the left side of the
+            join, whose columns come first.
+        outer: (bool) Whether the rows of the left side without match are
+            also returned, with ``None`` for the columns of the right side,
+            like a ``LEFT OUTER JOIN``.
+        max_bytes: (int) Approximate size of the rows of the partitions
+            kept in memory.
+    Yields:
+        (tuple) Joined rows, made of the columns of the left side followed
+        by those of the right side.
+    """
+
+    args = build_index, probe_index, build_width, probe_width, build_left, \
+        outer
+    if not build.spilled:
+        yield from _join(build, probe, *args)
+        return
+    # As many partitions as needed for each one to fit in memory
+    count = min(
+        math.ceil(len(build) / max(build.memory_rows, 1)) + 1,
+        MAX_PARTITIONS,
+    )
+    build_parts = probe_parts = []
+    try:
+        build_parts = _partition(build, build_index, count, max_bytes)
+        build.close()
+        probe_parts = _partition(probe, probe_index, count, max_bytes)
+        for build_part, probe_part in zip(build_parts, probe_parts):
+            yield from _join(build_part, probe_part, *args)
+            build_part.close()
+            probe_part.close()
+    finally:
+        for part in build_parts + probe_parts:
+            part.close()
+
+
+def _partition(rows, index, count, max_bytes):
+    """ It splits rows by hash of their key into spilled partitions. """
+
+    parts = [
+        SpilledRows(max_bytes=max(max_bytes // count, 1))
+        for _i in range(count)
+    ]
+    for row in rows:
+        key = row[index]
+        parts[hash(key) % count if key is not None else 0].append(row)
+    return parts
+
+
+def _join(build, probe, build_index, probe_index, build_width, probe_width,
+          build_left, outer):
+    """ It yields the equi-join of two sets of rows, built in memory. """
+
+    def combine(build_row, probe_row):
+        if build_left:
+            return tuple(build_row) + tuple(probe_row)
+        return tuple(probe_row) + tuple(build_row)
+
+    table = {}
+    orphans = []
+    for row in build:
+        key = row[build_index]
+        if key is not None:
+            table.setdefault(key, []).append(row)
+        elif outer and build_left:
+            orphans.append(row)
+    build_padding = (None, ) * build_width
+    probe_padding = (None, ) * probe_width
+    matched = set()
+    for row in probe:
+        key = row[probe_index]
+        rows = table.get(key) if key is not None else None
+        if rows:
+            if outer and build_left:
+                matched.add(key)
+            for build_row in rows:
+                yield combine(build_row, row)
+        elif outer and not build_left:
+            yield combine(build_padding, row)
+    if outer and build_left:
+        for key, rows in table.items():
+            if key not in matched:
+                for build_row in rows:
+                    yield combine(build_row, probe_padding)
+        for build_row in orphans:
+            yield combine(build_row, probe_padding)
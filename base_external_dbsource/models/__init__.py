@@ -1 +1,5 @@
 from . import base_external_dbsource
+from . import base_external_dbsource_sync
+from . import base_external_dbsource_stat
+from . import base_external_dbsource_snapshot
+from . import base_external_dbsource_model
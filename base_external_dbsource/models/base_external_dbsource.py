@@ -2,17 +2,80 @@
 # Copyright 2016 LasLabs Inc.
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
 
+import babel.dates
+import base64
+import csv
+import datetime
+import itertools
+import json
 import logging
 import psycopg2
-
+import psycopg2.errorcodes
+import psycopg2.extras
+import re
+import threading
+import time
+import uuid
+
+from concurrent import futures
 from contextlib import contextmanager
-
-from odoo import _, api, fields, models, tools
-
-from ..exceptions import ConnectionFailedError, ConnectionSuccessError
+from dateutil.relativedelta import relativedelta
+
+from odoo import SUPERUSER_ID, _, api, fields, models, tools
+from odoo.exceptions import ValidationError
+from odoo.osv import expression
+
+from .. import cache as result_cache
+from .. import pool
+from .. import replicas
+from .. import session as sessions
+from .. import singleflight
+from .. import stats as query_stats
+from ..exceptions import (
+    ConnectionFailedError, ConnectionSuccessError, StatementTimeoutError,
+)
+from ..join import hash_join
+from ..partition import (
+    Partition, PartitionedRowIterator, is_interpolable, merge_batches,
+    split_range,
+)
+from ..prepared import (
+    StatementCache, convert_placeholders, is_preparable, param_type,
+    params_signature,
+)
+from ..result import (
+    RESULT_FORMATS, RowIterator, format_result, record_class,
+)
+from ..spill import SpilledRows
+from ..sql import (
+    AGGREGATES, DomainCompiler, compile_order, generalize_query,
+    is_read_only, keyset_domain, normalize_query, parse_aggregate,
+    parse_group_order, parse_order, references_table,
+)
+from ..streams import CsvStream, parse_csv_rows
 
 _logger = logging.getLogger(__name__)
 
+# Queries using the single placeholder of ``psycopg2.extras.execute_values``
+VALUES_PLACEHOLDER = re.compile(r'\bVALUES\s+%s', re.IGNORECASE)
+COPY_FORMATS = ('csv', 'text', 'binary')
+# Labels and lengths of the periods of dates grouped by remote_read_group,
+# as Odoo's read_group gives them
+DATE_GROUP_FORMATS = {
+    'day': 'dd MMM yyyy',
+    'week': "'W'w YYYY",
+    'month': 'MMMM yyyy',
+    'quarter': 'QQQ yyyy',
+    'year': 'yyyy',
+}
+DATE_GROUP_INTERVALS = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(days=7),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+    'year': relativedelta(years=1),
+}
+
 
 class BaseExternalDbsource(models.Model):
     """ It provides logic for connection to an external data source
@@ -25,9 +88,20 @@ class BaseExternalDbsource(models.Model):
         * ``execute_*``
 
     Optional methods for adapters to implement:
+        * ``connection_reset_*``
+        * ``copy_from_*``
+        * ``copy_to_*``
+        * ``execute_connection_*``
+        * ``execute_iter_*``
+        * ``execute_many_*``
+        * ``statement_timeout_*``
+        * ``transaction_begin_*``
+        * ``transaction_commit_*``
+        * ``transaction_rollback_*``
         * ``remote_browse_*``
         * ``remote_create_*``
         * ``remote_delete_*``
+        * ``remote_read_group_*``
         * ``remote_search_*``
         * ``remote_update_*``
     """
@@ -42,6 +116,37 @@ class BaseExternalDbsource(models.Model):
     # Children should declare PWD_STRING_CONNECTOR (such as PWD_STRING_FBD)
     #   to allow for override.
     PWD_STRING = 'PWD=%s;'
+    # Identifier quote and named placeholder format of generated SQL.
+    # Children should declare IDENTIFIER_QUOTE_CONNECTOR and
+    #   PLACEHOLDER_CONNECTOR to allow for override.
+    IDENTIFIER_QUOTE = '"'
+    PLACEHOLDER = '%%(%s)s'
+    # LIMIT of generated SQL when only an offset is given.
+    # Children should declare NO_LIMIT_CONNECTOR to allow for override.
+    NO_LIMIT = 'ALL'
+    # Maximum number of bound parameters per statement, 0 for no limit.
+    # Children should declare MAX_PARAMS_CONNECTOR to allow for override.
+    MAX_PARAMS = 0
+    # Whether connections are pooled by the worker. Children whose driver
+    #   pools connections itself, possibly bound to threads, should declare
+    #   CONNECTION_POOL_CONNECTOR = False.
+    CONNECTION_POOL = True
+    # Expressions of the first day of the period of a date, by period.
+    # Children should declare DATE_GROUPS_CONNECTOR to allow for override.
+    DATE_GROUPS = {
+        period: "CAST(date_trunc('%s', {}) AS date)" % period
+        for period in ('day', 'week', 'month', 'quarter', 'year')
+    }
+    # Writing any of these fields disposes of the pooled connections.
+    CONNECTION_FIELDS = [
+        'conn_string', 'password', 'client_cert', 'client_key', 'ca_certs',
+        'connector', 'pool_size_min', 'pool_size_max', 'pool_idle_timeout',
+        'pool_max_lifetime', 'prepared_statements', 'prepared_statements_max',
+    ]
+    # Seconds between two flushes of the query statistics of a worker, and
+    # number of queries shown on the data source.
+    STATS_FLUSH_INTERVAL = 60
+    STATS_TOP_QUERIES = 10
 
     name = fields.Char('Datasource name', required=True, size=64)
     conn_string = fields.Text('Connection string', help="""
@@ -72,8 +177,161 @@ class BaseExternalDbsource(models.Model):
         help="If a connector is missing from the list, check the server "
              "log to confirm that the required components were detected.",
     )
+    pool_size_min = fields.Integer(
+        'Minimum pool size',
+        default=0,
+        help='Number of idle connections that are kept open by each worker '
+             'even after the idle timeout.',
+    )
+    pool_size_max = fields.Integer(
+        'Maximum pool size',
+        default=5,
+        help='Maximum number of connections kept open by each worker. '
+             'Additional connections are closed right after use. Set to 0 '
+             'to disable connection pooling.',
+    )
+    pool_idle_timeout = fields.Integer(
+        'Idle timeout',
+        default=300,
+        help='Seconds after which an unused pooled connection is closed. '
+             'Set to 0 to keep idle connections open.',
+    )
+    pool_max_lifetime = fields.Integer(
+        'Maximum lifetime',
+        default=3600,
+        help='Seconds after which a pooled connection is closed instead of '
+             'being reused. Set to 0 to reuse connections indefinitely.',
+    )
+    prepared_statements = fields.Boolean(
+        'Prepare statements',
+        help='Keep the parameterized queries run on pooled connections '
+             'prepared, so that the remote does not parse and plan them '
+             'again when they are run again. PostgreSQL prepares them on '
+             'the server. It has no effect on SQLAlchemy connectors, whose '
+             'drivers keep their own statement cache.',
+    )
+    prepared_statements_max = fields.Integer(
+        'Prepared statements per connection',
+        default=100,
+        help='Number of statements kept prepared on each connection. The '
+             'least recently used one is released to prepare another.',
+    )
+    cache_enabled = fields.Boolean(
+        'Cache query results',
+        help='Keep the results of read-only queries run with execute in the '
+             'memory of each worker, and reuse them for identical queries.',
+    )
+    cache_ttl = fields.Integer(
+        'Cache time to live',
+        default=60,
+        help='Seconds during which a cached result is reused. Set to 0 to '
+             'keep results until they are evicted.',
+    )
+    cache_max_entries = fields.Integer(
+        'Maximum cached results',
+        default=1000,
+        help='Least recently used results are evicted beyond this number. '
+             'Set to 0 for no limit.',
+    )
+    cache_max_bytes = fields.Integer(
+        'Maximum cache size',
+        default=16 * 1024 * 1024,
+        help='Approximate memory size in bytes above which least recently '
+             'used results are evicted. Set to 0 for no limit.',
+    )
+    cache_hits = fields.Integer(compute='_compute_cache_stats')
+    cache_misses = fields.Integer(compute='_compute_cache_stats')
+    cache_evictions = fields.Integer(compute='_compute_cache_stats')
+    statement_timeout = fields.Integer(
+        'Statement timeout',
+        default=0,
+        help='Milliseconds after which queries run with execute or '
+             'execute_iter are canceled on the remote. Set to 0 to let '
+             'queries run indefinitely.',
+    )
+    stats_enabled = fields.Boolean(
+        'Collect query statistics',
+        default=True,
+        help='Measure the duration, rows and errors of every query, and '
+             'store them by query every minute.',
+    )
+    slow_query_threshold = fields.Integer(
+        'Slow query threshold',
+        default=1000,
+        help='Milliseconds above which a query is logged as slow. Set to '
+             '0 to log no query.',
+    )
+    stat_ids = fields.One2many(
+        'base.external.dbsource.stat',
+        'dbsource_id',
+        'Query statistics',
+        readonly=True,
+    )
+    slow_query_ids = fields.One2many(
+        'base.external.dbsource.slow.query',
+        'dbsource_id',
+        'Slow queries',
+        readonly=True,
+    )
+    top_stat_ids = fields.Many2many(
+        'base.external.dbsource.stat',
+        string='Top queries',
+        compute='_compute_query_stats',
+        help='Queries that took the most time overall.',
+    )
+    latency_p50 = fields.Float(
+        'Median latency',
+        compute='_compute_query_stats',
+        help='Milliseconds within which half of the queries completed.',
+    )
+    latency_p95 = fields.Float(
+        '95th percentile latency',
+        compute='_compute_query_stats',
+        help='Milliseconds within which 95% of the queries completed.',
+    )
+    snapshot_ids = fields.One2many(
+        'base.external.dbsource.snapshot',
+        'dbsource_id',
+        'Snapshots',
+    )
+    remote_chunk_size = fields.Integer(
+        'Record ID chunk size',
+        default=1000,
+        help='Number of record IDs sent per statement when browsing, '
+             'updating or deleting remote records. It is lowered as needed '
+             'to respect the bound parameter limit of the connector.',
+    )
+
+    primary_id = fields.Many2one(
+        'base.external.dbsource',
+        'Primary data source',
+        ondelete='cascade',
+        help='Data source this one is a read replica of.',
+    )
+    replica_ids = fields.One2many(
+        'base.external.dbsource',
+        'primary_id',
+        'Read replicas',
+        help='Read-only queries are run on these data sources, falling '
+             'back to this one when none of them is available.',
+    )
+    replica_policy = fields.Selection(
+        [('round_robin', 'Round robin'), ('latency', 'Lowest latency')],
+        'Replica selection',
+        required=True,
+        default='round_robin',
+        help='Spread reads evenly across replicas, or send them to the '
+             'replica that answered the fastest recently.',
+    )
+    replica_eject_time = fields.Integer(
+        'Replica ejection time',
+        default=30,
+        help='Seconds during which a replica failing its health check does '
+             'not receive any query.',
+    )
 
     current_table = None
+    current_key = 'id'
 
     @api.multi
     @api.depends('conn_string', 'password')
@@ -91,22 +349,159 @@ class BaseExternalDbsource(models.Model):
             else:
                 record.conn_string_full = record.conn_string
 
+    @api.multi
+    @api.constrains('pool_size_min', 'pool_size_max', 'pool_idle_timeout',
+                    'pool_max_lifetime')
+    def _check_pool_settings(self):
+        for record in self:
+            if min(record.pool_size_min, record.pool_size_max,
+                   record.pool_idle_timeout, record.pool_max_lifetime) < 0:
+                raise ValidationError(_(
+                    'Connection pool settings cannot be negative.'
+                ))
+            if record.pool_size_min > record.pool_size_max:
+                raise ValidationError(_(
+                    'The minimum pool size cannot exceed the maximum pool '
+                    'size.'
+                ))
+
+    @api.multi
+    @api.constrains('cache_ttl', 'cache_max_entries', 'cache_max_bytes')
+    def _check_cache_settings(self):
+        for record in self:
+            if min(record.cache_ttl, record.cache_max_entries,
+                   record.cache_max_bytes) < 0:
+                raise ValidationError(_(
+                    'Result cache settings cannot be negative.'
+                ))
+
+    @api.multi
+    @api.constrains('primary_id', 'connector', 'replica_eject_time')
+    def _check_replicas(self):
+        for record in self:
+            if record.replica_eject_time < 0:
+                raise ValidationError(_(
+                    'The replica ejection time cannot be negative.'
+                ))
+            primary = record.primary_id
+            if not primary:
+                continue
+            if primary.primary_id or record.replica_ids:
+                raise ValidationError(_(
+                    'Read replicas cannot have replicas of their own.'
+                ))
+            if primary.connector != record.connector:
+                raise ValidationError(_(
+                    'Read replicas must use the connector of their primary '
+                    'data source.'
+                ))
+
+    @api.multi
+    @api.constrains('statement_timeout')
+    def _check_statement_timeout(self):
+        for record in self:
+            if record.statement_timeout < 0:
+                raise ValidationError(_(
+                    'The statement timeout cannot be negative.'
+                ))
+
+    @api.multi
+    @api.constrains('slow_query_threshold')
+    def _check_slow_query_threshold(self):
+        for record in self:
+            if record.slow_query_threshold < 0:
+                raise ValidationError(_(
+                    'The slow query threshold cannot be negative.'
+                ))
+
+    @api.multi
+    @api.constrains('prepared_statements_max')
+    def _check_prepared_statements_max(self):
+        for record in self:
+            if record.prepared_statements_max < 1:
+                raise ValidationError(_(
+                    'The number of prepared statements per connection must '
+                    'be positive.'
+                ))
+
+    @api.multi
+    @api.constrains('remote_chunk_size')
+    def _check_remote_chunk_size(self):
+        for record in self:
+            if record.remote_chunk_size < 1:
+                raise ValidationError(_(
+                    'The record ID chunk size must be positive.'
+                ))
+
+    @api.multi
+    def _compute_cache_stats(self):
+        for record in self:
+            if not isinstance(record.id, int):
+                record.cache_hits = record.cache_misses = 0
+                record.cache_evictions = 0
+                continue
+            cache = record._result_cache()
+            record.cache_hits = cache.hits
+            record.cache_misses = cache.misses
+            record.cache_evictions = cache.evictions
+
+    @api.multi
+    @api.depends('stat_ids')
+    def _compute_query_stats(self):
+        for record in self:
+            stats = record.stat_ids
+            histogram = query_stats.merge_histograms(
+                stat._get_histogram() for stat in stats
+            )
+            maximum = max(stats.mapped('max_time') or [0.0])
+            record.latency_p50 = query_stats.percentile(
+                histogram, 0.5, maximum,
+            )
+            record.latency_p95 = query_stats.percentile(
+                histogram, 0.95, maximum,
+            )
+            record.top_stat_ids = stats.sorted(
+                'total_time', reverse=True,
+            )[:self.STATS_TOP_QUERIES]
+
+    @api.multi
+    def write(self, vals):
+        if set(vals) & set(self.CONNECTION_FIELDS):
+            self._connection_dispose()
+        return super(BaseExternalDbsource, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        # Replicas are deleted along with their primary by the database
+        records = self | self.mapped('replica_ids')
+        records._connection_dispose()
+        for record in records:
+            query_stats.drop_collector(record.env.cr.dbname, record.id)
+        return super(BaseExternalDbsource, self).unlink()
+
     # Interface
 
     @api.multi
-    def change_table(self, name):
-        """ Change the table that is used for CRUD operations """
+    def change_table(self, name, key='id'):
+        """ Change the table and key column used for CRUD operations """
         self.current_table = name
+        self.current_key = key
 
     @api.multi
     def connection_close(self, connection):
         """ It closes the connection to the data source.
 
-        This method calls adapter method of this same name, suffixed with
-        the adapter type.
+        Connections checked out of the connection pool are handed back to
+        it instead. Others are closed by calling the adapter method of this
+        same name, suffixed with the adapter type.
         """
 
         method = self._get_adapter_method('connection_close')
+        connection_pool = pool.find_pool(self._connection_pool_key())
+        if connection_pool is not None and connection_pool.checkin(
+            connection, method, self._get_connection_reset_method(),
+        ):
+            return
         return method(connection)
 
     @api.multi
@@ -114,13 +509,26 @@ class BaseExternalDbsource(models.Model):
     def connection_open(self):
         """ It provides a context manager for the data source.
 
-        This method calls adapter method of this same name, suffixed with
-        the adapter type.
+        Inside a ``session``, the connection of the session is provided.
+        Connections are otherwise checked out of a pool shared by the worker
+        process when pooling is enabled, or opened by calling the adapter
+        method of this same name, suffixed with the adapter type.
         """
 
+        session = self._get_session()
+        if session is not None:
+            yield session.connection
+            return
         method = self._get_adapter_method('connection_open')
+        connection_pool = self._connection_pool()
+        with query_stats.phase('connect'):
+            if connection_pool is not None:
+                connection = connection_pool.checkout(
+                    method, self._get_adapter_method('connection_close'),
+                )
+            else:
+                connection = method()
         try:
-            connection = method()
             yield connection
         finally:
             try:
@@ -130,7 +538,10 @@ class BaseExternalDbsource(models.Model):
 
     @api.multi
     def execute(
-        self, query=None, execute_params=None, metadata=False, **kwargs
+        self, query=None, execute_params=None, metadata=False, cache=None,
+        route=None, statement_timeout=None, use_snapshot=False,
+        result_format='tuples', max_memory_rows=0, max_memory_bytes=0,
+        single_flight=False, **kwargs
     ):
         """ Executes a query and returns a list of rows.
 
@@ -149,6 +560,49 @@ class BaseExternalDbsource(models.Model):
             rows list and the columns list, in the format:
                 { 'cols': [ 'col_a', 'col_b', ...]
                 , 'rows': [ (a0, b0, ...), (a1, b1, ...), ...] }
+
+            The result of read-only queries is cached if the result cache
+            is enabled on the data source, outside of sessions. "cache" can
+            be set to True or False to override this setting for a single
+            call.
+
+            Read-only queries run on a read replica of the data source, if
+            it has any. "route" can be set to "primary" or "replica" to
+            override this decision for a single call.
+
+            Queries running longer than the statement timeout of the data
+            source are canceled and raise StatementTimeoutError.
+            "statement_timeout" can be set to a number of milliseconds, or
+            to 0 for no timeout, to override it for a single call.
+
+            The duration of the query is added to the statistics of the
+            data source, see ``_measure``.
+
+            If "use_snapshot" is True and the query, without parameters, is
+            the query of a refreshed snapshot of the data source, its rows
+            are read from the local table of the snapshot instead.
+
+            "result_format" selects how rows are returned, see
+            ``result.format_result``:
+                * "tuples": A list of row tuples, the default.
+                * "records": A list of tuples also read by column name, as
+                  in row['city'] or row.city, sharing their column names.
+                * "columns": A dict of column names to their values, in
+                  compact arrays for integer and float columns.
+                * "numpy": The same with NumPy arrays, if installed.
+
+            Rows of read-only queries beyond "max_memory_rows" rows or
+            "max_memory_bytes" bytes are spilled to a temporary file, see
+            ``_execute_spill``. The rows are then returned as a sequence
+            reading them from memory or disk, which removes the file once
+            closed or garbage collected. Results spilled to disk can only
+            be returned as tuples or records, and are not cached.
+
+            If "single_flight" is True, a read-only query arriving while
+            the same query, with the same parameters, is already running
+            on the data source in another thread waits for its result and
+            shares it instead of running again, see
+            ``_execute_single_flight``.
         """
 
         # Old API compatibility
@@ -163,14 +617,439 @@ class BaseExternalDbsource(models.Model):
             except KeyError:
                 pass
 
-        method = self._get_adapter_method('execute')
-        rows, cols = method(query, execute_params, metadata)
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(_('Unknown result format %s') % result_format)
+        # Formats other than tuples are built from the column names
+        metadata_needed = metadata or result_format != 'tuples'
+
+        spill_limits = max_memory_rows or max_memory_bytes
+        if spill_limits and result_format not in ('tuples', 'records'):
+            raise ValueError(_(
+                'Results spilled to disk can only be returned as tuples or '
+                'records.'
+            ))
+
+        snapshot = None
+        if use_snapshot and not execute_params:
+            snapshot = self._get_snapshot(query)
+        if snapshot:
+            result = snapshot._read_rows()
+            rows, cols = result['rows'], result['cols']
+        elif spill_limits and is_read_only(query):
+            rows, cols = self._execute_spill(
+                query, execute_params, max_memory_rows, max_memory_bytes,
+                route=route, statement_timeout=statement_timeout,
+            )
+            if result_format == 'records':
+                rows.row_factory = record_class(cols)
+            result_format = 'tuples'
+        else:
+            record = self._with_statement_timeout(statement_timeout)
+            method = record._get_routed_method('execute', query, route)
+            if cache is None:
+                # Sessions may read their own uncommitted writes
+                cache = self.cache_enabled and self._get_session() is None
+
+            def fetch():
+                if cache and is_read_only(query):
+                    return self._execute_cached(method, query, execute_params)
+                return method(query, execute_params, metadata_needed)
+
+            with self._measure(query) as measure:
+                if single_flight and is_read_only(query) and \
+                        self._get_session() is None:
+                    rows, cols = record._execute_single_flight(
+                        fetch, query, execute_params, metadata_needed, route,
+                    )
+                else:
+                    rows, cols = fetch()
+                measure.rows = len(rows)
+        rows = format_result(rows, cols, result_format)
 
         if metadata:
             return {'cols': cols, 'rows': rows}
         else:
             return rows
 
+    @api.multi
+    def execute_all(self, query, execute_params=None, metadata=False,
+                    timeout=None, max_workers=8):
+        """ Executes a query on every data source of the recordset at once.
+
+        Queries run concurrently in a bounded pool of threads, each one
+        with its own connection and Odoo cursor. A failure or timeout on one
+        data source does not prevent the results of the others from being
+        returned.
+
+        Args:
+            query: (str) Query to execute, see ``execute``.
+            execute_params: (mixed) Query parameters, see ``execute``.
+            metadata: (bool) Return columns along with rows, see ``execute``.
+            timeout: (float) Seconds after which the result of a data source
+                stops being waited for, counted from the start of its query.
+            max_workers: (int) Maximum number of concurrent queries.
+        Returns:
+            (dict) Mapping of data source IDs to dicts with the keys:
+                ``result``: What ``execute`` returned, or ``None``.
+                ``error``: The exception raised, or ``None`` on success.
+        """
+
+        results = {
+            record.id: {'result': None, 'error': None} for record in self
+        }
+        if not self:
+            return results
+        starts = {}
+        executor = futures.ThreadPoolExecutor(
+            max_workers=min(max_workers, len(self)),
+        )
+        pending = {
+            executor.submit(
+                self._execute_all_worker,
+                record.id, starts, query, execute_params, metadata,
+            ): record.id
+            for record in self
+        }
+        try:
+            while pending:
+                done, _not_done = futures.wait(
+                    pending, timeout=timeout and min(timeout, 0.1),
+                    return_when=futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    dbsource_id = pending.pop(future)
+                    try:
+                        results[dbsource_id]['result'] = future.result()
+                    except Exception as e:
+                        results[dbsource_id]['error'] = e
+                if not timeout:
+                    continue
+                now = time.time()
+                for future, dbsource_id in list(pending.items()):
+                    started = starts.get(dbsource_id)
+                    if started is not None and now - started > timeout:
+                        del pending[future]
+                        results[dbsource_id]['error'] = futures.TimeoutError(
+                            _('Query timed out after %s seconds.') % timeout
+                        )
+        finally:
+            # Timed out queries are left to complete in the background
+            executor.shutdown(wait=False)
+        return results
+
+    @api.multi
+    def execute_partitioned(self, table, key_column, partitions=4,
+                            columns=None, where=None, split='range',
+                            batch_size=1000, max_pending=None,
+                            statement_timeout=None):
+        """ Reads a large table by key ranges read concurrently.
+
+        The keys of the rows matching ``where`` are split into disjoint
+        ranges, each one read by a thread of its own over its own
+        connection and Odoo cursor. Batches of rows are returned as they
+        arrive, in no particular order. Threads wait while ``max_pending``
+        batches are waiting to be consumed, so that memory usage stays
+        bounded whatever the size of the table. Rows whose key is NULL are
+        not returned.
+
+        Args:
+            table: (str) Name of the table, possibly schema qualified.
+            key_column: (str) Column whose values are split in ranges, which
+                should be indexed.
+            partitions: (int) Number of ranges read concurrently. Each one
+                takes a connection, beyond the pool size if needed.
+            columns: (list) Columns to return, all of them if empty.
+            where: (list) Domain the rows must match, see ``remote_search``.
+            split: (str) How the keys are split:
+                ``range``: In ranges of equal width between the smallest
+                    and greatest keys, which suits evenly distributed
+                    numeric or date keys. Other keys are split by quantiles.
+                ``quantiles``: In ranges of about as many rows, which suits
+                    skewed keys, at the cost of a count and of a query per
+                    range to find its bounds.
+            batch_size: (int) Number of rows fetched per round trip.
+            max_pending: (int) Maximum number of batches waiting to be
+                consumed, twice the number of partitions by default.
+            statement_timeout: (int) Milliseconds after which the query of a
+                partition is canceled, see ``execute_iter``.
+        Returns:
+            (PartitionedRowIterator) Iterator of rows, whose ``partitions``
+            attribute lists the ``Partition`` being read, with the number of
+            rows read and the throughput of each one.
+        """
+
+        self.ensure_one()
+        if partitions < 1:
+            raise ValueError('At least one partition is required.')
+        if split not in ('range', 'quantiles'):
+            raise ValueError('Unknown split method %r.' % split)
+        bounds = self._partition_bounds(
+            table, key_column, partitions, where, split,
+        )
+        ranges = [
+            Partition(index, low, high, index == len(bounds) - 2)
+            for index, (low, high) in enumerate(zip(bounds, bounds[1:]))
+        ] or [Partition(0, None, None)]
+        select = ', '.join(
+            map(self._quote_identifier, columns),
+        ) if columns else '*'
+        sources = []
+        for partition in ranges:
+            compiler = DomainCompiler(
+                self._quote_identifier, self._sql_placeholder,
+            )
+            condition = compiler.compile(
+                list(where or []) + partition.domain(key_column),
+            )
+            query = 'SELECT %s FROM %s WHERE %s' % (
+                select, self._quote_identifier(table), condition,
+            )
+            sources.append(self._execute_partition_worker(
+                self.id, query, compiler.params or None, batch_size,
+                statement_timeout,
+            ))
+        return PartitionedRowIterator(
+            merge_batches(sources, ranges, max_pending or 2 * len(ranges)),
+            ranges,
+        )
+
+    @api.model
+    def execute_join(self, left, right, key, outer=False, build='auto',
+                     max_memory_bytes=0, batch_size=1000):
+        """ Joins the results of queries on two data sources by key.
+
+        The rows of the build side are read into a hash table indexed by
+        key, then the rows of the other side are streamed and looked up in
+        it, which reads each side once instead of querying one side per row
+        of the other. By default, both sides are read in turn until one is
+        exhausted, which becomes the build side, so that the smaller side
+        is held in memory whichever it is. Keys are compared in Python,
+        and ``None`` never matches.
+
+        Args:
+            left: (tuple) Data source, query and optionally its parameters
+                of the left side of the join.
+            right: (tuple) Data source, query and optionally its parameters
+                of the right side of the join.
+            key: (str|tuple) Column holding the join key on both sides, or
+                pair of the columns of the left and right sides.
+            outer: (bool) Also return the rows of the left side without
+                match, with ``None`` for the columns of the right side.
+            build: (str) Side held in memory: ``left``, ``right`` or
+                ``auto`` for the smaller one.
+            max_memory_bytes: (int) Approximate memory allotted to the rows
+                of each side, ``0`` for no limit. Beyond it, rows are
+                spilled to disk and the join is done by partitions of keys.
+            batch_size: (int) Number of rows fetched per round trip, and of
+                joined rows per batch.
+        Returns:
+            (RowIterator) Iterator of the joined rows, made of the columns of
+            the left query followed by those of the right query.
+        """
+
+        if build not in ('auto', 'left', 'right'):
+            raise ValueError('Unknown build side %r.' % build)
+        keys = (key, key) if isinstance(key, str) else tuple(key)
+        return RowIterator(self._execute_join(
+            left, right, keys, outer, build, max_memory_bytes, batch_size,
+        ))
+
+    @api.multi
+    def execute_iter(self, query, execute_params=None, batch_size=1000,
+                     route=None, statement_timeout=None):
+        """ Executes a query and returns a lazy iterator over its rows.
+
+        Unlike ``execute``, rows are fetched from the remote in batches of
+        ``batch_size`` while they are consumed, so that memory usage does
+        not depend on the size of the result. The connection stays open
+        until the rows are exhausted or the iterator is closed, which is
+        best ensured by using it as a context manager.
+
+        This method calls adapter method of this same name, suffixed with
+        the adapter type.
+
+        Args:
+            query: (str) Query to execute, see ``execute``.
+            execute_params: (mixed) Query parameters, see ``execute``.
+            batch_size: (int) Number of rows fetched per round trip.
+            route: (str) Where to run the query, see ``execute``.
+            statement_timeout: (int) Milliseconds after which the query is
+                canceled, see ``execute``. It applies to the execution of
+                the query and to every fetch of a batch of rows.
+        Returns:
+            (RowIterator) Iterator of rows. The column names are available
+            in its ``cols`` attribute.
+        """
+
+        record = self._with_statement_timeout(statement_timeout)
+        method = record._get_routed_method('execute_iter', query, route)
+        batches = method(query, execute_params, batch_size)
+        if self.stats_enabled:
+            batches = self._measure_batches(query, batches)
+        return RowIterator(batches)
+
+    @api.multi
+    def execute_many(self, query, param_seq, page_size=1000,
+                     commit_interval=0):
+        """ Executes a query once for every parameter set of a sequence.
+
+        All statements are sent over a single connection, by pages of
+        ``page_size`` parameter sets, and are committed together once the
+        sequence is exhausted. If any statement fails, the pending
+        transaction is rolled back.
+
+        This method calls adapter method of this same name, suffixed with
+        the adapter type.
+
+        Args:
+            query: (str) Query to execute, see ``execute``. For PostgreSQL,
+                queries such as ``INSERT INTO t (a, b) VALUES %s`` are sent
+                as a single multi-row statement per page.
+            param_seq: (iter) Iterable of parameter sets.
+            page_size: (int) Number of parameter sets sent per round trip.
+            commit_interval: (int) Commit every ``commit_interval`` pages
+                instead of once at the end.
+        Returns:
+            (int) Number of parameter sets that were executed.
+        """
+
+        method = self._get_adapter_method('execute_many')
+        count = pages = 0
+        with self._measure(query) as measure, \
+                self.connection_open() as connection:
+            transaction = self._transaction_begin(connection)
+            try:
+                for page in tools.split_every(page_size, param_seq, list):
+                    method(connection, query, page)
+                    count += len(page)
+                    measure.rows = count
+                    pages += 1
+                    if commit_interval and not pages % commit_interval:
+                        self._transaction_commit(connection, transaction)
+                        transaction = self._transaction_begin(connection)
+                self._transaction_commit(connection, transaction)
+            except Exception:
+                self._transaction_rollback(connection, transaction)
+                raise
+        return count
+
+    @api.multi
+    def copy_from(self, table, data, columns=None, format='csv',
+                  page_size=1000):
+        """ It bulk loads rows into a remote table.
+
+        Data is streamed to the remote without being held in memory. This
+        method calls adapter method of this same name, suffixed with the
+        adapter type, such as ``COPY ... FROM STDIN`` for PostgreSQL.
+        Connectors without this adapter method fall back to batched
+        inserts through ``execute_many``.
+
+        Args:
+            table: (str) Name of the table to load the rows into.
+            data: (iter|file) Iterable of row sequences, or a text file
+                object in ``format``. Empty CSV fields are loaded as NULL.
+            columns: (list) Names of the columns of the rows, defaults to
+                every column of the table.
+            format: (str) Format of the file object, ``csv`` or, with
+                PostgreSQL only, ``text`` or ``binary``.
+            page_size: (int) Rows per round trip of the fallback.
+        Returns:
+            (int) Number of rows loaded.
+        """
+
+        if format not in COPY_FORMATS:
+            raise ValueError(_('Unsupported format %s') % format)
+        method = getattr(self, 'copy_from_%s' % self.connector, None)
+        if method is not None:
+            return method(table, data, columns, format)
+        if hasattr(data, 'read'):
+            if format != 'csv':
+                raise NotImplementedError(_(
+                    'The %s connector only loads CSV files.'
+                ) % self.connector)
+            data = parse_csv_rows(data)
+        return self._copy_from_insert(table, data, columns, page_size)
+
+    @api.multi
+    def copy_to(self, query, file_obj, execute_params=None, format='csv'):
+        """ It writes the rows of a query to a file object.
+
+        Rows are streamed to the file without being held in memory. This
+        method calls adapter method of this same name, suffixed with the
+        adapter type, such as ``COPY ... TO STDOUT`` for PostgreSQL.
+        Connectors without this adapter method fall back to ``execute_iter``.
+
+        Args:
+            query: (str) Query to export, see ``execute``.
+            file_obj: (file) Text file object to write to.
+            execute_params: (mixed) Query parameters, see ``execute``.
+            format: (str) Format of the output, ``csv`` or, with PostgreSQL
+                only, ``text`` or ``binary``.
+        Returns:
+            (int) Number of rows written.
+        """
+
+        if format not in COPY_FORMATS:
+            raise ValueError(_('Unsupported format %s') % format)
+        method = getattr(self, 'copy_to_%s' % self.connector, None)
+        if method is not None:
+            return method(query, execute_params, file_obj, format)
+        if format != 'csv':
+            raise NotImplementedError(_(
+                'The %s connector only exports CSV files.'
+            ) % self.connector)
+        writer = csv.writer(file_obj, lineterminator='\n')
+        count = 0
+        with self.execute_iter(query, execute_params) as rows:
+            for batch in rows.batches():
+                writer.writerows(batch)
+                count += len(batch)
+        return count
+
+    @api.multi
+    @contextmanager
+    def session(self):
+        """ It provides a session running queries over a single connection.
+
+        Every statement run while the session is open, including those of
+        ``execute_many``, ``copy_from`` and the ``remote_*`` methods, shares
+        its connection and transaction. The transaction is committed when
+        the session closes, or rolled back if an exception is raised.
+        Nested sessions of a data source are the same session.
+
+        Example:
+            with dbsource.session() as session:
+                session.execute('UPDATE stock SET qty = qty - 1 ...')
+                session.execute_many('INSERT INTO moves VALUES %s', moves)
+
+        Returns:
+            (Session) Session exposing ``execute``, ``execute_iter``,
+            ``execute_many``, ``commit`` and ``rollback``, as well as the
+            other methods of the data source.
+        """
+
+        self.ensure_one()
+        session = self._get_session()
+        if session is not None:
+            yield session
+            return
+        key = self.env.cr.dbname, self.id
+        with self.connection_open() as connection:
+            session = sessions.Session(self, connection)
+            session.begin()
+            sessions.bind_session(key, session)
+            try:
+                yield session
+                session.end(commit=True)
+            except Exception:
+                try:
+                    session.end(commit=False)
+                except Exception:
+                    _logger.exception('Session rollback failure.')
+                raise
+            finally:
+                sessions.unbind_session(key)
+
     @api.multi
     def connection_test(self):
         """ It tests the connection
@@ -182,6 +1061,8 @@ class BaseExternalDbsource(models.Model):
 
         for obj in self:
             try:
+                # Make sure that a brand new connection is tested
+                self._connection_dispose()
                 with self.connection_open():
                     pass
             except Exception as e:
@@ -194,12 +1075,23 @@ class BaseExternalDbsource(models.Model):
             "Everything seems properly set up!",
         ))
 
+    @api.multi
+    def action_stats_reset(self):
+        """ It forgets the query statistics of the data sources. """
+        for record in self:
+            query_stats.drop_collector(record.env.cr.dbname, record.id)
+        self.mapped('stat_ids').unlink()
+        self.mapped('slow_query_ids').unlink()
+        return True
+
     @api.multi
     def remote_browse(self, record_ids, *args, **kwargs):
         """ It browses for and returns the records from remote by ID
 
         This method calls adapter method of this same name, suffixed with
-        the adapter type.
+        the adapter type. SQL adapters send the IDs to the remote by chunks
+        of ``remote_chunk_size`` over a single connection, and accept the
+        ``fields`` and ``chunk_size`` arguments of ``_remote_browse_sql``.
 
         Args:
             record_ids: (list) List of remote IDs to browse.
@@ -230,14 +1122,17 @@ class BaseExternalDbsource(models.Model):
 
         assert self.current_table
         method = self._get_adapter_method('remote_create')
-        return method(vals, *args, **kwargs)
+        res = method(vals, *args, **kwargs)
+        self._result_cache_invalidate(self.current_table)
+        return res
 
     @api.multi
     def remote_delete(self, record_ids, *args, **kwargs):
         """ It deletes records by ID on remote
 
         This method calls adapter method of this same name, suffixed with
-        the adapter type.
+        the adapter type. SQL adapters delete the records by chunks of
+        ``remote_chunk_size`` IDs in a single transaction.
 
         Args:
             record_ids: (list) List of remote IDs to delete.
@@ -249,14 +1144,102 @@ class BaseExternalDbsource(models.Model):
 
         assert self.current_table
         method = self._get_adapter_method('remote_delete')
-        return method(record_ids, *args, **kwargs)
+        res = method(record_ids, *args, **kwargs)
+        self._result_cache_invalidate(self.current_table)
+        return res
+
+    @api.multi
+    def remote_paginate(self, order_key, page_size=1000, after=None,
+                        domain=None, fields=None):
+        """ It returns a page of remote records using keyset pagination.
+
+        Pages start right after the key of the last record of the previous
+        page instead of skipping an offset, so that every page costs the
+        same on an indexed key. The returned token is opaque and can be
+        stored to resume paging later, even in another transaction.
+
+        It relies on ``remote_search`` and works with every adapter
+        supporting its ``fields``, ``order`` and ``limit`` arguments.
+
+        Args:
+            order_key: (str) Sort order on columns uniquely identifying
+                records, which cannot be NULL, such as ``id`` or
+                ``write_date desc, id desc``. Columns can be qualified by
+                the name of the table, their values being read from the
+                columns of the same name of the records.
+            page_size: (int) Maximum number of records to return.
+            after: (str) Token returned for the previous page, if any.
+            domain: (list) Domain the records must also match.
+            fields: (list) Columns to return, all of them if empty. The
+                columns of ``order_key`` are always returned.
+        Returns:
+            (tuple) List of record mappings and the token of the next
+            page. A page shorter than ``page_size`` is the last one, whose
+            token can still be used to fetch records added afterwards.
+        """
+
+        assert self.current_table
+        terms = parse_order(order_key)
+        order = ', '.join(
+            '%s %s' % (column, 'desc' if descending else 'asc')
+            for column, descending in terms
+        )
+        domain = list(domain or [])
+        if after:
+            domain = keyset_domain(
+                terms, self._paginate_token_load(after, order),
+            ) + domain
+        # Records are keyed by column names, which are not qualified
+        names = [column.split('.')[-1] for column, descending in terms]
+        if fields:
+            fields = list(fields) + [
+                column for (column, descending), name in zip(terms, names)
+                if column not in fields and name not in fields
+            ]
+        records = list(self.remote_search(
+            domain, fields=fields, order=order, limit=page_size,
+        ))
+        if not records:
+            return records, after
+        last = records[-1]
+        return records, self._paginate_token_dump(order, [
+            last[column] if column in last else last[name]
+            for (column, descending), name in zip(terms, names)
+        ])
+
+    @api.multi
+    def remote_read_group(self, domain, fields, groupby, *args, **kwargs):
+        """ It aggregates the records of the current table by group.
+
+        This method calls adapter method of this same name, suffixed with
+        the adapter type. SQL adapters compile it to a single ``GROUP BY``
+        statement evaluated by the remote, along with the ``offset``,
+        ``limit``, ``orderby`` and ``lazy`` arguments of
+        ``_remote_read_group_sql``.
+
+        Args:
+            domain: (mixed) Query domain as required by the adapter.
+            fields: (list) Aggregated fields as required by the adapter.
+            groupby: (list|str) Group by specifications.
+            *args: Positional arguments to be passed to adapter method.
+            **kwargs: Keyword arguments to be passed to adapter method.
+        Returns:
+            (list) Dicts shaped like the results of Odoo's ``read_group``.
+        """
+
+        assert self.current_table
+        method = self._get_adapter_method('remote_read_group')
+        return method(domain, fields, groupby, *args, **kwargs)
 
     @api.multi
     def remote_search(self, query, *args, **kwargs):
         """ It searches the remote for the query.
 
         This method calls adapter method of this same name, suffixed with
-        the adapter type.
+        the adapter type. SQL adapters accept an Odoo domain, which is
+        compiled to a parameterized ``WHERE`` clause and evaluated by the
+        remote, along with the ``fields``, ``limit``, ``offset``, ``order``
+        and ``count`` arguments of ``_remote_search_sql``.
 
         Args:
             query: (mixed) Query domain as required by the adapter.
@@ -275,7 +1258,9 @@ class BaseExternalDbsource(models.Model):
         """ It updates the remote records with the vals
 
         This method calls adapter method of this same name, suffixed with
-        the adapter type.
+        the adapter type. SQL adapters update the records by chunks of
+        ``remote_chunk_size`` IDs in a single transaction, as the returned
+        iterator is consumed, which is committed once it is exhausted.
 
         Args:
             record_ids: (list) List of remote IDs to delete.
@@ -287,7 +1272,9 @@ class BaseExternalDbsource(models.Model):
 
         assert self.current_table
         method = self._get_adapter_method('remote_update')
-        return method(record_ids, vals, *args, **kwargs)
+        res = method(record_ids, vals, *args, **kwargs)
+        self._result_cache_invalidate(self.current_table)
+        return res
 
     # Adapters
 
@@ -297,17 +1284,151 @@ class BaseExternalDbsource(models.Model):
     def connection_open_postgresql(self):
         return psycopg2.connect(self.conn_string_full)
 
+    def connection_reset_postgresql(self, connection):
+        return connection.rollback()
+
     def execute_postgresql(self, query, params, metadata):
         return self._execute_generic(query, params, metadata)
 
-    def _execute_generic(self, query, params, metadata):
+    def copy_from_postgresql(self, table, data, columns, format):
+        if not hasattr(data, 'read'):
+            data, format = CsvStream(data), 'csv'
+        statement = 'COPY %s%s FROM STDIN WITH (FORMAT %s)' % (
+            self._quote_identifier(table),
+            ' (%s)' % ', '.join(map(self._quote_identifier, columns))
+            if columns else '',
+            format,
+        )
         with self.connection_open() as connection:
+            transaction = self._transaction_begin(connection)
+            cursor = connection.cursor()
+            try:
+                cursor.copy_expert(statement, data)
+                count = cursor.rowcount
+                self._transaction_commit(connection, transaction)
+            except Exception:
+                self._transaction_rollback(connection, transaction)
+                raise
+            finally:
+                cursor.close()
+        return count
+
+    def copy_to_postgresql(self, query, params, file_obj, format):
+        with self.connection_open() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.copy_expert(
+                    b'COPY (%s) TO STDOUT WITH (FORMAT %s)' % (
+                        cursor.mogrify(query, params), format.encode(),
+                    ),
+                    file_obj,
+                )
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    def execute_many_postgresql(self, connection, query, param_seq):
+        cursor = connection.cursor()
+        try:
+            if VALUES_PLACEHOLDER.search(query):
+                psycopg2.extras.execute_values(
+                    cursor, query, param_seq, page_size=len(param_seq),
+                )
+            else:
+                psycopg2.extras.execute_batch(
+                    cursor, query, param_seq, page_size=len(param_seq),
+                )
+        finally:
+            cursor.close()
+
+    def execute_iter_postgresql(self, query, params, batch_size):
+        with self.connection_open() as connection:
+            # A named cursor is declared on the server, which only sends
+            # the rows that are fetched.
+            cursor = connection.cursor(name='dbsource_%s' % uuid.uuid4().hex)
+            cursor.itersize = batch_size
+            try:
+                with self._statement_timeout(connection):
+                    cursor.execute(query, params)
+                    rows = cursor.fetchmany(batch_size)
+                    yield [d[0] for d in cursor.description]
+                    while rows:
+                        yield rows
+                        rows = cursor.fetchmany(batch_size)
+            finally:
+                cursor.close()
+
+    def execute_connection_postgresql(self, connection, query, params):
+        cursor = connection.cursor()
+        try:
+            self._execute_prepared(connection, cursor, query, params)
+            if cursor.description is None:
+                return [], [], cursor.rowcount
+            cols = [d[0] for d in cursor.description]
+            with query_stats.phase('fetch'):
+                rows = cursor.fetchall()
+            return rows, cols, cursor.rowcount
+        finally:
+            cursor.close()
+
+    def remote_browse_postgresql(self, record_ids, *args, **kwargs):
+        return self._remote_browse_sql(record_ids, *args, **kwargs)
+
+    def remote_delete_postgresql(self, record_ids, *args, **kwargs):
+        return self._remote_delete_sql(record_ids, *args, **kwargs)
+
+    def remote_read_group_postgresql(self, domain, fields, groupby, *args,
+                                     **kwargs):
+        return self._remote_read_group_sql(
+            domain, fields, groupby, *args, **kwargs
+        )
+
+    def remote_search_postgresql(self, query, *args, **kwargs):
+        return self._remote_search_sql(query, *args, **kwargs)
+
+    def remote_update_postgresql(self, record_ids, vals, *args, **kwargs):
+        return self._remote_update_sql(record_ids, vals, *args, **kwargs)
+
+    @contextmanager
+    def statement_timeout_postgresql(self, connection, timeout):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SET LOCAL statement_timeout = %s', (timeout, ))
+        finally:
+            cursor.close()
+        try:
+            yield
+        except psycopg2.extensions.QueryCanceledError as e:
+            self._raise_statement_timeout(e)
+        # Restores the timeout of the server for the rest of the transaction
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SET LOCAL statement_timeout TO DEFAULT')
+        finally:
+            cursor.close()
+
+    def transaction_begin_postgresql(self, connection):
+        # psycopg2 opens transactions implicitly
+        return None
+
+    def transaction_commit_postgresql(self, connection, transaction):
+        return connection.commit()
+
+    def transaction_rollback_postgresql(self, connection, transaction):
+        return connection.rollback()
+
+    def _execute_generic(self, query, params, metadata):
+        with self.connection_open() as connection, \
+                self._statement_timeout(connection):
             cur = connection.cursor()
-            cur.execute(query, params)
+            self._execute_prepared(connection, cur, query, params)
             cols = []
+            if cur.description is None:
+                return [], cols
             if metadata:
                 cols = [d[0] for d in cur.description]
-            rows = cur.fetchall()
+            with query_stats.phase('fetch'):
+                rows = cur.fetchall()
             return rows, cols
 
     # Compatibility & Private
@@ -326,6 +1447,1071 @@ class BaseExternalDbsource(models.Model):
         with self.connection_open() as connection:
             return connection
 
+    @api.model
+    def _execute_all_worker(self, dbsource_id, starts, query, params,
+                            metadata):
+        """ It runs ``execute`` for ``execute_all`` in a worker thread. """
+
+        starts[dbsource_id] = time.time()
+        with api.Environment.manage(), self.pool.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            dbsource = env[self._name].browse(dbsource_id)
+            return dbsource.execute(query, params, metadata)
+
+    @api.model
+    def _execute_join(self, left, right, keys, outer, build, max_bytes,
+                      batch_size):
+        """ It yields the columns, then the batches of ``execute_join``. """
+
+        sides = [
+            side[0].execute_iter(
+                side[1], side[2] if len(side) > 2 else None, batch_size,
+            )
+            for side in (left, right)
+        ]
+        buffers = [SpilledRows(max_bytes=max_bytes) for _side in sides]
+        try:
+            cols = [rows.cols for rows in sides]
+            indexes = []
+            for side_cols, key in zip(cols, keys):
+                if key not in side_cols:
+                    raise ValueError('Join key %r not returned.' % key)
+                indexes.append(side_cols.index(key))
+            yield cols[0] + cols[1]
+            built = self._execute_join_build(sides, buffers, build)
+            probe = 1 - built
+            joined = hash_join(
+                buffers[built],
+                itertools.chain(buffers[probe], sides[probe]),
+                indexes[built], indexes[probe],
+                len(cols[built]), len(cols[probe]),
+                build_left=not built, outer=outer, max_bytes=max_bytes,
+            )
+            for batch in tools.split_every(batch_size, joined, list):
+                yield batch
+        finally:
+            for rows in sides:
+                rows.close()
+            for rows in buffers:
+                rows.close()
+
+    @api.model
+    def _execute_join_build(self, sides, buffers, build):
+        """ It reads the build side of a join into its buffer.
+
+        Unless the build side is given, both sides are read by batches in
+        turn until one of them is exhausted.
+
+        Returns:
+            (int) Index of the build side, ``0`` for the left one.
+        """
+
+        if build != 'auto':
+            built = ('left', 'right').index(build)
+            buffers[built].extend(sides[built])
+            return built
+        batches = [rows.batches() for rows in sides]
+        while True:
+            for index, side_batches in enumerate(batches):
+                batch = next(side_batches, None)
+                if batch is None:
+                    return index
+                buffers[index].extend(batch)
+
+    @api.model
+    def _execute_partition_worker(self, dbsource_id, query, params,
+                                  batch_size, statement_timeout):
+        """ It yields the batches of a partition of ``execute_partitioned``.
+
+        It is meant to be read in a worker thread, with a cursor of its own.
+        """
+
+        with api.Environment.manage(), self.pool.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            dbsource = env[self._name].browse(dbsource_id)
+            with dbsource.execute_iter(
+                query, params, batch_size,
+                statement_timeout=statement_timeout,
+            ) as rows:
+                yield rows.cols
+                yield from rows.batches()
+
+    @api.multi
+    def _partition_bounds(self, table, key_column, partitions, where=None,
+                          split='range'):
+        """ It returns the bounds of the key ranges of partitions.
+
+        Returns:
+            (list) Bounds of the consecutive ranges, or an empty list if no
+            row has a key.
+        """
+
+        compiler = DomainCompiler(
+            self._quote_identifier, self._sql_placeholder,
+        )
+        condition = compiler.compile(where or [])
+        params = compiler.params or None
+        key = self._quote_identifier(key_column)
+        table = self._quote_identifier(table)
+        low, high = self.execute(
+            'SELECT MIN(%s), MAX(%s) FROM %s WHERE %s' % (
+                key, key, table, condition,
+            ), params,
+        )[0]
+        if low is None:
+            return []
+        if split == 'range' and is_interpolable(low):
+            return split_range(low, high, partitions)
+        count = self.execute(
+            'SELECT COUNT(%s) FROM %s WHERE %s' % (key, table, condition),
+            params,
+        )[0][0]
+        bounds = [low]
+        for index in range(1, partitions):
+            rows = self.execute(
+                'SELECT %s FROM %s WHERE %s AND %s IS NOT NULL '
+                'ORDER BY %s LIMIT 1 OFFSET %d' % (
+                    key, table, condition, key, key,
+                    count * index // partitions,
+                ), params,
+            )
+            if rows and bounds[-1] < rows[0][0] < high:
+                bounds.append(rows[0][0])
+        bounds.append(high)
+        return bounds
+
+    @api.multi
+    def _get_routed_method(self, method_prefix, query, route=None):
+        """ It returns the adapter method running a query where it belongs.
+
+        Args:
+            method_prefix: (str) Prefix of the adapter method.
+            query: (str) Query the method will run.
+            route: (str) ``primary`` or ``replica`` to force where the query
+                runs. Read-only queries run on a replica by default, as long
+                as one is available.
+        Returns:
+            (callable) The adapter method.
+        """
+
+        self.ensure_one()
+        if route not in (None, 'primary', 'replica'):
+            raise ValueError('Unknown route %r.' % route)
+        if route == 'primary' or not self.replica_ids or \
+                self._get_session() is not None or (
+                route is None and not is_read_only(query)):
+            return self._get_adapter_method(method_prefix)
+        if method_prefix == 'execute':
+            return self._execute_replica
+        # Lazy methods only fail once consumed, too late to fail over.
+        replica_id = self._replica_router().choose(
+            self.replica_ids.ids, self.replica_policy,
+        )
+        target = self.browse(replica_id) if replica_id else self
+        return target._get_adapter_method(method_prefix)
+
+    @api.multi
+    def _execute_replica(self, query, params, metadata):
+        """ It executes a query on a replica, failing over to another one.
+
+        A replica whose query fails is ejected if it also fails its health
+        check. The query is then retried on another replica, or on the
+        primary data source if none is left.
+        """
+
+        router = self._replica_router()
+        failed = set()
+        while True:
+            replica_id = router.choose(
+                self.replica_ids.ids, self.replica_policy, failed,
+            )
+            if replica_id is None:
+                return self._get_adapter_method('execute')(
+                    query, params, metadata,
+                )
+            replica = self.browse(replica_id)
+            started = time.time()
+            try:
+                result = replica._get_adapter_method('execute')(
+                    query, params, metadata,
+                )
+            except Exception:
+                if replica._replica_healthy():
+                    raise
+                _logger.warning(
+                    'Ejecting replica %s of data source %s for %d seconds.',
+                    replica.name, self.name, self.replica_eject_time,
+                )
+                router.eject(replica_id, self.replica_eject_time)
+                replica._connection_dispose()
+                failed.add(replica_id)
+                continue
+            router.record(replica_id, time.time() - started)
+            return result
+
+    @api.multi
+    def _replica_healthy(self):
+        """ It tells whether a new connection to the data source opens. """
+
+        self.ensure_one()
+        try:
+            connection = self._get_adapter_method('connection_open')()
+            self._get_adapter_method('connection_close')(connection)
+        except Exception:
+            return False
+        return True
+
+    @api.multi
+    def _replica_router(self):
+        self.ensure_one()
+        return replicas.get_router((self.env.cr.dbname, self.id))
+
+    @api.multi
+    def _execute_spill(self, query, params, max_rows=0, max_bytes=0,
+                       route=None, statement_timeout=None):
+        """ It executes a query, spilling the rows beyond limits to disk.
+
+        Rows are streamed by ``execute_iter``, so that no more than the
+        limits and a batch of rows are ever held in memory.
+
+        Args:
+            query: (str) Read-only query to execute.
+            params: (mixed) Query parameters, see ``execute``.
+            max_rows: (int) Number of rows kept in memory, ``0`` for no
+                limit.
+            max_bytes: (int) Approximate size of the rows kept in memory,
+                ``0`` for no limit.
+            route: (str) Where to run the query, see ``execute``.
+            statement_timeout: (int) Milliseconds after which the query is
+                canceled, see ``execute``.
+        Returns:
+            (tuple) ``SpilledRows`` holding the rows, and column names.
+        """
+
+        rows = SpilledRows(max_rows, max_bytes)
+        try:
+            with self.execute_iter(
+                query, params, route=route,
+                statement_timeout=statement_timeout,
+            ) as result:
+                for batch in result.batches():
+                    rows.extend(batch)
+                cols = result.cols
+        except Exception:
+            rows.close()
+            raise
+        if rows.spilled:
+            _logger.info(
+                'Spilled rows of a query on data source %s to disk, %d '
+                'rows in total.', self.name, len(rows),
+            )
+        return rows, cols
+
+    @api.multi
+    def _execute_single_flight(self, fetch, query, params, metadata,
+                               route=None):
+        """ It fetches the rows of a query once for concurrent callers.
+
+        Args:
+            fetch: (callable) Returns the rows and columns of the query.
+            query: (str) Query, see ``execute``.
+            params: (mixed) Query parameters, see ``execute``.
+            metadata: (bool) Whether ``fetch`` returns the columns.
+            route: (str) Where the query runs, see ``execute``.
+        Returns:
+            (tuple) Rows and columns, copied for each caller so that none
+            of them sees the changes of another.
+        """
+
+        self.ensure_one()
+        key = (
+            normalize_query(query), result_cache.freeze(params),
+            bool(metadata), route, self._get_statement_timeout(),
+        )
+        group = singleflight.get_group((self.env.cr.dbname, self.id))
+        (rows, cols), shared = group.do(key, fetch)
+        if shared:
+            _logger.debug(
+                'Shared the result of a query in flight on data source %s.',
+                self.name,
+            )
+        return list(rows), list(cols)
+
+    @api.multi
+    def _execute_cached(self, method, query, params):
+        """ It returns the rows and columns of a query from the cache.
+
+        The adapter ``method`` is only called on cache misses.
+        """
+
+        cache = self._result_cache()
+        key = normalize_query(query), result_cache.freeze(params)
+        cached = cache.get(key)
+        if cached is result_cache.MISSING:
+            cached = method(query, params, True)
+            cache.set(
+                key, cached,
+                ttl=self.cache_ttl,
+                max_entries=self.cache_max_entries,
+                max_bytes=self.cache_max_bytes,
+                size=result_cache.estimate_size(cached[0]),
+            )
+        rows, cols = cached
+        return list(rows), list(cols)
+
+    @api.multi
+    def _execute_prepared(self, connection, cursor, query, params):
+        """ It executes a query on a PostgreSQL cursor, as a prepared
+        statement when enabled.
+
+        The statement is prepared on the first execution of the query on the
+        connection, then executed with the parameters of the next ones.
+        """
+
+        statements = self._prepared_statements(connection)
+        if statements is None or not is_preparable(query, params):
+            return cursor.execute(query, params)
+        # Parameters are declared with the types of their values
+        key = query, params_signature(params)
+        statement = statements.get(key)
+        if statement is None:
+            converted, keys = convert_placeholders(query.strip().rstrip(';'))
+            statement, evicted = statements.add(key, keys)
+            for name in evicted:
+                cursor.execute('DEALLOCATE %s' % name)
+            try:
+                cursor.execute('PREPARE %s%s AS %s' % (
+                    statement.name,
+                    ' (%s)' % ', '.join(
+                        param_type(params[k]) for k in keys
+                    ) if keys else '',
+                    converted,
+                ))
+            except Exception:
+                statements.remove(key)
+                raise
+        values = [params[key] for key in statement.keys]
+        try:
+            return cursor.execute('EXECUTE %s%s' % (
+                statement.name,
+                ' (%s)' % ', '.join(['%s'] * len(values)) if values else '',
+            ), values or None)
+        except psycopg2.Error as e:
+            if e.pgcode == psycopg2.errorcodes.INVALID_SQL_STATEMENT_NAME:
+                # The server lost the statements, such as after DISCARD ALL
+                statements.clear()
+            raise
+
+    @api.multi
+    def _prepared_statements(self, connection):
+        """ It returns the statements prepared on a pooled connection.
+
+        Returns:
+            (StatementCache) Statements of the connection, or ``None`` if
+            statements are not prepared on it.
+        """
+
+        if not self.prepared_statements:
+            return None
+        connection_pool = self._connection_pool()
+        if connection_pool is None:
+            return None
+        info = connection_pool.info(connection)
+        if info is None:
+            return None
+        statements = info.get('prepared_statements')
+        if statements is None:
+            statements = info['prepared_statements'] = StatementCache(
+                self.prepared_statements_max,
+            )
+        return statements
+
+    @api.multi
+    def _result_cache(self):
+        self.ensure_one()
+        return result_cache.get_cache((self.env.cr.dbname, self.id))
+
+    @api.multi
+    def _result_cache_invalidate(self, table=None):
+        """ It drops cached results, or only those mentioning ``table``. """
+
+        for record in self:
+            record._result_cache().invalidate(
+                lambda key: table is None or references_table(key[0], table)
+            )
+
+    @api.multi
+    def _copy_from_insert(self, table, rows, columns, page_size):
+        """ It loads rows into a table using batched inserts. """
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        names = ['p%d' % i for i in range(len(first))]
+        query = 'INSERT INTO %s%s VALUES (%s)' % (
+            self._quote_identifier(table),
+            ' (%s)' % ', '.join(map(self._quote_identifier, columns))
+            if columns else '',
+            ', '.join(map(self._sql_placeholder, names)),
+        )
+        param_seq = (
+            dict(zip(names, row))
+            for row in itertools.chain([first], rows)
+        )
+        return self.execute_many(query, param_seq, page_size=page_size)
+
+    @api.multi
+    def _execute_connection(self, connection, query, params=None):
+        """ It executes a query on an open connection.
+
+        This method calls adapter method ``execute_connection``, suffixed
+        with the adapter type.
+
+        Returns:
+            (tuple) The rows, the column names and the number of rows that
+            the statement affected.
+        """
+
+        method = self._get_adapter_method('execute_connection')
+        with self._measure(query) as measure:
+            rows, cols, count = method(connection, query, params)
+            measure.rows = len(rows) or max(count, 0)
+        return rows, cols, count
+
+    @api.multi
+    def _remote_chunk_size(self, chunk_size=None, reserved_params=0):
+        """ It returns the number of record IDs to send per statement.
+
+        Args:
+            chunk_size: (int) Requested size, ``remote_chunk_size`` if
+                empty.
+            reserved_params: (int) Number of other parameters bound in
+                the same statement.
+        """
+
+        chunk_size = chunk_size or self.remote_chunk_size
+        max_params = getattr(
+            self, 'MAX_PARAMS_%s' % self.connector.upper(), self.MAX_PARAMS,
+        )
+        if max_params:
+            chunk_size = min(chunk_size, max_params - reserved_params)
+        return max(chunk_size, 1)
+
+    @api.multi
+    def _remote_key_condition(self, record_ids):
+        """ It returns the condition and parameters matching record IDs. """
+
+        compiler = DomainCompiler(
+            self._quote_identifier, self._sql_placeholder,
+        )
+        where = compiler.compile([(self.current_key, 'in', record_ids)])
+        return where, compiler.params
+
+    @api.multi
+    def _remote_browse_sql(self, record_ids, fields=None, chunk_size=None):
+        """ It yields the records of the current table matching IDs.
+
+        IDs are read from ``record_ids`` lazily and sent by chunks, so that
+        memory usage only depends on the chunk size.
+
+        Args:
+            record_ids: (iter) Values of the key column to browse.
+            fields: (list) Columns to return, all of them if empty.
+            chunk_size: (int) Number of IDs per statement.
+        Returns:
+            (iter) Iterator of record mappings, in no particular order.
+        """
+
+        chunk_size = self._remote_chunk_size(chunk_size)
+        select = 'SELECT %s FROM %s WHERE ' % (
+            ', '.join(map(self._quote_identifier, fields)) if fields else '*',
+            self._quote_identifier(self.current_table),
+        )
+        with self.connection_open() as connection:
+            for chunk in tools.split_every(chunk_size, record_ids):
+                where, params = self._remote_key_condition(chunk)
+                rows, cols, count = self._execute_connection(
+                    connection, select + where, params,
+                )
+                for row in rows:
+                    yield dict(zip(cols, row))
+
+    @api.multi
+    def _remote_delete_sql(self, record_ids, chunk_size=None):
+        """ It deletes the records of the current table matching IDs.
+
+        Every chunk is deleted in the same transaction, which is committed
+        before returning.
+
+        Args:
+            record_ids: (iter) Values of the key column to delete.
+            chunk_size: (int) Number of IDs per statement.
+        Returns:
+            (iter) Iterator of bools telling whether each ID was deleted.
+        """
+
+        chunk_size = self._remote_chunk_size(chunk_size)
+        table = self._quote_identifier(self.current_table)
+        select = 'SELECT %s FROM %s WHERE ' % (
+            self._quote_identifier(self.current_key), table,
+        )
+        statuses = []
+        with self.connection_open() as connection:
+            transaction = self._transaction_begin(connection)
+            try:
+                for chunk in tools.split_every(chunk_size, record_ids):
+                    where, params = self._remote_key_condition(chunk)
+                    rows = self._execute_connection(
+                        connection, select + where, params,
+                    )[0]
+                    if rows:
+                        self._execute_connection(
+                            connection,
+                            'DELETE FROM %s WHERE %s' % (table, where),
+                            params,
+                        )
+                    found = set(row[0] for row in rows)
+                    statuses.extend(key in found for key in chunk)
+                self._transaction_commit(connection, transaction)
+            except Exception:
+                self._transaction_rollback(connection, transaction)
+                raise
+        return iter(statuses)
+
+    @api.multi
+    def _remote_update_sql(self, record_ids, vals, chunk_size=None):
+        """ It updates the records of the current table matching IDs.
+
+        Each chunk is updated, then read back and yielded before the next
+        one is updated, so that memory usage only depends on the chunk
+        size. Every chunk is updated in the same transaction, which is
+        committed once the iterator is exhausted, and rolled back if it is
+        closed before.
+
+        Args:
+            record_ids: (iter) Values of the key column to update.
+            vals: (dict) New values by column name.
+            chunk_size: (int) Number of IDs per statement.
+        Returns:
+            (iter) Lazy iterator of the updated record mappings.
+        """
+
+        if not vals:
+            yield from self._remote_browse_sql(
+                record_ids, chunk_size=chunk_size,
+            )
+            return
+        chunk_size = self._remote_chunk_size(chunk_size, len(vals))
+        values = {'v%d' % i: value for i, value in enumerate(vals.values())}
+        update = 'UPDATE %s SET %s WHERE ' % (
+            self._quote_identifier(self.current_table),
+            ', '.join(
+                '%s = %s' % (
+                    self._quote_identifier(column),
+                    self._sql_placeholder('v%d' % i),
+                )
+                for i, column in enumerate(vals)
+            ),
+        )
+        select = 'SELECT * FROM %s WHERE ' % (
+            self._quote_identifier(self.current_table),
+        )
+        with self.connection_open() as connection:
+            transaction = self._transaction_begin(connection)
+            try:
+                for chunk in tools.split_every(chunk_size, record_ids):
+                    where, params = self._remote_key_condition(chunk)
+                    self._execute_connection(
+                        connection, update + where, dict(params, **values),
+                    )
+                    rows, cols, count = self._execute_connection(
+                        connection, select + where, params,
+                    )
+                    for row in rows:
+                        yield dict(zip(cols, row))
+                self._transaction_commit(connection, transaction)
+            except BaseException:
+                # Also when the iterator is closed before being exhausted
+                self._transaction_rollback(connection, transaction)
+                raise
+        # Results cached while the transaction was pending are stale
+        self._result_cache_invalidate(self.current_table)
+
+    @api.multi
+    def _remote_search_sql(self, domain, fields=None, limit=None, offset=0,
+                           order=None, count=False, batch_size=1000):
+        """ It searches the current table with a domain evaluated remotely.
+
+        Args:
+            domain: (list) Odoo domain whose leaves are ``(column, operator,
+                value)`` tuples on the columns of the table.
+            fields: (list) Columns to return, all of them if empty.
+            limit: (int) Maximum number of rows to return.
+            offset: (int) Number of rows to skip.
+            order: (str) Sort order, such as ``name desc, id``.
+            count: (bool) Whether to return the number of matching rows.
+            batch_size: (int) Number of rows fetched per round trip.
+        Returns:
+            (iter|int) Iterator of record mappings that match the domain,
+            or their number if ``count`` is set.
+        """
+
+        compiler = DomainCompiler(
+            self._quote_identifier, self._sql_placeholder,
+        )
+        where = compiler.compile(domain or [])
+        table = self._quote_identifier(self.current_table)
+        params = compiler.params or None
+        if count:
+            query = 'SELECT COUNT(*) FROM %s WHERE %s' % (table, where)
+            return self.execute(query, params)[0][0]
+        query = 'SELECT %s FROM %s WHERE %s' % (
+            ', '.join(map(self._quote_identifier, fields)) if fields else '*',
+            table, where,
+        )
+        if order:
+            query += ' ORDER BY %s' % compile_order(
+                order, self._quote_identifier,
+            )
+        if limit or offset:
+            no_limit = getattr(
+                self, 'NO_LIMIT_%s' % self.connector.upper(), self.NO_LIMIT,
+            )
+            query += ' LIMIT %s' % (int(limit) if limit else no_limit)
+            if offset:
+                query += ' OFFSET %d' % int(offset)
+        return self.execute_iter(query, params, batch_size).mappings()
+
+    @api.multi
+    def _remote_read_group_sql(self, domain, fields, groupby, offset=0,
+                               limit=None, orderby=False, lazy=True):
+        """ It groups the current table with a single ``GROUP BY`` query.
+
+        Arguments and results are those of Odoo's ``read_group``, except
+        that columns have no field definitions to tell their type or
+        aggregate function from.
+
+        Args:
+            domain: (list) Odoo domain on the columns of the table.
+            fields: (list) Aggregated columns, such as ``amount`` for their
+                sum, ``amount:max`` or ``total:sum(amount)``, with any
+                function of ``sql.AGGREGATES``. Grouped columns are ignored.
+            groupby: (list|str) Grouped columns, such as ``state``. Dates
+                are grouped by period with ``date:day``, ``date:week``,
+                ``date:month``, ``date:quarter`` or ``date:year``.
+            offset: (int) Number of groups to skip.
+            limit: (int) Maximum number of groups to return.
+            orderby: (str) Sort order of the groups, on grouped or
+                aggregated fields or on the count, such as ``amount desc``.
+                Groups are sorted by the grouped fields by default.
+            lazy: (bool) Only group by the first field, the others being
+                left in the ``__context`` of every group.
+        Returns:
+            (list) A dict per group, holding the value of each grouped field,
+            the label of the period for dates, the aggregated values, the
+            number of records under ``<field>_count``, or ``__count`` if not
+            lazy, and the domain of the records of the group under
+            ``__domain``.
+        """
+
+        groupby = [groupby] if isinstance(groupby, str) else list(groupby)
+        groups = groupby[:1] if lazy else groupby
+        quote = self._quote_identifier
+        date_groups = getattr(
+            self, 'DATE_GROUPS_%s' % self.connector.upper(), self.DATE_GROUPS,
+        )
+        selects, expressions, specs = [], [], []
+        for spec in groups:
+            column, _sep, period = spec.partition(':')
+            expr = quote(column)
+            if period:
+                if period not in date_groups:
+                    raise ValueError('Invalid date period %r.' % period)
+                expr = date_groups[period].format(expr)
+            selects.append('%s AS %s' % (expr, quote(spec)))
+            expressions.append(expr)
+            specs.append((spec, column, period))
+        grouped = {column for _spec, column, _period in specs} | set(groups)
+        count_key = '%s_count' % (
+            specs[0][1] if lazy and specs else '_'
+        )
+        selects.append('COUNT(*) AS %s' % quote(count_key))
+        names = set(groups) | {count_key}
+        for field in fields or []:
+            name, function, column = parse_aggregate(field)
+            if name in grouped or name in names:
+                continue
+            selects.append('%s AS %s' % (
+                AGGREGATES[function].format(quote(column)), quote(name),
+            ))
+            names.add(name)
+        compiler = DomainCompiler(quote, self._sql_placeholder)
+        where = compiler.compile(domain or [])
+        query = 'SELECT %s FROM %s WHERE %s' % (
+            ', '.join(selects), quote(self.current_table), where,
+        )
+        if expressions:
+            query += ' GROUP BY %s' % ', '.join(expressions)
+        order = orderby or ','.join(groups)
+        if order:
+            query += ' ORDER BY %s' % ', '.join(
+                '%s %s' % (quote(name), 'DESC' if descending else 'ASC')
+                for name, descending in parse_group_order(order, names)
+            )
+        if limit or offset:
+            no_limit = getattr(
+                self, 'NO_LIMIT_%s' % self.connector.upper(), self.NO_LIMIT,
+            )
+            query += ' LIMIT %s' % (int(limit) if limit else no_limit)
+            if offset:
+                query += ' OFFSET %d' % int(offset)
+        result = self.execute(query, compiler.params or None, metadata=True)
+        locale = self.env.context.get('lang') or 'en_US'
+        res = []
+        for row in result['rows']:
+            group = dict(zip(result['cols'], row))
+            sections = []
+            for spec, column, period in specs:
+                value = group[spec]
+                if value is None:
+                    group[spec] = False
+                    sections.append([(column, '=', None)])
+                elif period:
+                    start = self._read_group_date(value)
+                    end = start + DATE_GROUP_INTERVALS[period]
+                    group[spec] = babel.dates.format_date(
+                        start, format=DATE_GROUP_FORMATS[period],
+                        locale=locale,
+                    )
+                    date_format = tools.DEFAULT_SERVER_DATE_FORMAT
+                    sections.append([
+                        (column, '>=', start.strftime(date_format)),
+                        (column, '<', end.strftime(date_format)),
+                    ])
+                else:
+                    sections.append([(column, '=', value)])
+            group['__domain'] = expression.AND(sections + [domain or []])
+            if len(groupby) > len(groups):
+                group['__context'] = {'group_by': groupby[len(groups):]}
+            res.append(group)
+        return res
+
+    @api.model
+    def _read_group_date(self, value):
+        """ It returns the date starting the period of a group. """
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, str):
+            return fields.Date.from_string(value[:10])
+        return value
+
+    @api.multi
+    def _paginate_token_dump(self, order, values):
+        """ It returns the pagination token of the last key values seen. """
+
+        state = json.dumps({
+            'table': self.current_table,
+            'order': order,
+            'after': values,
+        }, default=str)
+        return base64.urlsafe_b64encode(state.encode('utf-8')).decode('ascii')
+
+    @api.multi
+    def _paginate_token_load(self, token, order):
+        """ It returns the key values stored in a pagination token.
+
+        Raises:
+            ValueError: If the token is malformed, or was issued for another
+                table or sort order.
+        """
+
+        try:
+            state = base64.urlsafe_b64decode(token.encode('ascii'))
+            state = json.loads(state.decode('utf-8'))
+            values = state['after']
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise ValueError('Invalid pagination token.')
+        if state.get('table') != self.current_table or \
+                state.get('order') != order:
+            raise ValueError(
+                'Pagination token issued for another table or order.',
+            )
+        return values
+
+    @api.multi
+    def _quote_identifier(self, name):
+        """ It quotes a possibly schema qualified identifier for the remote.
+
+        Args:
+            name: (str) Name such as ``table`` or ``schema.table``.
+        Returns:
+            (str) The quoted identifier, such as ``"schema"."table"``.
+        """
+
+        quote = getattr(
+            self, 'IDENTIFIER_QUOTE_%s' % self.connector.upper(),
+            self.IDENTIFIER_QUOTE,
+        )
+        return '.'.join(
+            '%s%s%s' % (quote, part.replace(quote, quote * 2), quote)
+            for part in name.split('.')
+        )
+
+    @api.multi
+    def _sql_placeholder(self, name):
+        """ It returns the placeholder of a named query parameter. """
+
+        placeholder = getattr(
+            self, 'PLACEHOLDER_%s' % self.connector.upper(),
+            self.PLACEHOLDER,
+        )
+        return placeholder % name
+
+    @api.multi
+    def _connection_pool(self):
+        """ It returns the connection pool of the data source.
+
+        Returns:
+            (ConnectionPool) The pool, or ``None`` if pooling is disabled.
+        """
+
+        self.ensure_one()
+        pooled = getattr(
+            self, 'CONNECTION_POOL_%s' % self.connector.upper(),
+            self.CONNECTION_POOL,
+        )
+        if not pooled or self.pool_size_max <= 0:
+            return None
+        return pool.get_pool(
+            self._connection_pool_key(),
+            self._get_adapter_method('connection_close'),
+            size_min=self.pool_size_min,
+            size_max=self.pool_size_max,
+            idle_timeout=self.pool_idle_timeout,
+            max_lifetime=self.pool_max_lifetime,
+        )
+
+    @api.multi
+    def _connection_pool_key(self):
+        self.ensure_one()
+        return self.env.cr.dbname, self.id, self.conn_string_full
+
+    @api.multi
+    def _connection_dispose(self):
+        """ It closes the pooled connections of the data sources.
+
+        Cached results are dropped as well, as they may come from another
+        database than the one the data source now connects to, along with
+        the group sharing the results of queries in flight.
+        """
+
+        for record in self:
+            pool.dispose_pools(
+                record.env.cr.dbname, record.id,
+                record._get_adapter_method('connection_close'),
+            )
+            result_cache.drop_caches(record.env.cr.dbname, record.id)
+            replicas.drop_router(record.env.cr.dbname, record.id)
+            singleflight.drop_group(record.env.cr.dbname, record.id)
+
+    def _get_connection_reset_method(self):
+        """ It returns the optional ``connection_reset`` adapter method.
+
+        The method is called before a connection goes back to the pool, in
+        order to end any pending transaction.
+        """
+
+        return getattr(self, 'connection_reset_%s' % self.connector, None)
+
+    def _transaction_begin(self, connection):
+        """ It starts a transaction on the connection.
+
+        Inside a session, the transaction of the session is used instead,
+        and ``_transaction_commit`` and ``_transaction_rollback`` do
+        nothing.
+
+        Returns:
+            (mixed) Transaction handle to pass to ``_transaction_commit``
+            or ``_transaction_rollback``.
+        """
+
+        if self._get_session() is not None:
+            return None
+        method = self._get_adapter_method('transaction_begin')
+        return method(connection)
+
+    def _transaction_commit(self, connection, transaction):
+        if self._get_session() is not None:
+            return None
+        method = self._get_adapter_method('transaction_commit')
+        return method(connection, transaction)
+
+    def _transaction_rollback(self, connection, transaction):
+        if self._get_session() is not None:
+            return None
+        method = self._get_adapter_method('transaction_rollback')
+        return method(connection, transaction)
+
+    @contextmanager
+    def _statement_timeout(self, connection):
+        """ It applies the statement timeout to the queries run within.
+
+        This method calls the optional adapter method ``statement_timeout``,
+        suffixed with the adapter type, which must return a context manager
+        limiting the duration of the statements run on ``connection`` to a
+        number of milliseconds, and raising ``StatementTimeoutError`` when
+        one of them is canceled.
+        """
+
+        timeout = self._get_statement_timeout()
+        method = getattr(self, 'statement_timeout_%s' % self.connector, None)
+        if not timeout or method is None:
+            yield
+            return
+        with method(connection, timeout):
+            yield
+
+    def _get_statement_timeout(self):
+        """ It returns the statement timeout in milliseconds, 0 for none. """
+        timeout = self.env.context.get('dbsource_statement_timeout')
+        if timeout is None:
+            timeout = self.statement_timeout
+        return int(timeout or 0)
+
+    def _with_statement_timeout(self, statement_timeout=None):
+        """ It returns the record applying a per-call statement timeout. """
+        if statement_timeout is None:
+            return self
+        return self.with_context(dbsource_statement_timeout=statement_timeout)
+
+    def _raise_statement_timeout(self, error):
+        raise StatementTimeoutError(_(
+            'The query on data source %s was canceled after running for '
+            'more than %d ms.'
+        ) % (self.name, self._get_statement_timeout())) from error
+
+    @api.multi
+    @contextmanager
+    def _measure(self, query, phase='execute'):
+        """ It measures a query for the statistics of the data source.
+
+        The time spent within is split between the connection, the
+        execution and the fetch of the rows. Queries run while another one
+        is being measured are part of it, and are not measured again.
+
+        Args:
+            query: (str) Query run within, stored in its generalized form.
+            phase: (str) Phase of the time not otherwise measured.
+        Yields:
+            (query_stats.Measure) Measure whose ``rows`` are to be set.
+        """
+
+        if not self.stats_enabled or query_stats.current() is not None:
+            yield query_stats.Measure(query)
+            return
+        measure = query_stats.Measure(generalize_query(query))
+        try:
+            with measure.running(phase):
+                yield measure
+        finally:
+            self._stats_record(measure)
+
+    @api.multi
+    def _measure_batches(self, query, batches):
+        """ It measures the batches of rows of an ``execute_iter_*`` method.
+
+        The time spent up to the column names counts as execution, and the
+        time spent getting the next batches as fetches.
+        """
+
+        if query_stats.current() is not None:
+            yield from batches
+            return
+        measure = query_stats.Measure(generalize_query(query))
+        try:
+            with measure.running('execute'):
+                cols = next(batches)
+            yield cols
+            while True:
+                with measure.running('fetch'):
+                    rows = next(batches, None)
+                if rows is None:
+                    break
+                measure.rows += len(rows)
+                yield rows
+        finally:
+            batches.close()
+            self._stats_record(measure)
+
+    @api.multi
+    def _stats_record(self, measure):
+        """ It adds a measure to the statistics of the data source.
+
+        Statistics are collected in the memory of the worker, and flushed
+        to the database every ``STATS_FLUSH_INTERVAL`` seconds.
+        """
+
+        self.ensure_one()
+        dbname = self.env.cr.dbname
+        collector = query_stats.get_collector((dbname, self.id))
+        if collector.record(measure, self.slow_query_threshold):
+            _logger.warning(
+                'Slow query on data source %s (%d ms): %s',
+                self.name, measure.elapsed, measure.query,
+            )
+        if getattr(threading.currentThread(), 'testing', False):
+            return
+        if query_stats.flush_due(dbname, self.STATS_FLUSH_INTERVAL):
+            self._stats_flush()
+
+    @api.model
+    def _stats_flush(self):
+        """ It stores the statistics collected by the worker.
+
+        A cursor of its own is used, so that the statistics do not depend
+        on the outcome of the current transaction.
+        """
+
+        try:
+            with api.Environment.manage(), self.pool.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env[self._name]._stats_store()
+        except Exception:
+            _logger.exception('Query statistics flush failure.')
+
+    @api.model
+    def _stats_store(self):
+        """ It stores the statistics collected by the worker so far. """
+
+        drained = query_stats.drain_collectors(self.env.cr.dbname)
+        SlowQuery = self.env['base.external.dbsource.slow.query']
+        for record in self.browse(list(drained)).exists():
+            queries, slow = drained[record.id]
+            self.env['base.external.dbsource.stat']._add_stats(
+                record, queries,
+            )
+            for measure in slow:
+                SlowQuery.create(SlowQuery._prepare_values(record, measure))
+        SlowQuery._gc()
+
+    @api.model
+    def _cron_stats_flush(self):
+        """ It stores the statistics collected by the cron worker. """
+        self._stats_store()
+
+    @api.multi
+    def _get_snapshot(self, query):
+        """ It returns the refreshed snapshot of a query, if any. """
+        self.ensure_one()
+        return self.snapshot_ids.filtered(
+            lambda s: s.last_refresh and s._matches(query),
+        )[:1]
+
+    def _get_session(self):
+        """ It returns the session open on the data source, if any. """
+        return sessions.get_session((self.env.cr.dbname, self.id))
+
     def _get_adapter_method(self, method_prefix):
         """ It returns the connector adapter method for ``method_prefix``.
 
@@ -0,0 +1,249 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+from odoo import _, api, models
+from odoo.exceptions import MissingError, UserError
+
+from .. import cache as result_cache
+from ..sql import parse_order
+
+
+class BaseExternalDbsourceModel(models.AbstractModel):
+    """ It makes the rows of an external table browsable as Odoo records.
+
+    Concrete models inherit from this mixin, set ``_auto = False`` so that
+    no local table is created, declare the XML ID of their data source in
+    ``_dbsource``, the table in ``_remote_table`` and its integer key
+    column in ``_remote_key``, and define a field per column of the same
+    name. ``search`` and ``read`` are then evaluated on the remote:
+
+    * Searches compile their domain to a ``WHERE`` clause, and fetch the
+      rows found along with their IDs.
+    * Reads of records missing from the cache are batched into one
+      ``IN`` query per chunk of ``remote_chunk_size`` IDs, whatever the
+      number of records Odoo prefetches.
+    * Rows are kept in a process-wide cache for ``_remote_cache_ttl``
+      seconds, so that reading the records of a search, such as the page
+      of a list view, does not query the remote again.
+
+    Records are read-only, and record rules are not applied.
+    """
+
+    _name = 'base.external.dbsource.model'
+    _description = 'External Table Model'
+    _auto = False
+
+    # XML ID of the data source holding the table
+    _dbsource = None
+    _remote_table = None
+    _remote_key = 'id'
+    # Seconds rows are cached for, 0 to disable the cache
+    _remote_cache_ttl = 60
+    _remote_cache_max_entries = 10000
+
+    @api.model
+    def create(self, vals):
+        raise UserError(_('Records of %s are read-only.') % self._description)
+
+    @api.multi
+    def write(self, vals):
+        raise UserError(_('Records of %s are read-only.') % self._description)
+
+    @api.multi
+    def unlink(self):
+        raise UserError(_('Records of %s are read-only.') % self._description)
+
+    @api.model
+    def _search(self, args, offset=0, limit=None, order=None, count=False,
+                access_rights_uid=None):
+        """ It searches the remote table, caching the rows found.
+
+        Rows are fetched whole when the cache is enabled, so that reading
+        the records found is served by the cache.
+        """
+
+        self.sudo(access_rights_uid or self._uid).check_access_rights('read')
+        args = list(args or [])
+        if 'active' in self._fields and \
+                self.env.context.get('active_test', True) and \
+                not any(leaf[0] == 'active' for leaf in args
+                        if isinstance(leaf, (list, tuple))):
+            args = [('active', '=', True)] + args
+        dbsource = self._remote_dbsource()
+        domain = self._remote_domain(args)
+        if count:
+            return dbsource.remote_search(domain, count=True)
+        cache = self._remote_cache()
+        rows = dbsource.remote_search(
+            domain,
+            fields=self._remote_columns() if cache is not None
+            else [self._remote_key],
+            limit=limit, offset=offset,
+            order=self._remote_order(order or self._order),
+        )
+        ids = []
+        for row in rows:
+            ids.append(row[self._remote_key])
+            self._remote_cache_set(cache, row)
+        return ids
+
+    @api.multi
+    def exists(self):
+        rows = self._remote_rows()
+        return self.browse([i for i in self._ids if i in rows])
+
+    @api.multi
+    def _read_from_database(self, field_names, inherited_field_names=None):
+        """ It reads the rows of the records into the record cache.
+
+        Every column is read, whatever ``field_names``, so that the other
+        fields of the records are found in the cache too.
+        """
+
+        rows = self._remote_rows()
+        for record in self:
+            row = rows.get(record.id)
+            if row is not None:
+                record._cache.update(record._convert_to_cache(
+                    self._remote_values(row), validate=False,
+                ))
+        missing = self.browse([i for i in self._ids if i not in rows])
+        if missing:
+            missing._cache.set_failed(self._fields, MissingError(
+                _('Record does not exist or has been deleted.'),
+            ))
+
+    @api.model
+    def remote_cache_clear(self, ids=None):
+        """ It drops the cached rows of the model, or those of ``ids``. """
+
+        cache = self._remote_cache()
+        if cache is None:
+            return
+        if ids is None:
+            cache.clear()
+        else:
+            ids = set(ids)
+            cache.invalidate(lambda key: key in ids)
+
+    @api.model
+    def _remote_dbsource(self):
+        """ It returns the data source, set to the table of the model. """
+
+        assert self._dbsource and self._remote_table
+        dbsource = self.env.ref(self._dbsource).sudo()
+        dbsource.change_table(self._remote_table, self._remote_key)
+        return dbsource
+
+    @api.model
+    def _remote_columns(self):
+        """ It returns the columns of the remote table read by the model. """
+
+        return [self._remote_key] + [
+            name for name, field in self._fields.items()
+            if field.store and field.column_type and name != 'id'
+            and name != self._remote_key
+        ]
+
+    @api.model
+    def _remote_values(self, row):
+        """ It returns the field values of a remote row. """
+
+        return {
+            name: row[name] for name in self._remote_columns()
+            if name in self._fields and name != 'id'
+        }
+
+    @api.model
+    def _remote_column(self, name):
+        if name == 'id':
+            return self._remote_key
+        field = self._fields.get(name)
+        if field is None or not field.store or not field.column_type:
+            raise ValueError(
+                'Invalid field %r of %s for the remote.' % (name, self._name)
+            )
+        return name
+
+    @api.model
+    def _remote_domain(self, domain):
+        """ It translates the field names of a domain to remote columns.
+
+        Comparisons of other than boolean fields to ``False``, by which
+        Odoo tells whether they are set, are made to NULL.
+        """
+
+        return [
+            self._remote_leaf(leaf)
+            if isinstance(leaf, (list, tuple)) and isinstance(leaf[0], str)
+            else leaf
+            for leaf in domain
+        ]
+
+    @api.model
+    def _remote_leaf(self, leaf):
+        name, operator, value = leaf
+        column = self._remote_column(name)
+        field = self._fields.get(name)
+        if value is False and operator in ('=', '!=') and \
+                (field is None or field.type != 'boolean'):
+            value = None
+        return (column, operator, value)
+
+    @api.model
+    def _remote_order(self, order):
+        """ It translates an Odoo order to an order of remote columns. """
+
+        return ', '.join(
+            '%s %s' % (self._remote_column(name), 'desc' if desc else 'asc')
+            for name, desc in parse_order(order)
+        )
+
+    @api.multi
+    def _remote_rows(self):
+        """ It returns the rows of the records, by ID.
+
+        Rows are taken from the cache when there, and the others are read
+        by chunks of IDs over one connection.
+        """
+
+        cache = self._remote_cache()
+        rows = {}
+        missing_ids = []
+        for record_id in set(self._ids):
+            if not isinstance(record_id, int):
+                continue
+            row = cache.get(record_id) if cache is not None else \
+                result_cache.MISSING
+            if row is result_cache.MISSING:
+                missing_ids.append(record_id)
+            else:
+                rows[record_id] = row
+        if missing_ids:
+            remote_rows = self._remote_dbsource().remote_browse(
+                missing_ids, fields=self._remote_columns(),
+            )
+            for row in remote_rows:
+                rows[row[self._remote_key]] = row
+                self._remote_cache_set(cache, row)
+        return rows
+
+    @api.model
+    def _remote_cache(self):
+        """ It returns the process-wide cache of the rows of the model. """
+
+        if self._remote_cache_ttl <= 0:
+            return None
+        dbsource = self.env.ref(self._dbsource)
+        return result_cache.get_cache(
+            (self.env.cr.dbname, dbsource.id, 'model', self._name),
+        )
+
+    @api.model
+    def _remote_cache_set(self, cache, row):
+        if cache is not None:
+            cache.set(
+                row[self._remote_key], row,
+                ttl=self._remote_cache_ttl,
+                max_entries=self._remote_cache_max_entries,
+                size=result_cache.estimate_size([tuple(row.values())]),
+            )
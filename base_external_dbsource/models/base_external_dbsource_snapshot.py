@@ -0,0 +1,303 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import decimal
+import logging
+import re
+import threading
+
+from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+
+from ..sql import is_read_only, normalize_query
+from ..streams import CsvStream
+
+_logger = logging.getLogger(__name__)
+
+# Local column types by Python type of the values, in order of precedence
+COLUMN_TYPES = [
+    (bool, 'boolean'),
+    (int, 'bigint'),
+    (float, 'double precision'),
+    (decimal.Decimal, 'numeric'),
+    (datetime.datetime, 'timestamp'),
+    (datetime.date, 'date'),
+    (datetime.time, 'time'),
+    ((bytes, bytearray, memoryview), 'bytea'),
+]
+
+
+class BaseExternalDbsourceSnapshot(models.Model):
+    """ It materializes the result of an external query in a local table.
+
+    The rows are bulk loaded into a new table of the Odoo database, which
+    then replaces the previous one in the same transaction, so that
+    readers always see a complete snapshot. The local table can be queried
+    with the cursor of Odoo, using its local indexes, or transparently by
+    ``execute`` with ``use_snapshot=True``.
+    """
+
+    _name = 'base.external.dbsource.snapshot'
+    _description = 'External Database Snapshot'
+    _order = 'name, id'
+
+    # Prefix of the local tables, which keeps snapshots away from the
+    # tables of Odoo models.
+    TABLE_PREFIX = 'dbsource_snapshot_'
+
+    name = fields.Char(required=True)
+    active = fields.Boolean(default=True)
+    dbsource_id = fields.Many2one(
+        'base.external.dbsource',
+        'Data source',
+        required=True,
+        ondelete='cascade',
+    )
+    query = fields.Text(
+        required=True,
+        help='SELECT query whose result is copied to the local table.',
+    )
+    table_name = fields.Char(
+        'Local table',
+        required=True,
+        help='Name of the table of the Odoo database holding the rows. It '
+             'must start with "dbsource_snapshot_".',
+    )
+    index_columns = fields.Char(
+        'Indexed columns',
+        help='Comma separated columns indexed in the local table. Use '
+             '"+" to index several columns together, such as '
+             '"code, partner_id+date".',
+    )
+    refresh_interval = fields.Integer(
+        'Refresh interval',
+        default=60,
+        help='Minutes after which the snapshot is refreshed by the '
+             'scheduled action. Set to 0 to only refresh it manually.',
+    )
+    batch_size = fields.Integer(
+        default=10000,
+        help='Number of rows fetched from the remote per round trip.',
+    )
+    last_refresh = fields.Datetime(readonly=True)
+    row_count = fields.Integer('Rows', readonly=True)
+    duration = fields.Float(
+        readonly=True,
+        help='Seconds the last refresh took.',
+    )
+
+    _sql_constraints = [
+        ('table_name_uniq', 'unique (table_name)',
+         'Each snapshot must have a local table of its own.'),
+    ]
+
+    @api.multi
+    @api.constrains('query')
+    def _check_query(self):
+        for record in self:
+            if not is_read_only(record.query):
+                raise ValidationError(_(
+                    'The snapshot query must be a read-only SELECT query.'
+                ))
+
+    @api.multi
+    @api.constrains('table_name')
+    def _check_table_name(self):
+        for record in self:
+            name = record.table_name
+            if not re.match(r'^[a-z_][a-z0-9_]*$', name) or \
+                    not name.startswith(self.TABLE_PREFIX) or \
+                    name == self.TABLE_PREFIX or len(name) > 50:
+                raise ValidationError(_(
+                    'The local table name must be made of at most 50 '
+                    'lowercase letters, digits and underscores, and start '
+                    'with "%s".'
+                ) % self.TABLE_PREFIX)
+
+    @api.multi
+    @api.constrains('refresh_interval', 'batch_size')
+    def _check_refresh_settings(self):
+        for record in self:
+            if record.refresh_interval < 0 or record.batch_size < 1:
+                raise ValidationError(_(
+                    'The refresh interval cannot be negative and the batch '
+                    'size must be positive.'
+                ))
+
+    @api.multi
+    def write(self, vals):
+        if 'table_name' in vals:
+            for record in self:
+                if record.table_name != vals['table_name']:
+                    record._drop_table(record.table_name)
+            vals = dict(vals, last_refresh=False, row_count=0)
+        return super(BaseExternalDbsourceSnapshot, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        for record in self:
+            record._drop_table(record.table_name)
+        return super(BaseExternalDbsourceSnapshot, self).unlink()
+
+    @api.model
+    def _cron_refresh(self):
+        """ It refreshes the snapshots whose refresh interval elapsed. """
+        now = datetime.datetime.utcnow()
+        for record in self.search([('refresh_interval', '>', 0)]):
+            if record.last_refresh:
+                due = fields.Datetime.from_string(record.last_refresh) + \
+                    datetime.timedelta(minutes=record.refresh_interval)
+                if due > now:
+                    continue
+            try:
+                record.action_refresh()
+            except Exception:
+                self.env.cr.rollback()
+                self.env.clear()
+                _logger.exception('Snapshot %s refresh failed.', record.name)
+
+    @api.multi
+    def action_refresh(self):
+        """ It loads the rows of the query into a new table, then swaps it
+        with the current one.
+        """
+
+        for record in self:
+            started = datetime.datetime.utcnow()
+            count = record._load()
+            record.write({
+                'last_refresh': fields.Datetime.to_string(started),
+                'row_count': count,
+                'duration': (
+                    datetime.datetime.utcnow() - started
+                ).total_seconds(),
+            })
+            record._commit()
+        return True
+
+    @api.multi
+    def _read_rows(self):
+        """ It reads the rows of the snapshot from its local table.
+
+        Returns:
+            (dict) Column names under ``cols`` and rows under ``rows``, like
+            ``base.external.dbsource.execute`` with ``metadata``.
+        """
+
+        self.ensure_one()
+        cr = self.env.cr
+        cr.execute('SELECT * FROM "%s"' % self.table_name)
+        return {
+            'cols': [d[0] for d in cr.description],
+            'rows': cr.fetchall(),
+        }
+
+    @api.multi
+    def _matches(self, query):
+        """ It tells whether a query is the query of the snapshot. """
+        self.ensure_one()
+        return self._normalize(self.query) == self._normalize(query)
+
+    @api.model
+    def _normalize(self, query):
+        return normalize_query(query).rstrip(';').rstrip()
+
+    @api.multi
+    def _load(self):
+        """ It replaces the local table by the current rows of the query.
+
+        Returns:
+            (int) Number of rows loaded.
+        """
+
+        self.ensure_one()
+        cr = self.env.cr
+        table = self.table_name
+        new_table = '%s__new' % table
+        query = self.query.strip().rstrip(';')
+        with self.dbsource_id.execute_iter(
+            query, batch_size=self.batch_size,
+        ) as rows:
+            cols = [col.replace('"', '""') for col in rows.cols]
+            # Rows are loaded as text, then the columns are converted to
+            # the type of all their values, which are only known once read.
+            found = [set() for _col in cols]
+            cr.execute('DROP TABLE IF EXISTS "%s"' % new_table)
+            cr.execute('CREATE TABLE "%s" (%s)' % (new_table, ', '.join(
+                '"%s" text' % col for col in cols
+            )))
+            cr.copy_expert(
+                'COPY "%s" FROM STDIN WITH (FORMAT csv)' % new_table,
+                CsvStream(self._observe_types(rows, found)),
+            )
+            count = cr.rowcount
+        conversions = [
+            'ALTER COLUMN "%s" TYPE %s USING "%s"::%s' % (
+                col, column_type, col, column_type,
+            )
+            for col, column_type in zip(
+                cols, map(self._merge_column_types, found),
+            )
+            if column_type != 'text'
+        ]
+        if conversions:
+            cr.execute('ALTER TABLE "%s" %s' % (
+                new_table, ', '.join(conversions),
+            ))
+        for columns in (self.index_columns or '').split(','):
+            columns = [c.strip() for c in columns.split('+') if c.strip()]
+            if columns:
+                cr.execute('CREATE INDEX ON "%s" (%s)' % (new_table, ', '.join(
+                    '"%s"' % c.replace('"', '""') for c in columns
+                )))
+        cr.execute('ANALYZE "%s"' % new_table)
+        # Readers keep the previous table until the transaction commits
+        cr.execute('DROP TABLE IF EXISTS "%s"' % table)
+        cr.execute('ALTER TABLE "%s" RENAME TO "%s"' % (new_table, table))
+        return count
+
+    @api.model
+    def _observe_types(self, rows, found):
+        """ It yields rows, adding the local types of their values to the
+        sets of ``found``, one per column.
+        """
+
+        types = {}
+        for row in rows:
+            for index, value in enumerate(row):
+                if value is None:
+                    continue
+                python_type = type(value)
+                column_type = types.get(python_type)
+                if column_type is None:
+                    column_type = types[python_type] = next((
+                        column_type
+                        for python_types, column_type in COLUMN_TYPES
+                        if issubclass(python_type, python_types)
+                    ), 'text')
+                found[index].add(column_type)
+            yield row
+
+    @api.model
+    def _merge_column_types(self, found):
+        """ It returns the local type of a column holding values of the
+        given local types.
+        """
+
+        if len(found) == 1:
+            return next(iter(found))
+        if found and found <= {'bigint', 'double precision'}:
+            return 'double precision'
+        if found and found <= {'bigint', 'double precision', 'numeric'}:
+            return 'numeric'
+        return 'text'
+
+    @api.model
+    def _drop_table(self, table):
+        if table:
+            self.env.cr.execute('DROP TABLE IF EXISTS "%s"' % table)
+
+    @api.model
+    def _commit(self):
+        if not getattr(threading.currentThread(), 'testing', False):
+            self.env.cr.commit()
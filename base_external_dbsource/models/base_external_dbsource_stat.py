@@ -0,0 +1,258 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import hashlib
+import psycopg2
+
+from odoo import api, fields, models
+
+from .. import stats as query_stats
+
+
+class BaseExternalDbsourceStat(models.Model):
+    """ It stores the aggregated measures of a query of a data source.
+
+    Measures are collected in the memory of every worker, then added to
+    the record of their query when the worker flushes them.
+    """
+
+    _name = 'base.external.dbsource.stat'
+    _description = 'External Database Query Statistics'
+    _order = 'total_time desc, id'
+
+    dbsource_id = fields.Many2one(
+        'base.external.dbsource',
+        'Data source',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    query = fields.Text(
+        required=True,
+        help='Query whose literal values were replaced by question marks.',
+    )
+    query_digest = fields.Char(required=True)
+    calls = fields.Integer()
+    errors = fields.Integer()
+    rows = fields.Integer(help='Rows returned or affected by the queries.')
+    connect_time = fields.Float(help='Milliseconds spent connecting.')
+    execute_time = fields.Float(help='Milliseconds spent executing.')
+    fetch_time = fields.Float(help='Milliseconds spent fetching rows.')
+    total_time = fields.Float(
+        compute='_compute_times',
+        store=True,
+        help='Milliseconds spent on the queries overall.',
+    )
+    avg_time = fields.Float(
+        'Average time',
+        compute='_compute_times',
+        store=True,
+    )
+    max_time = fields.Float('Maximum time')
+    histogram = fields.Char(
+        help='Number of queries per latency bucket, separated by commas.',
+    )
+    latency_p50 = fields.Float(
+        'Median latency',
+        compute='_compute_latency',
+        store=True,
+    )
+    latency_p95 = fields.Float(
+        '95th percentile latency',
+        compute='_compute_latency',
+        store=True,
+    )
+    last_date = fields.Datetime('Last flushed')
+
+    _sql_constraints = [
+        ('query_uniq', 'unique (dbsource_id, query_digest)',
+         'Each query can only have one statistics record per data source.'),
+    ]
+
+    @api.multi
+    @api.depends('calls', 'connect_time', 'execute_time', 'fetch_time')
+    def _compute_times(self):
+        for record in self:
+            record.total_time = (
+                record.connect_time + record.execute_time + record.fetch_time
+            )
+            record.avg_time = record.total_time / (record.calls or 1)
+
+    @api.multi
+    @api.depends('histogram', 'max_time')
+    def _compute_latency(self):
+        for record in self:
+            histogram = record._get_histogram()
+            record.latency_p50 = query_stats.percentile(
+                histogram, 0.5, record.max_time,
+            )
+            record.latency_p95 = query_stats.percentile(
+                histogram, 0.95, record.max_time,
+            )
+
+    @api.multi
+    def _get_histogram(self):
+        """ It returns the number of queries per latency bucket. """
+        self.ensure_one()
+        histogram = [int(c) for c in (self.histogram or '').split(',') if c]
+        return query_stats.merge_histograms([histogram])
+
+    @api.model
+    def _add_stats(self, dbsource, queries):
+        """ It adds the measures collected for queries of a data source.
+
+        The record of each query is locked while its measures are added,
+        so that workers flushing the same query concurrently add to each
+        other's measures rather than overwrite them.
+
+        Args:
+            dbsource: (base.external.dbsource) Data source of the queries.
+            queries: (dict) ``QueryStats`` by query.
+        """
+
+        now = fields.Datetime.now()
+        updated = []
+        for query, stats in queries.items():
+            digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+            row = self._lock_stat(dbsource, digest)
+            if row is None:
+                try:
+                    with self.env.cr.savepoint():
+                        self.create(dict(
+                            self._prepare_stat_values(stats, now),
+                            dbsource_id=dbsource.id,
+                            query=query,
+                            query_digest=digest,
+                        ))
+                    continue
+                except psycopg2.IntegrityError:
+                    # Created meanwhile by another worker, whose
+                    # transaction is now over
+                    row = self._lock_stat(dbsource, digest)
+            stat_id, histogram = row
+            histogram = query_stats.merge_histograms([
+                [int(c) for c in (histogram or '').split(',') if c],
+                stats.histogram,
+            ])
+            self.env.cr.execute("""
+                UPDATE base_external_dbsource_stat SET
+                    calls = COALESCE(calls, 0) + %(calls)s,
+                    errors = COALESCE(errors, 0) + %(errors)s,
+                    rows = COALESCE(rows, 0) + %(rows)s,
+                    connect_time = COALESCE(connect_time, 0) + %(connect)s,
+                    execute_time = COALESCE(execute_time, 0) + %(execute)s,
+                    fetch_time = COALESCE(fetch_time, 0) + %(fetch)s,
+                    max_time = GREATEST(max_time, %(max_time)s),
+                    histogram = %(histogram)s,
+                    last_date = %(now)s,
+                    write_uid = %(uid)s,
+                    write_date = %(now)s
+                WHERE id = %(id)s
+            """, {
+                'id': stat_id,
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'rows': stats.rows,
+                'connect': stats.times['connect'],
+                'execute': stats.times['execute'],
+                'fetch': stats.times['fetch'],
+                'max_time': stats.max_time,
+                'histogram': ','.join(map(str, histogram)),
+                'now': now,
+                'uid': self.env.uid,
+            })
+            updated.append(stat_id)
+        if updated:
+            # The rows were updated behind the back of the ORM, whose
+            # caches and stored computed fields are brought up to date
+            self.invalidate_cache(ids=updated)
+            self.browse(updated).modified([
+                'calls', 'errors', 'rows', 'connect_time', 'execute_time',
+                'fetch_time', 'max_time', 'histogram', 'last_date',
+            ])
+            self.recompute()
+        dbsource.invalidate_cache(ids=dbsource.ids)
+
+    @api.model
+    def _lock_stat(self, dbsource, digest):
+        """ It locks the record of a query, returning its ID and histogram.
+
+        Returns:
+            (tuple|None) ID and histogram of the record, if any.
+        """
+
+        self.env.cr.execute("""
+            SELECT id, histogram FROM base_external_dbsource_stat
+            WHERE dbsource_id = %s AND query_digest = %s
+            FOR UPDATE
+        """, (dbsource.id, digest))
+        return self.env.cr.fetchone()
+
+    @api.model
+    def _prepare_stat_values(self, stats, date):
+        """ It returns the values of a new record of ``QueryStats``. """
+        return {
+            'calls': stats.calls,
+            'errors': stats.errors,
+            'rows': stats.rows,
+            'connect_time': stats.times['connect'],
+            'execute_time': stats.times['execute'],
+            'fetch_time': stats.times['fetch'],
+            'max_time': stats.max_time,
+            'histogram': ','.join(map(str, stats.histogram)),
+            'last_date': date,
+        }
+
+
+class BaseExternalDbsourceSlowQuery(models.Model):
+    """ It logs a query of a data source that exceeded its threshold. """
+
+    _name = 'base.external.dbsource.slow.query'
+    _description = 'External Database Slow Query'
+    _order = 'date desc, id desc'
+
+    # Days after which slow queries are deleted
+    RETENTION_DAYS = 30
+
+    dbsource_id = fields.Many2one(
+        'base.external.dbsource',
+        'Data source',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    date = fields.Datetime(required=True, index=True)
+    query = fields.Text(required=True)
+    duration = fields.Float(help='Milliseconds the query took overall.')
+    connect_time = fields.Float()
+    execute_time = fields.Float()
+    fetch_time = fields.Float()
+    rows = fields.Integer()
+    error = fields.Char(help='Exception raised by the query, if any.')
+
+    @api.model
+    def _prepare_values(self, dbsource, measure):
+        """ It returns the values of the slow query of a measure. """
+        return {
+            'dbsource_id': dbsource.id,
+            'date': fields.Datetime.to_string(
+                datetime.datetime.utcfromtimestamp(measure.date),
+            ),
+            'query': measure.query,
+            'duration': measure.elapsed,
+            'connect_time': measure.times['connect'],
+            'execute_time': measure.times['execute'],
+            'fetch_time': measure.times['fetch'],
+            'rows': measure.rows,
+            'error': measure.error,
+        }
+
+    @api.model
+    def _gc(self):
+        """ It deletes the slow queries older than ``RETENTION_DAYS``. """
+        limit = datetime.datetime.utcnow() - datetime.timedelta(
+            days=self.RETENTION_DAYS,
+        )
+        self.search([
+            ('date', '<', fields.Datetime.to_string(limit)),
+        ]).unlink()
@@ -0,0 +1,502 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import collections
+import datetime
+import decimal
+import hashlib
+import logging
+import threading
+import time
+
+from dateutil import parser as date_parser
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError, ValidationError
+
+from ..sql import DomainCompiler, is_read_only
+
+_logger = logging.getLogger(__name__)
+
+# Digest of the rows whose record was archived because the query no
+# longer returned them, which no row digest matches.
+ARCHIVED_DIGEST = 'archived'
+
+# Types of the watermarks by Python type of the values, in order of
+# precedence. Values of other types are compared as text.
+WATERMARK_TYPES = [
+    (bool, 'char'),
+    (int, 'integer'),
+    (float, 'float'),
+    (decimal.Decimal, 'numeric'),
+    (datetime.datetime, 'datetime'),
+    (datetime.date, 'date'),
+]
+
+
+class BaseExternalDbsourceSync(models.Model):
+    """ It incrementally copies the rows of an external query to a model.
+
+    Every run only reads the rows whose watermark column is at least the
+    watermark stored by the previous run, in watermark order, and upserts
+    them by external key. The watermark of every batch is committed with
+    the records of the batch, so that an interrupted run resumes from its
+    last committed batch. Rows sharing the stored watermark are read again
+    and matched to the records they already created, so that none is
+    skipped nor duplicated.
+
+    A digest of the mapped values of every row is stored by external key,
+    so that records are only written when their row changed.
+    """
+
+    _name = 'base.external.dbsource.sync'
+    _description = 'External Database Synchronization'
+    _order = 'sequence, id'
+
+    name = fields.Char(required=True)
+    active = fields.Boolean(default=True)
+    sequence = fields.Integer(default=10)
+    dbsource_id = fields.Many2one(
+        'base.external.dbsource',
+        'Data source',
+        required=True,
+        ondelete='cascade',
+    )
+    query = fields.Text(
+        required=True,
+        help='SELECT query returning the rows to synchronize. It is run as '
+             'a subquery, filtered and sorted on the watermark column.',
+    )
+    model_id = fields.Many2one(
+        'ir.model',
+        'Target model',
+        required=True,
+        ondelete='cascade',
+    )
+    key_column = fields.Char(
+        required=True,
+        help='Column uniquely identifying the external rows.',
+    )
+    key_field_id = fields.Many2one(
+        'ir.model.fields',
+        'Key field',
+        required=True,
+        ondelete='cascade',
+        domain="[('model_id', '=', model_id), ('store', '=', True), "
+               "('ttype', 'in', ('char', 'integer'))]",
+        help='Character or integer field of the target model storing the '
+             'external key.',
+    )
+    watermark_column = fields.Char(
+        required=True,
+        help='Column whose value never decreases when rows are created or '
+             'updated, such as a modification date or a sequence number.',
+    )
+    watermark = fields.Char(
+        help='Greatest watermark synchronized so far. Clear it to '
+             'synchronize every row again.',
+    )
+    watermark_type = fields.Selection(
+        [('char', 'Text'),
+         ('integer', 'Integer'),
+         ('float', 'Float'),
+         ('numeric', 'Decimal'),
+         ('date', 'Date'),
+         ('datetime', 'Date and time')],
+        default='char',
+        required=True,
+        help='Type of the values of the watermark column, with which the '
+             'watermark is compared to them. It is set by each run.',
+    )
+    batch_size = fields.Integer(
+        default=500,
+        help='Number of rows upserted and committed together.',
+    )
+    line_ids = fields.One2many(
+        'base.external.dbsource.sync.line',
+        'sync_id',
+        'Field mapping',
+        copy=True,
+    )
+    deactivate_missing = fields.Boolean(
+        'Archive missing records',
+        help='Archive the records whose key is no longer returned by the '
+             'query, and restore them once it is returned again. Every key '
+             'of the query is then read by each run.',
+    )
+    last_run = fields.Datetime(readonly=True)
+    last_count = fields.Integer(
+        'Rows synchronized by the last run',
+        readonly=True,
+    )
+    run_ids = fields.One2many(
+        'base.external.dbsource.sync.run',
+        'sync_id',
+        'Runs',
+        readonly=True,
+    )
+
+    @api.multi
+    @api.constrains('query')
+    def _check_query(self):
+        for record in self:
+            if not is_read_only(record.query):
+                raise ValidationError(_(
+                    'The synchronization query must be a read-only SELECT '
+                    'query.'
+                ))
+
+    @api.multi
+    @api.constrains('model_id', 'key_field_id', 'line_ids')
+    def _check_fields(self):
+        for record in self:
+            sync_fields = record.key_field_id | record.line_ids.mapped(
+                'field_id',
+            )
+            if sync_fields.filtered(lambda f: f.model_id != record.model_id):
+                raise ValidationError(_(
+                    'Synchronized fields must belong to the target model.'
+                ))
+
+    @api.multi
+    @api.constrains('model_id', 'deactivate_missing')
+    def _check_deactivate_missing(self):
+        for record in self:
+            if record.deactivate_missing and \
+                    'active' not in self.env[record.model_id.model]._fields:
+                raise ValidationError(_(
+                    'Missing records can only be archived on models with an '
+                    'active field.'
+                ))
+
+    @api.multi
+    @api.constrains('batch_size')
+    def _check_batch_size(self):
+        for record in self:
+            if record.batch_size < 1:
+                raise ValidationError(_('The batch size must be positive.'))
+
+    @api.model
+    def _cron_run(self):
+        """ It runs every active synchronization, logging failures. """
+        for record in self.search([]):
+            try:
+                record.action_run()
+            except Exception:
+                self.env.cr.rollback()
+                self.env.clear()
+                _logger.exception('Synchronization %s failed.', record.name)
+
+    @api.multi
+    def action_run(self):
+        """ It synchronizes the rows changed since the last run. """
+        for record in self:
+            started = time.time()
+            start_date = fields.Datetime.now()
+            counts = record._run()
+            record.write({
+                'last_run': start_date,
+                'last_count': sum(
+                    counts[k] for k in ('created', 'updated', 'skipped')
+                ),
+                'run_ids': [(0, 0, dict(
+                    counts,
+                    date=start_date,
+                    duration=time.time() - started,
+                ))],
+            })
+            record._commit()
+        return True
+
+    @api.multi
+    def _run(self):
+        """ It upserts the rows beyond the watermark by batch.
+
+        Returns:
+            (collections.Counter) Number of rows ``created``, ``updated``,
+            ``skipped`` and ``deactivated``.
+        """
+
+        self.ensure_one()
+        dbsource = self.dbsource_id
+        query, params = self._get_query()
+        counts = collections.Counter(
+            created=0, updated=0, skipped=0, deactivated=0,
+        )
+        with dbsource.execute_iter(query, params, self.batch_size) as rows:
+            cols = rows.cols
+            missing = set(
+                [self.key_column, self.watermark_column] +
+                self.line_ids.mapped('column')
+            ) - set(cols)
+            if missing:
+                raise UserError(_(
+                    'Columns missing from the synchronization query: %s'
+                ) % ', '.join(sorted(missing)))
+            watermark_index = cols.index(self.watermark_column)
+            for batch in rows.batches():
+                counts.update(self._sync_batch(cols, batch))
+                # Stored with the batch, so that they are committed together
+                self.write(self._watermark_dump(batch[-1][watermark_index]))
+                self._commit()
+        if self.deactivate_missing:
+            counts['deactivated'] = self._deactivate_missing()
+        _logger.info(
+            'Synchronization %s: %d created, %d updated, %d skipped, '
+            '%d archived.', self.name, counts['created'], counts['updated'],
+            counts['skipped'], counts['deactivated'],
+        )
+        return counts
+
+    @api.multi
+    def _deactivate_missing(self):
+        """ It archives the records whose key the query no longer returns.
+
+        Records it archived are restored as soon as the query returns their
+        key again, whatever the watermark of their row. Their values are
+        then written again once their row reaches the watermark.
+
+        Returns:
+            (int) Number of archived records.
+        """
+
+        self.ensure_one()
+        quote = self.dbsource_id._quote_identifier
+        query = 'SELECT %s FROM (%s) %s' % (
+            quote(self.key_column),
+            self.query.strip().rstrip(';'),
+            quote('sync_rows'),
+        )
+        with self.dbsource_id.execute_iter(query, None, 10000) as rows:
+            seen = set(str(row[0]) for row in rows)
+        hashes = self.env['base.external.dbsource.sync.hash'].search([
+            ('sync_id', '=', self.id),
+        ])
+        archived = hashes.filtered(lambda h: h.digest == ARCHIVED_DIGEST)
+        missing = (hashes - archived).filtered(lambda h: h.key not in seen)
+        returned = archived.filtered(lambda h: h.key in seen)
+        if not missing and not returned:
+            return 0
+        records = self._get_records(missing)
+        records.write({'active': False})
+        missing.write({'digest': ARCHIVED_DIGEST})
+        self._get_records(returned).write({'active': True})
+        # Rows coming back are then written again whatever their digest
+        returned.unlink()
+        self._commit()
+        return len(records)
+
+    @api.multi
+    def _get_records(self, hashes):
+        """ It returns the records of the keys of digests, even archived. """
+        self.ensure_one()
+        model = self.env[self.model_id.model].with_context(active_test=False)
+        if not hashes:
+            return model.browse()
+        key_name = self.key_field_id.name
+        key_field = model._fields[key_name]
+        return model.search([(key_name, 'in', [
+            key_field.convert_to_cache(key, model)
+            for key in hashes.mapped('key')
+        ])])
+
+    @api.multi
+    def _get_query(self):
+        """ It returns the query and parameters selecting the new rows. """
+        self.ensure_one()
+        dbsource = self.dbsource_id
+        quote = dbsource._quote_identifier
+        compiler = DomainCompiler(quote, dbsource._sql_placeholder)
+        domain = [(self.watermark_column, '!=', None)]
+        if self.watermark:
+            domain.append(
+                (self.watermark_column, '>=', self._watermark_load()),
+            )
+        query = 'SELECT * FROM (%s) %s WHERE %s ORDER BY %s, %s' % (
+            self.query.strip().rstrip(';'),
+            quote('sync_rows'),
+            compiler.compile(domain),
+            quote(self.watermark_column),
+            quote(self.key_column),
+        )
+        return query, compiler.params
+
+    @api.model
+    def _watermark_dump(self, value):
+        """ It returns the values storing a watermark along with its type.
+        """
+
+        watermark_type = next((
+            watermark_type for python_type, watermark_type in WATERMARK_TYPES
+            if isinstance(value, python_type)
+        ), 'char')
+        if watermark_type in ('date', 'datetime'):
+            watermark = value.isoformat()
+        elif watermark_type == 'float':
+            watermark = repr(value)
+        else:
+            watermark = str(value)
+        return {'watermark': watermark, 'watermark_type': watermark_type}
+
+    @api.multi
+    def _watermark_load(self):
+        """ It returns the stored watermark as a value of its type, so that
+        it is compared to the column as such rather than as text.
+        """
+
+        self.ensure_one()
+        watermark, watermark_type = self.watermark, self.watermark_type
+        try:
+            if watermark_type == 'integer':
+                return int(watermark)
+            if watermark_type == 'float':
+                return float(watermark)
+            if watermark_type == 'numeric':
+                return decimal.Decimal(watermark)
+            if watermark_type == 'date':
+                return datetime.datetime.strptime(
+                    watermark, '%Y-%m-%d',
+                ).date()
+            if watermark_type == 'datetime':
+                return date_parser.parse(watermark)
+        except (ValueError, decimal.InvalidOperation):
+            raise UserError(_(
+                'The watermark %s of synchronization %s is not a valid %s '
+                'value.'
+            ) % (watermark, self.name, watermark_type))
+        return watermark
+
+    @api.multi
+    def _sync_batch(self, cols, rows):
+        """ It creates or updates the records of a batch of rows.
+
+        Returns:
+            (dict) Number of rows ``created``, ``updated`` and ``skipped``
+            because they did not change.
+        """
+
+        self.ensure_one()
+        model = self.env[self.model_id.model].with_context(active_test=False)
+        key_name = self.key_field_id.name
+        key_field = model._fields[key_name]
+        key_index = cols.index(self.key_column)
+        mapping = [
+            (cols.index(line.column), line.field_id.name)
+            for line in self.line_ids
+        ]
+        keys = [
+            key_field.convert_to_cache(row[key_index], model) for row in rows
+        ]
+        records = {
+            record[key_name]: record
+            for record in model.search([(key_name, 'in', keys)])
+        }
+        Hash = self.env['base.external.dbsource.sync.hash']
+        hashes = {
+            sync_hash.key: sync_hash
+            for sync_hash in Hash.search([
+                ('sync_id', '=', self.id),
+                ('key', 'in', [str(key) for key in keys]),
+            ])
+        }
+        counts = dict(created=0, updated=0, skipped=0)
+        for key, row in zip(keys, rows):
+            vals = {name: row[index] for index, name in mapping}
+            digest = self._get_digest(vals)
+            record = records.get(key)
+            sync_hash = hashes.get(str(key))
+            if record and sync_hash and sync_hash.digest == digest:
+                counts['skipped'] += 1
+                continue
+            if self.deactivate_missing:
+                vals['active'] = True
+            if record:
+                record.write(vals)
+                counts['updated'] += 1
+            else:
+                vals[key_name] = key
+                # Odoo 11 has no multi-create, records are created one by one
+                records[key] = model.create(vals)
+                counts['created'] += 1
+            if sync_hash:
+                sync_hash.digest = digest
+            else:
+                hashes[str(key)] = Hash.create({
+                    'sync_id': self.id,
+                    'key': str(key),
+                    'digest': digest,
+                })
+        return counts
+
+    @api.model
+    def _get_digest(self, vals):
+        """ It returns a digest of the values mapped from a row. """
+        return hashlib.sha1(
+            repr(sorted(vals.items())).encode('utf-8'),
+        ).hexdigest()
+
+    @api.model
+    def _commit(self):
+        if not getattr(threading.currentThread(), 'testing', False):
+            self.env.cr.commit()
+
+
+class BaseExternalDbsourceSyncLine(models.Model):
+    """ It maps a column of a synchronization query to a model field. """
+
+    _name = 'base.external.dbsource.sync.line'
+    _description = 'External Database Synchronization Field'
+
+    sync_id = fields.Many2one(
+        'base.external.dbsource.sync',
+        required=True,
+        ondelete='cascade',
+    )
+    column = fields.Char(required=True)
+    field_id = fields.Many2one(
+        'ir.model.fields',
+        'Field',
+        required=True,
+        ondelete='cascade',
+    )
+
+
+class BaseExternalDbsourceSyncHash(models.Model):
+    """ It stores the digest of the last synchronized values of a row. """
+
+    _name = 'base.external.dbsource.sync.hash'
+    _description = 'External Database Synchronization Digest'
+
+    sync_id = fields.Many2one(
+        'base.external.dbsource.sync',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    key = fields.Char(required=True, index=True)
+    digest = fields.Char(required=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique (sync_id, key)',
+         'Each external key can only have one digest.'),
+    ]
+
+
+class BaseExternalDbsourceSyncRun(models.Model):
+    """ It reports the outcome of a synchronization run. """
+
+    _name = 'base.external.dbsource.sync.run'
+    _description = 'External Database Synchronization Run'
+    _order = 'date desc, id desc'
+
+    sync_id = fields.Many2one(
+        'base.external.dbsource.sync',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    date = fields.Datetime(required=True)
+    duration = fields.Float(help='Elapsed time in seconds.')
+    created = fields.Integer()
+    updated = fields.Integer()
+    skipped = fields.Integer(help='Rows left alone as they did not change.')
+    deactivated = fields.Integer('Archived')
@@ -0,0 +1,211 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import decimal
+import logging
+import queue
+import threading
+import time
+
+from .result import RowIterator
+
+_logger = logging.getLogger(__name__)
+
+# Key types whose ranges are split by interpolation between the bounds
+INTERPOLABLE_TYPES = (
+    int, float, decimal.Decimal, datetime.date, datetime.datetime,
+)
+
+
+def is_interpolable(value):
+    """ It tells whether key ranges can be split between values like it. """
+
+    return isinstance(value, INTERPOLABLE_TYPES) and \
+        not isinstance(value, bool)
+
+
+def split_range(low, high, count):
+    """ It returns the bounds splitting a key range into equal ranges.
+
+    Args:
+        low: (mixed) Smallest key, of a type accepted by
+            ``is_interpolable``.
+        high: (mixed) Greatest key.
+        count: (int) Number of ranges wanted.
+    Returns:
+        (list) Bounds, starting with ``low`` and ending with ``high``.
+        Fewer ranges are returned when the keys are too close to be split
+        in ``count``, such as consecutive integers.
+    """
+
+    bounds = [low]
+    for index in range(1, count):
+        if isinstance(low, int):
+            bound = low + (high - low) * index // count
+        else:
+            bound = low + (high - low) / count * index
+        if bound > bounds[-1] and bound < high:
+            bounds.append(bound)
+    bounds.append(high)
+    return bounds
+
+
+class Partition(object):
+    """ It reports the progress of the read of a key range.
+
+    Args:
+        index: (int) Position of the partition, from ``0``.
+        low: (mixed) Smallest key of the partition, included.
+        high: (mixed) Greatest key of the partition.
+        last: (bool) Whether ``high`` is included, which it is only for the
+            last partition.
+    """
+
+    def __init__(self, index, low, high, last=True):
+        self.index = index
+        self.low = low
+        self.high = high
+        self.last = last
+        self.rows = 0
+        self.batches = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    def __repr__(self):
+        return '<Partition %d [%r, %r%s>' % (
+            self.index, self.low, self.high, ']' if self.last else ')',
+        )
+
+    @property
+    def seconds(self):
+        """ (float) Seconds the read took so far. """
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rows_per_second(self):
+        """ (float) Rows read per second so far. """
+        seconds = self.seconds
+        return self.rows / seconds if seconds else 0.0
+
+    def domain(self, key):
+        """ It returns the domain of the rows of the partition.
+
+        A partition without bounds, read when no row has a key, matches
+        the rows whose key is not NULL.
+
+        Args:
+            key: (str) Name of the key column.
+        """
+
+        if self.low is None:
+            return [(key, '!=', None)]
+        return [
+            (key, '>=', self.low),
+            (key, '<=' if self.last else '<', self.high),
+        ]
+
+
+class PartitionedRowIterator(RowIterator):
+    """ It iterates over the rows of partitions read concurrently.
+
+    Args:
+        batches: (generator) Merged batches, see ``merge_batches``.
+        partitions: (list) ``Partition`` being read.
+    """
+
+    def __init__(self, batches, partitions):
+        super(PartitionedRowIterator, self).__init__(batches)
+        self.partitions = partitions
+
+
+def merge_batches(sources, partitions, max_pending):
+    """ It reads sources in threads and yields their batches as they come.
+
+    Every source is read by a thread of its own, which puts its batches in
+    a queue of at most ``max_pending`` batches. Threads wait while the
+    queue is full, so that no more than ``max_pending`` batches, plus one
+    per thread, are held in memory at once whatever the speed of the
+    consumer. Closing the generator stops the threads after their current
+    batch.
+
+    Args:
+        sources: (list) Generators yielding the list of column names first,
+            then lists of rows, like ``execute_iter_*`` adapter methods.
+            They are started, read and closed in their thread.
+        partitions: (list) ``Partition`` of every source, updated as they
+            are read.
+        max_pending: (int) Maximum number of batches waiting to be consumed.
+    Yields:
+        (list) Column names of the first source to yield them, then batches
+        of rows of any source.
+    Raises:
+        Exception: The first exception raised by a source.
+    """
+
+    pending = queue.Queue(max_pending)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(source, partition):
+        partition.started = time.time()
+        try:
+            if not put(('cols', partition, next(source))):
+                return
+            for batch in source:
+                partition.rows += len(batch)
+                partition.batches += 1
+                if not put(('rows', partition, batch)):
+                    return
+            partition.finished = time.time()
+            put(('done', partition, None))
+        except Exception as e:
+            partition.error = e
+            put(('error', partition, e))
+        finally:
+            source.close()
+
+    threads = [
+        threading.Thread(
+            target=read, args=(source, partition),
+            name='dbsource-partition-%d' % partition.index,
+        )
+        for source, partition in zip(sources, partitions)
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        running = len(threads)
+        cols = None
+        while running:
+            kind, partition, payload = pending.get()
+            if kind == 'cols':
+                if cols is None:
+                    cols = payload
+                    yield cols
+            elif kind == 'rows':
+                yield payload
+            elif kind == 'done':
+                running -= 1
+                _logger.info(
+                    'Partition %d read %d rows in %.2fs (%d rows/s).',
+                    partition.index, partition.rows, partition.seconds,
+                    partition.rows_per_second,
+                )
+            else:
+                raise payload
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
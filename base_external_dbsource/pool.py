@@ -0,0 +1,265 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PooledConnection(object):
+    """ It holds an open connection along with its pool bookkeeping. """
+
+    __slots__ = ('connection', 'created', 'last_used', 'info')
+
+    def __init__(self, connection, now):
+        self.connection = connection
+        self.created = now
+        self.last_used = now
+        # Free-form storage that lives exactly as long as the connection.
+        self.info = {}
+
+
+class ConnectionPool(object):
+    """ It provides a thread-safe pool of connections to one data source.
+
+    The pool does not know how to open, reset or close connections. These
+    callables are provided on every call instead, so that no reference to
+    an Odoo environment is kept in process-wide state.
+
+    Args:
+        size_min: (int) Idle connections that are kept open even after
+            ``idle_timeout`` has elapsed.
+        size_max: (int) Maximum number of connections managed by the pool.
+            Connections requested beyond it are opened on demand and are
+            closed when released.
+        idle_timeout: (int) Seconds after which an idle connection above
+            ``size_min`` is closed. ``0`` disables the timeout.
+        max_lifetime: (int) Seconds after which a connection is closed
+            instead of being reused. ``0`` disables the limit.
+    """
+
+    # Options of the pool, with their default values
+    DEFAULTS = {
+        'size_min': 0,
+        'size_max': 5,
+        'idle_timeout': 0,
+        'max_lifetime': 0,
+    }
+
+    def __init__(self, size_min=0, size_max=5, idle_timeout=0,
+                 max_lifetime=0):
+        self.size_min = size_min
+        self.size_max = size_max
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self.disposed = False
+        self._lock = threading.Lock()
+        self._idle = []
+        self._used = {}
+        self._pending = 0
+
+    @property
+    def options(self):
+        return {
+            'size_min': self.size_min,
+            'size_max': self.size_max,
+            'idle_timeout': self.idle_timeout,
+            'max_lifetime': self.max_lifetime,
+        }
+
+    def checkout(self, opener, closer):
+        """ It returns a connection, reusing an idle one when possible.
+
+        Args:
+            opener: (callable) Returns a new connection.
+            closer: (callable) Closes the connection it is given.
+        Returns:
+            (mixed) The connection returned by ``opener``.
+        """
+
+        now = time.time()
+        entry, managed = None, False
+        with self._lock:
+            stale = self._pop_timed_out(now)
+            while self._idle:
+                candidate = self._idle.pop()
+                if self._is_expired(candidate, now):
+                    stale.append(candidate)
+                    continue
+                entry = candidate
+                break
+            if entry is not None:
+                entry.last_used = now
+                self._used[id(entry.connection)] = entry
+            elif not self.disposed and self._size() < self.size_max:
+                self._pending += 1
+                managed = True
+        for stale_entry in stale:
+            self._close(stale_entry, closer)
+        if entry is not None:
+            return entry.connection
+        try:
+            connection = opener()
+        finally:
+            if managed:
+                with self._lock:
+                    self._pending -= 1
+        if managed:
+            with self._lock:
+                self._used[id(connection)] = PooledConnection(
+                    connection, time.time(),
+                )
+        return connection
+
+    def checkin(self, connection, closer, reset=None):
+        """ It returns a connection to the pool.
+
+        Args:
+            connection: (mixed) Connection obtained from ``checkout``.
+            closer: (callable) Closes the connection it is given.
+            reset: (callable) Optional callable bringing the connection
+                back to a clean state. The connection is closed if it fails.
+        Returns:
+            (bool) False if the connection is not managed by this pool, in
+            which case the caller is responsible for closing it.
+        """
+
+        with self._lock:
+            entry = self._used.pop(id(connection), None)
+        if entry is None:
+            return False
+        if (self.disposed or getattr(connection, 'closed', False) or
+                self._is_expired(entry, time.time())):
+            self._close(entry, closer)
+            return True
+        if reset is not None:
+            try:
+                reset(connection)
+            except Exception:
+                _logger.info('Connection reset failure, closing it.',
+                             exc_info=True)
+                self._close(entry, closer)
+                return True
+        with self._lock:
+            if not self.disposed:
+                entry.last_used = time.time()
+                self._idle.append(entry)
+                return True
+        self._close(entry, closer)
+        return True
+
+    def dispose(self, closer):
+        """ It closes idle connections and retires the pool.
+
+        Connections that are checked out at that time are closed as soon as
+        they are checked in.
+        """
+
+        with self._lock:
+            self.disposed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._close(entry, closer)
+
+    def info(self, connection):
+        """ It returns the bookkeeping dict of a checked out connection.
+
+        The dict is discarded along with the connection, which makes it a
+        suitable place for per-connection caches. ``None`` is returned for
+        connections that are not managed by the pool.
+        """
+
+        entry = self._used.get(id(connection))
+        return entry.info if entry is not None else None
+
+    def _size(self):
+        return len(self._idle) + len(self._used) + self._pending
+
+    def _is_expired(self, entry, now):
+        return bool(self.max_lifetime and
+                    now - entry.created > self.max_lifetime)
+
+    def _pop_timed_out(self, now):
+        if not self.idle_timeout:
+            return []
+        keep = max(self.size_min - len(self._used), 0)
+        # Idle connections are ordered from the least recently used.
+        candidates = self._idle[:max(len(self._idle) - keep, 0)]
+        stale = [
+            entry for entry in candidates
+            if now - entry.last_used > self.idle_timeout
+        ]
+        if stale:
+            self._idle = [e for e in self._idle if e not in stale]
+        return stale
+
+    @staticmethod
+    def _close(entry, closer):
+        try:
+            closer(entry.connection)
+        except Exception:
+            _logger.exception('Connection close failure.')
+
+
+def get_pool(key, closer, **options):
+    """ It returns the process-wide pool for ``key``, creating it if needed.
+
+    ``key`` must be a tuple starting with the database name and the data
+    source ID. Pools for the same data source with another key or other
+    options are disposed of, as they belong to a former configuration.
+
+    Args:
+        key: (tuple) ``(dbname, dbsource_id, ...)`` identifying the pool.
+        closer: (callable) Closes a connection of a superseded pool.
+        **options: Keyword arguments for ``ConnectionPool``.
+    Returns:
+        (ConnectionPool)
+    """
+
+    options = dict(ConnectionPool.DEFAULTS, **options)
+    stale = []
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid != os.getpid():
+            # Inherited from the parent process through fork, its sockets
+            # must not be touched from here.
+            pool = None
+            _pools.clear()
+        if pool is not None and pool.options != options:
+            stale.append(_pools.pop(key))
+            pool = None
+        if pool is None:
+            for other in [k for k in _pools if k[:2] == key[:2]]:
+                stale.append(_pools.pop(other))
+            pool = _pools[key] = ConnectionPool(**options)
+    for stale_pool in stale:
+        stale_pool.dispose(closer)
+    return pool
+
+
+def find_pool(key):
+    """ It returns the existing pool for ``key``, or ``None``. """
+
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    return None
+
+
+def dispose_pools(dbname, dbsource_id, closer):
+    """ It disposes of every pool belonging to the given data source. """
+
+    with _pools_lock:
+        pools = [
+            _pools.pop(key) for key in list(_pools)
+            if key[:2] == (dbname, dbsource_id)
+        ]
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.dispose(closer)
@@ -0,0 +1,174 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import collections
+import datetime
+import decimal
+import math
+import re
+
+# Placeholders of psycopg2 queries, and escaped percent signs
+_PLACEHOLDER = re.compile(r'%(?:\((?P<name>[^)]+)\)s|s|%)')
+# Statements PostgreSQL can prepare
+_PREPARABLE = re.compile(
+    r'^\s*(select|insert|update|delete|values|with)\b', re.IGNORECASE,
+)
+
+# Bounds of the integers psycopg2 writes as integer literals
+_INT4_MIN, _INT4_MAX = -2 ** 31, 2 ** 31 - 1
+_INT8_MIN, _INT8_MAX = -2 ** 63, 2 ** 63 - 1
+
+Statement = collections.namedtuple('Statement', ['name', 'keys'])
+
+
+def param_type(value):
+    """ It returns the type to declare for a parameter of a statement.
+
+    The type is the one PostgreSQL gives to the literal psycopg2 writes for
+    the value in plain queries, so that prepared statements return the
+    same results. Strings and ``None`` are written as untyped literals,
+    which are declared ``unknown`` for their type to be inferred from
+    context.
+
+    Returns:
+        (str) Type name, or ``None`` for values of other types, whose
+        queries are not prepared.
+    """
+
+    if value is None or isinstance(value, str):
+        return 'unknown'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        if _INT4_MIN <= value <= _INT4_MAX:
+            return 'integer'
+        if _INT8_MIN <= value <= _INT8_MAX:
+            return 'bigint'
+        return 'numeric'
+    if isinstance(value, float):
+        return 'numeric' if math.isfinite(value) else 'double precision'
+    if isinstance(value, decimal.Decimal):
+        return 'numeric'
+    if isinstance(value, datetime.datetime):
+        return 'timestamptz' if value.tzinfo else 'timestamp'
+    if isinstance(value, datetime.date):
+        return 'date'
+    if isinstance(value, datetime.time):
+        return 'timetz' if value.tzinfo else 'time'
+    if isinstance(value, datetime.timedelta):
+        return 'interval'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return 'bytea'
+    return None
+
+
+def is_preparable(query, params):
+    """ It tells whether a psycopg2 query can run as a prepared statement.
+
+    Queries without parameters, made of several statements, using dollar
+    signs or given values without a type for ``param_type``, such as
+    tuples which psycopg2 expands as lists of values for ``IN %s``, run as
+    they are.
+    """
+
+    if params is None or not _PREPARABLE.match(query):
+        return False
+    if '$' in query or ';' in query.strip().rstrip(';'):
+        return False
+    values = params.values() if isinstance(params, dict) else params
+    return all(param_type(value) is not None for value in values)
+
+
+def params_signature(params):
+    """ It returns the types of parameters, which tell statements apart
+    along with their query.
+    """
+
+    if isinstance(params, dict):
+        return tuple(sorted(
+            (key, param_type(value)) for key, value in params.items()
+        ))
+    return tuple(param_type(value) for value in params)
+
+
+def convert_placeholders(query):
+    """ It converts the placeholders of a psycopg2 query to ``$n`` ones.
+
+    Returns:
+        (tuple) The converted query, and the keys of the parameters in the
+        order of their ``$n`` placeholders: names for named placeholders,
+        and indexes for positional ones.
+    """
+
+    keys = []
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group('name')
+        if name is None:
+            keys.append(len(keys))
+            return '$%d' % len(keys)
+        if name not in keys:
+            keys.append(name)
+        return '$%d' % (keys.index(name) + 1)
+
+    return _PLACEHOLDER.sub(replace, query), keys
+
+
+class StatementCache(object):
+    """ It tracks the statements prepared on a connection.
+
+    At most ``max_size`` statements are kept, the least recently used being
+    evicted first. The cache does not talk to the server: the caller
+    prepares the statements it adds and releases those it evicts.
+
+    Args:
+        max_size: (int) Maximum number of prepared statements.
+    """
+
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._statements = collections.OrderedDict()
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._statements)
+
+    def get(self, query):
+        """ It returns the ``Statement`` prepared for a query, if any. """
+
+        statement = self._statements.get(query)
+        if statement is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._statements.move_to_end(query)
+        return statement
+
+    def add(self, query, keys):
+        """ It names a new statement for a query.
+
+        Args:
+            query: (hashable) Query as given by the caller, along with
+                anything else telling its statements apart.
+            keys: (list) Keys of the parameters of the statement.
+        Returns:
+            (tuple) The new ``Statement``, and the list of the names of the
+            statements evicted to make room for it.
+        """
+
+        self._counter += 1
+        statement = Statement('dbsource_%d' % self._counter, keys)
+        evicted = []
+        while self._statements and len(self._statements) >= self.max_size:
+            evicted.append(self._statements.popitem(last=False)[1].name)
+        self._statements[query] = statement
+        return statement, evicted
+
+    def remove(self, query):
+        self._statements.pop(query, None)
+
+    def clear(self):
+        self._statements.clear()
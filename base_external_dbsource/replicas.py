@@ -0,0 +1,103 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import itertools
+import threading
+import time
+
+POLICIES = ('round_robin', 'latency')
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+class ReplicaRouter(object):
+    """ It selects the replica serving the next read of a data source.
+
+    It keeps the health and latency of the replicas of one primary data
+    source, which are only known by their IDs so that no reference to an
+    Odoo environment is kept in process-wide state.
+
+    Args:
+        smoothing: (float) Weight of the latest measure in the moving
+            average of the latency of a replica.
+    """
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._latency = {}
+        self._ejected = {}
+
+    def choose(self, replica_ids, policy='round_robin', exclude=()):
+        """ It returns the ID of the replica to use, or ``None``.
+
+        Args:
+            replica_ids: (list) IDs of the replicas to choose from.
+            policy: (str) ``round_robin`` to spread reads evenly, or
+                ``latency`` to prefer the fastest replica. Replicas without
+                any measure yet are preferred, so that they get one.
+            exclude: (iter) IDs of replicas not to choose.
+        """
+
+        now = time.time()
+        with self._lock:
+            candidates = [
+                replica_id for replica_id in replica_ids
+                if replica_id not in exclude and
+                self._ejected.get(replica_id, 0) <= now
+            ]
+            if not candidates:
+                return None
+            if policy == 'latency':
+                return min(
+                    candidates, key=lambda r: self._latency.get(r, 0),
+                )
+            return candidates[next(self._counter) % len(candidates)]
+
+    def record(self, replica_id, elapsed):
+        """ It records the time a replica took to answer. """
+        with self._lock:
+            latency = self._latency.get(replica_id)
+            if latency is None:
+                self._latency[replica_id] = elapsed
+            else:
+                self._latency[replica_id] = (
+                    self.smoothing * elapsed + (1 - self.smoothing) * latency
+                )
+
+    def eject(self, replica_id, duration):
+        """ It stops choosing a replica for ``duration`` seconds. """
+        with self._lock:
+            self._ejected[replica_id] = time.time() + duration
+            self._latency.pop(replica_id, None)
+
+    def is_ejected(self, replica_id):
+        with self._lock:
+            return self._ejected.get(replica_id, 0) > time.time()
+
+    def latency(self, replica_id):
+        """ It returns the average latency of a replica, if measured. """
+        with self._lock:
+            return self._latency.get(replica_id)
+
+
+def get_router(key):
+    """ It returns the process-wide router for ``key``, creating it if needed.
+
+    Args:
+        key: (tuple) ``(dbname, dbsource_id)`` of the primary data source.
+    """
+
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = ReplicaRouter()
+        return router
+
+
+def drop_router(dbname, dbsource_id):
+    """ It forgets the replica state of the given primary data source. """
+
+    with _routers_lock:
+        _routers.pop((dbname, dbsource_id), None)
@@ -0,0 +1,229 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import array
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RESULT_FORMATS = ('tuples', 'records', 'columns', 'numpy')
+# Bounds of the values of ``array.array('q')`` columns
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class Record(tuple):
+    """ It is a row whose values are also read by column name.
+
+    Column names are held once by the class of the rows of a result,
+    created by ``record_class``, so that rows take no more memory than
+    tuples. Values are read by position, by name or as attributes.
+
+    Example:
+        row[0] == row['id'] == row.id
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return 'Record(%s)' % ', '.join(
+            '%s=%r' % item for item in zip(self._fields, self)
+        )
+
+    def get(self, name, default=None):
+        index = self._index.get(name)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return list(self._fields)
+
+    def _asdict(self):
+        return collections.OrderedDict(zip(self._fields, self))
+
+
+def record_class(cols):
+    """ It returns the ``Record`` subclass of rows with the given columns.
+
+    Later duplicates of a column name are only read by position.
+    """
+
+    index = {}
+    for position, col in enumerate(cols):
+        index.setdefault(col, position)
+    return type('Record', (Record, ), {
+        '__slots__': (),
+        '_fields': tuple(cols),
+        '_index': index,
+    })
+
+
+def to_records(rows, cols):
+    """ It returns rows as ``Record`` instances sharing their columns. """
+
+    cls = record_class(cols)
+    return [cls(row) for row in rows]
+
+
+def to_columns(rows, cols, use_numpy=False):
+    """ It returns the values of rows by column.
+
+    Columns of integers or floats without NULL values are stored in
+    compact ``array.array`` objects, or in NumPy arrays if ``use_numpy`` is
+    set, and other columns in lists.
+
+    Args:
+        rows: (list) Rows of the result.
+        cols: (list) Names of the columns of the rows.
+        use_numpy: (bool) Return NumPy arrays, of ``object`` type for
+            columns that are not numeric.
+    Returns:
+        (collections.OrderedDict) Values by column name.
+    """
+
+    if use_numpy and numpy is None:
+        raise ImportError('NumPy is required by the numpy result format.')
+    columns = collections.OrderedDict()
+    values_by_col = zip(*rows) if rows else [()] * len(cols)
+    for col, values in zip(cols, values_by_col):
+        typecode = _get_typecode(values)
+        if use_numpy:
+            dtype = {'q': numpy.int64, 'd': numpy.float64}.get(
+                typecode, object,
+            )
+            column = numpy.empty(len(values), dtype=dtype)
+            column[:] = values
+        elif typecode:
+            column = array.array(typecode, values)
+        else:
+            column = list(values)
+        columns[col] = column
+    return columns
+
+
+def format_result(rows, cols, result_format='tuples'):
+    """ It returns the rows of a result in one of ``RESULT_FORMATS``. """
+
+    if result_format == 'tuples':
+        return rows
+    if result_format == 'records':
+        return to_records(rows, cols)
+    if result_format in ('columns', 'numpy'):
+        return to_columns(rows, cols, result_format == 'numpy')
+    raise ValueError('Unknown result format %r.' % result_format)
+
+
+def _get_typecode(values):
+    """ It returns the ``array`` type code fitting values, if any. """
+
+    typecode = None
+    for value in values:
+        value_type = type(value)
+        if value_type is int:
+            if not _INT64_MIN <= value <= _INT64_MAX:
+                return None
+            typecode = typecode or 'q'
+        elif value_type is float:
+            typecode = 'd'
+        else:
+            return None
+    return typecode
+
+
+class RowIterator(object):
+    """ It iterates lazily over the rows returned by an external query.
+
+    It wraps the generator returned by an ``execute_iter_*`` adapter method,
+    which must yield the list of column names first, then lists of rows.
+    Nothing is executed before the iterator is first used, and the adapter
+    releases its connection as soon as the rows are exhausted, ``close`` is
+    called or the iterator is garbage collected.
+
+    Example:
+        with dbsource.execute_iter('SELECT * FROM big_table') as rows:
+            for row in rows:
+                process(dict(zip(rows.cols, row)))
+    """
+
+    def __init__(self, batches):
+        self._batches = batches
+        self._cols = None
+        self._rows = iter(())
+
+    @property
+    def cols(self):
+        """ (list) Names of the columns of the result. """
+        if self._cols is None:
+            self._cols = list(next(self._batches))
+        return self._cols
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            try:
+                return next(self._rows)
+            except StopIteration:
+                self._rows = iter(self._next_batch())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def batches(self):
+        """ It yields the remaining rows as lists of up to one batch. """
+        pending = list(self._rows)
+        self._rows = iter(())
+        if pending:
+            yield pending
+        while True:
+            try:
+                batch = self._next_batch()
+            except StopIteration:
+                return
+            if batch:
+                yield batch
+
+    def mappings(self):
+        """ It yields the remaining rows as dicts keyed by column name. """
+        try:
+            for row in self:
+                yield dict(zip(self.cols, row))
+        finally:
+            self.close()
+
+    def records(self):
+        """ It yields the remaining rows as ``Record`` instances. """
+        cls = record_class(self.cols)
+        try:
+            for row in self:
+                yield cls(row)
+        finally:
+            self.close()
+
+    def close(self):
+        """ It stops the query and releases its connection. """
+        self._batches.close()
+
+    def _next_batch(self):
+        self.cols
+        return next(self._batches)
@@ -0,0 +1,86 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import threading
+
+# Sessions bound to the current thread, keyed by database and data source
+_local = threading.local()
+
+
+class Session(object):
+    """ It runs the queries of a data source over one connection.
+
+    While a session is open, every method of its data source, such as
+    ``execute``, ``execute_many`` or ``remote_update``, uses the connection
+    of the session and joins its transaction instead of committing on its
+    own. Other attributes are looked up on the data source, so that
+    ``session.remote_search(...)`` is ``dbsource.remote_search(...)``.
+
+    Args:
+        dbsource: (base.external.dbsource) Data source of the session.
+        connection: (mixed) Connection returned by ``connection_open``.
+    """
+
+    def __init__(self, dbsource, connection):
+        self.dbsource = dbsource
+        self.connection = connection
+        self._transaction = None
+
+    def __getattr__(self, name):
+        return getattr(self.dbsource, name)
+
+    def execute(self, query, execute_params=None, metadata=False, **kwargs):
+        return self.dbsource.execute(
+            query, execute_params, metadata, **kwargs
+        )
+
+    def execute_iter(self, query, execute_params=None, batch_size=1000,
+                     **kwargs):
+        return self.dbsource.execute_iter(
+            query, execute_params, batch_size, **kwargs
+        )
+
+    def execute_many(self, query, param_seq, page_size=1000):
+        return self.dbsource.execute_many(query, param_seq, page_size)
+
+    def begin(self):
+        """ It starts the transaction of the session. """
+        method = self.dbsource._get_adapter_method('transaction_begin')
+        self._transaction = method(self.connection)
+
+    def end(self, commit=True):
+        """ It commits or rolls back the transaction of the session. """
+        method = self.dbsource._get_adapter_method(
+            'transaction_commit' if commit else 'transaction_rollback',
+        )
+        transaction, self._transaction = self._transaction, None
+        method(self.connection, transaction)
+
+    def commit(self):
+        """ It commits the statements run so far and starts over. """
+        self.end(commit=True)
+        self.begin()
+
+    def rollback(self):
+        """ It rolls back the statements run so far and starts over. """
+        self.end(commit=False)
+        self.begin()
+
+
+def get_session(key):
+    """ It returns the session bound to the current thread for ``key``.
+
+    Args:
+        key: (tuple) ``(dbname, dbsource_id)`` of the data source.
+    """
+
+    return getattr(_local, 'sessions', {}).get(key)
+
+
+def bind_session(key, session):
+    if not hasattr(_local, 'sessions'):
+        _local.sessions = {}
+    _local.sessions[key] = session
+
+
+def unbind_session(key):
+    getattr(_local, 'sessions', {}).pop(key, None)
@@ -0,0 +1,88 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import threading
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """ It runs a function once for concurrent calls sharing a key.
+
+    Calls arriving while a call with the same key is in flight wait for it
+    and get its result, or its exception, instead of running the function
+    again. Calls arriving afterwards run it anew.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, function):
+        """ It returns the result of ``function``, shared by key.
+
+        Args:
+            key: (hashable) Key of the calls to deduplicate.
+            function: (callable) Function to call without arguments.
+        Returns:
+            (tuple) Result of the function, and whether it was shared with
+            a call already in flight.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        """ It returns the number of distinct calls in flight. """
+        with self._lock:
+            return len(self._calls)
+
+
+def get_group(key):
+    """ It returns the process-wide single-flight group for ``key``.
+
+    Args:
+        key: (tuple) ``(dbname, dbsource_id)`` of the data source.
+    """
+
+    with _groups_lock:
+        group = _groups.get(key)
+        if group is None:
+            group = _groups[key] = SingleFlight()
+        return group
+
+
+def drop_group(dbname, dbsource_id):
+    """ It forgets the single-flight group of the given data source. """
+
+    with _groups_lock:
+        _groups.pop((dbname, dbsource_id), None)
@@ -0,0 +1,124 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import array
+import collections.abc
+import pickle
+import sys
+import tempfile
+import weakref
+
+
+def row_size(row):
+    """ It returns the approximate memory size of a row and its values. """
+
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+class SpilledRows(collections.abc.Sequence):
+    """ It holds rows in memory up to a limit, and the others on disk.
+
+    Rows beyond ``max_rows`` rows or ``max_bytes`` bytes are pickled to an
+    anonymous temporary file, along with their offsets so that any row can
+    be read back without reading the others. The file is removed when the
+    rows are closed or garbage collected.
+
+    Rows read from disk are new objects: mutating them does not change the
+    stored rows.
+
+    Args:
+        max_rows: (int) Number of rows kept in memory, ``0`` for no limit.
+        max_bytes: (int) Approximate size of the rows kept in memory,
+            ``0`` for no limit.
+        row_factory: (callable) Applied to every row read, such as a
+            ``result.Record`` subclass.
+    """
+
+    def __init__(self, max_rows=0, max_bytes=0, row_factory=None):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.row_factory = row_factory
+        self._rows = []
+        self._size = 0
+        self._file = None
+        self._offsets = array.array('q')
+        self._finalizer = None
+
+    def __len__(self):
+        return len(self._rows) + len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Row index out of range.')
+        if index < len(self._rows):
+            row = self._rows[index]
+        else:
+            self._file.seek(self._offsets[index - len(self._rows)])
+            row = pickle.load(self._file)
+        return self._make_row(row)
+
+    def __iter__(self):
+        for row in self._rows:
+            yield self._make_row(row)
+        if not self._offsets:
+            return
+        # Reads sequentially, from where the iteration stopped if another
+        # read moved the file position meanwhile.
+        position = self._offsets[0]
+        for _offset in self._offsets:
+            self._file.seek(position)
+            row = pickle.load(self._file)
+            position = self._file.tell()
+            yield self._make_row(row)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def spilled(self):
+        """ (bool) Whether some rows are stored on disk. """
+        return bool(self._offsets)
+
+    @property
+    def memory_rows(self):
+        """ (int) Number of rows held in memory. """
+        return len(self._rows)
+
+    def append(self, row):
+        """ It stores a row, on disk once the memory limits are reached. """
+
+        if not self._offsets:
+            size = row_size(row) if self.max_bytes else 0
+            if not (self.max_rows and len(self._rows) >= self.max_rows or
+                    self.max_bytes and self._size + size > self.max_bytes):
+                self._rows.append(row)
+                self._size += size
+                return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='dbsource_')
+            self._finalizer = weakref.finalize(self, self._file.close)
+        self._file.seek(0, 2)
+        self._offsets.append(self._file.tell())
+        pickle.dump(tuple(row), self._file, pickle.HIGHEST_PROTOCOL)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def close(self):
+        """ It removes the temporary file. The rows are no longer usable. """
+        if self._finalizer is not None:
+            self._finalizer()
+        self._rows = []
+        self._offsets = array.array('q')
+
+    def _make_row(self, row):
+        if self.row_factory is None:
+            return row
+        return self.row_factory(row)
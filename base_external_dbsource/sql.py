@@ -0,0 +1,317 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import re
+
+# Quoted literals and identifiers, which normalization must leave alone
+_QUOTED = r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`(?:[^`]|``)*`"
+_NORMALIZE = re.compile(r'(%s)|\s+' % _QUOTED)
+_STRIP_QUOTED = re.compile(_QUOTED)
+_READ_ONLY_START = re.compile(
+    r'^\s*\(*\s*(SELECT|WITH|VALUES|SHOW|TABLE|EXPLAIN)\b', re.IGNORECASE,
+)
+_WRITE_KEYWORDS = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|MERGE|INTO|CREATE|DROP|ALTER|TRUNCATE|'
+    r'GRANT|REVOKE|LOCK|CALL)\b|\bFOR\s+(UPDATE|SHARE)\b',
+    re.IGNORECASE,
+)
+# Quoted identifiers, kept as they are, or literal strings and numbers
+_GENERALIZE = re.compile(
+    r'("(?:[^"]|"")*"|`(?:[^`]|``)*`)|'
+    r"'(?:[^']|'')*'|(?<![\w$:%])\d+(?:\.\d+)?(?![\w$])"
+)
+_VALUE = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_IN_LIST = re.compile(
+    r'\bIN\s*\(\s*%s(?:\s*,\s*%s)*\s*\)' % (_VALUE, _VALUE),
+    re.IGNORECASE,
+)
+
+
+def normalize_query(query):
+    """ It collapses the whitespace of a query outside quoted literals. """
+
+    return _NORMALIZE.sub(lambda m: m.group(1) or ' ', query).strip()
+
+
+def generalize_query(query):
+    """ It returns the shape of a query, so that similar queries match.
+
+    Literal strings and numbers are replaced by ``?``, lists of values or
+    placeholders given to ``IN`` are collapsed, and whitespace is
+    normalized. Quoted identifiers are left alone.
+    """
+
+    query = _GENERALIZE.sub(lambda m: m.group(1) or '?', query)
+    return normalize_query(_IN_LIST.sub('IN (...)', query))
+
+
+def is_read_only(query):
+    """ It tells whether a query only reads data.
+
+    The check is conservative: a query mentioning any keyword that could
+    write, such as ``SELECT ... INTO`` or ``SELECT ... FOR UPDATE``, is
+    deemed not read-only.
+    """
+
+    if not _READ_ONLY_START.match(query):
+        return False
+    return not _WRITE_KEYWORDS.search(_STRIP_QUOTED.sub("''", query))
+
+
+def references_table(query, table):
+    """ It tells whether a query mentions a (possibly quoted) table name. """
+
+    name = table.split('.')[-1].strip('"`[]')
+    pattern = r'(?<![\w$])["`\[]?%s["`\]]?(?![\w$])' % re.escape(name)
+    return bool(re.search(pattern, query, re.IGNORECASE))
+
+
+class DomainCompiler(object):
+    """ It compiles Odoo-style domains into parameterized SQL conditions.
+
+    Identifiers are quoted and values are always passed as query
+    parameters, so that nothing from the domain is interpolated into the
+    SQL text.
+
+    Args:
+        quote: (callable) Returns the quoted form of an identifier.
+        placeholder: (callable) Returns the placeholder of a named
+            parameter.
+        prefix: (str) Prefix of the names of the generated parameters.
+    """
+
+    TRUE_SQL = '1=1'
+    FALSE_SQL = '1=0'
+    COMPARISON_OPERATORS = ('=', '!=', '<>', '<', '>', '<=', '>=')
+    LIKE_OPERATORS = (
+        'like', 'not like', 'ilike', 'not ilike', '=like', '=ilike',
+    )
+
+    def __init__(self, quote, placeholder, prefix='p'):
+        self.quote = quote
+        self.placeholder = placeholder
+        self.prefix = prefix
+        self.params = {}
+
+    def compile(self, domain):
+        """ It returns the SQL condition of a domain.
+
+        The parameters it refers to are accumulated in ``params``.
+
+        Args:
+            domain: (list) Domain in prefix notation, where leaves are
+                ``(column, operator, value)`` tuples and ``&`` is implied
+                between consecutive terms.
+        Returns:
+            (str) SQL condition.
+        """
+
+        tokens = iter(domain)
+        terms = []
+        for token in tokens:
+            terms.append(self._compile_term(token, tokens))
+        if not terms:
+            return self.TRUE_SQL
+        if len(terms) == 1:
+            return terms[0]
+        return '(%s)' % ' AND '.join(terms)
+
+    def _compile_term(self, token, tokens):
+        if token in ('&', '|'):
+            try:
+                left = self._compile_term(next(tokens), tokens)
+                right = self._compile_term(next(tokens), tokens)
+            except StopIteration:
+                raise ValueError('Missing operand for %r in domain.' % token)
+            return '(%s %s %s)' % (
+                left, 'AND' if token == '&' else 'OR', right,
+            )
+        if token == '!':
+            try:
+                return '(NOT %s)' % self._compile_term(next(tokens), tokens)
+            except StopIteration:
+                raise ValueError('Missing operand for "!" in domain.')
+        if isinstance(token, (list, tuple)) and len(token) == 3:
+            return self._compile_leaf(*token)
+        raise ValueError('Invalid domain term %r.' % (token, ))
+
+    def _compile_leaf(self, column, operator, value):
+        if (column, operator, value) == (1, '=', 1):
+            return self.TRUE_SQL
+        if (column, operator, value) == (0, '=', 1):
+            return self.FALSE_SQL
+        if not isinstance(column, str):
+            raise ValueError('Invalid column %r in domain.' % (column, ))
+        operator = operator.lower()
+        column = self.quote(column)
+        if operator == '=?':
+            if value is None or value is False:
+                return self.TRUE_SQL
+            operator = '='
+        if operator in self.COMPARISON_OPERATORS:
+            if operator == '!=':
+                operator = '<>'
+            if value is None:
+                if operator == '=':
+                    return '%s IS NULL' % column
+                if operator == '<>':
+                    return '%s IS NOT NULL' % column
+                raise ValueError(
+                    'Cannot compare %s to NULL with %s.' % (column, operator)
+                )
+            return '%s %s %s' % (column, operator, self._param(value))
+        if operator in ('in', 'not in'):
+            return self._compile_in(column, operator, value)
+        if operator in self.LIKE_OPERATORS:
+            return self._compile_like(column, operator, value)
+        raise ValueError('Unsupported domain operator %r.' % operator)
+
+    def _compile_in(self, column, operator, values):
+        if not isinstance(values, (list, tuple, set, frozenset)):
+            values = [values]
+        has_null = None in values
+        values = [v for v in values if v is not None]
+        placeholders = ', '.join(self._param(v) for v in values)
+        if operator == 'not in':
+            # NOT IN never matches NULL, which Odoo only excludes on demand
+            if not values:
+                return '%s IS NOT NULL' % column if has_null else self.TRUE_SQL
+            if has_null:
+                return '%s NOT IN (%s)' % (column, placeholders)
+            return '(%s NOT IN (%s) OR %s IS NULL)' % (
+                column, placeholders, column,
+            )
+        if not values:
+            return '%s IS NULL' % column if has_null else self.FALSE_SQL
+        if has_null:
+            return '(%s IN (%s) OR %s IS NULL)' % (
+                column, placeholders, column,
+            )
+        return '%s IN (%s)' % (column, placeholders)
+
+    def _compile_like(self, column, operator, value):
+        negate = operator.startswith('not ')
+        operator = operator[4:] if negate else operator
+        if not operator.startswith('='):
+            value = '%%%s%%' % value
+        placeholder = self._param(value)
+        if operator.endswith('ilike'):
+            column = 'LOWER(%s)' % column
+            placeholder = 'LOWER(%s)' % placeholder
+        return '%s %sLIKE %s' % (column, 'NOT ' if negate else '', placeholder)
+
+    def _param(self, value):
+        name = '%s%d' % (self.prefix, len(self.params))
+        self.params[name] = value
+        return self.placeholder(name)
+
+
+_ORDER_TERM = re.compile(
+    r'^\s*([\w$.]+)(?:\s+(asc|desc))?\s*$', re.IGNORECASE,
+)
+
+
+def parse_order(order):
+    """ It parses an Odoo-style order into its terms.
+
+    Args:
+        order: (str) Comma separated terms such as ``name desc, id``.
+    Returns:
+        (list) ``(column, descending)`` tuples.
+    """
+
+    terms = []
+    for term in order.split(','):
+        match = _ORDER_TERM.match(term)
+        if not match:
+            raise ValueError('Invalid order term %r.' % term)
+        column, direction = match.groups()
+        terms.append((column, (direction or '').lower() == 'desc'))
+    return terms
+
+
+def compile_order(order, quote):
+    """ It returns a safe ``ORDER BY`` clause body for an Odoo-style order.
+
+    Args:
+        order: (str) Comma separated terms such as ``name desc, id``.
+        quote: (callable) Returns the quoted form of an identifier.
+    Returns:
+        (str) SQL ordering terms with quoted identifiers.
+    """
+
+    return ', '.join(
+        '%s %s' % (quote(column), 'DESC' if descending else 'ASC')
+        for column, descending in parse_order(order)
+    )
+
+
+def keyset_domain(terms, values):
+    """ It returns the domain of the rows sorted after some key values.
+
+    Args:
+        terms: (list) ``(column, descending)`` tuples of the sort order.
+        values: (list) Key values of the last row already seen.
+    Returns:
+        (list) Domain in prefix notation, made of a single term.
+    """
+
+    (column, descending), value = terms[0], values[0]
+    leaf = (column, '<' if descending else '>', value)
+    if len(terms) == 1:
+        return [leaf]
+    return ['|', leaf, '&', (column, '=', value)] + keyset_domain(
+        terms[1:], values[1:],
+    )
+
+
+# SQL of the aggregate functions of ``remote_read_group``
+AGGREGATES = {
+    'count': 'COUNT({})',
+    'count_distinct': 'COUNT(DISTINCT {})',
+    'sum': 'SUM({})',
+    'avg': 'AVG({})',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+}
+_AGGREGATE = re.compile(r'^\s*(\w+)(?::(\w+)(?:\((\w+)\))?)?\s*$')
+_GROUP_ORDER_TERM = re.compile(
+    r'^\s*([\w:]+)(?:\s+(asc|desc))?\s*$', re.IGNORECASE,
+)
+
+
+def parse_aggregate(spec, default='sum'):
+    """ It parses an aggregated field of ``read_group``.
+
+    Args:
+        spec: (str) Field such as ``amount``, ``amount:max`` or
+            ``total:sum(amount)``.
+        default: (str) Function of fields given without one.
+    Returns:
+        (tuple) Name of the result, aggregate function and column.
+    """
+
+    match = _AGGREGATE.match(spec)
+    if not match or (match.group(2) or default) not in AGGREGATES:
+        raise ValueError('Invalid aggregate %r.' % spec)
+    name, function, column = match.groups()
+    return name, function or default, column or name
+
+
+def parse_group_order(order, names):
+    """ It parses the order of the groups of ``read_group``.
+
+    Args:
+        order: (str) Comma separated terms such as ``date:month desc``.
+        names: (iter) Names the groups can be sorted by.
+    Returns:
+        (list) ``(name, descending)`` tuples.
+    """
+
+    terms = []
+    for term in order.split(','):
+        match = _GROUP_ORDER_TERM.match(term)
+        if not match or match.group(1) not in names:
+            raise ValueError('Invalid group order term %r.' % term)
+        name, direction = match.groups()
+        terms.append((name, (direction or '').lower() == 'desc'))
+    return terms
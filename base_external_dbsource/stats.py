@@ -0,0 +1,248 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import bisect
+import collections
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Upper bounds in milliseconds of the buckets of the latency histograms,
+# followed by a last bucket for slower queries.
+BUCKETS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000,
+    60000,
+)
+PHASES = ('connect', 'execute', 'fetch')
+# Query under which the measures of queries beyond the limit are gathered
+OTHER_QUERIES = '<other>'
+
+_collectors = {}
+_collectors_lock = threading.Lock()
+_flushes = {}
+_local = threading.local()
+
+
+def percentile(histogram, fraction, maximum=None):
+    """ It returns a percentile of the latencies of a histogram.
+
+    Args:
+        histogram: (list) Number of queries per bucket of ``BUCKETS``.
+        fraction: (float) Fraction of the queries, such as ``0.95``.
+        maximum: (float) Greatest latency measured, if known.
+    Returns:
+        (float) Upper bound in milliseconds of the bucket holding the
+        percentile, capped by ``maximum``.
+    """
+
+    rank = fraction * sum(histogram)
+    if not rank:
+        return 0.0
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            break
+    bound = BUCKETS[index] if index < len(BUCKETS) else None
+    if maximum is not None and (bound is None or maximum < bound):
+        return float(maximum)
+    return float(BUCKETS[-1] if bound is None else bound)
+
+
+def merge_histograms(histograms):
+    """ It returns the sum of histograms of the same buckets. """
+
+    merged = [0] * (len(BUCKETS) + 1)
+    for histogram in histograms:
+        for index, count in enumerate(histogram):
+            merged[index] += count
+    return merged
+
+
+class Measure(object):
+    """ It measures the run of a query, in milliseconds per phase.
+
+    Args:
+        query: (str) Generalized text of the query.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.date = time.time()
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self.error = None
+
+    @property
+    def elapsed(self):
+        return sum(self.times.values())
+
+    @contextmanager
+    def running(self, phase):
+        """ It makes it the measure of the current thread.
+
+        The time spent within is added to ``phase``, apart from the time
+        measured by ``phase()`` blocks, and exceptions are recorded.
+        """
+
+        previous = getattr(_local, 'measure', None)
+        _local.measure = self
+        timed = self.elapsed
+        started = time.time()
+        try:
+            yield self
+        except Exception as e:
+            self.error = type(e).__name__
+            raise
+        finally:
+            _local.measure = previous
+            elapsed = (time.time() - started) * 1000
+            self.times[phase] += max(elapsed - (self.elapsed - timed), 0.0)
+
+
+class QueryStats(object):
+    """ It aggregates the measures of one query. """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.max_time = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, measure):
+        elapsed = measure.elapsed
+        self.calls += 1
+        self.errors += bool(measure.error)
+        self.rows += measure.rows
+        for phase, value in measure.times.items():
+            self.times[phase] += value
+        self.max_time = max(self.max_time, elapsed)
+        self.histogram[bisect.bisect_left(BUCKETS, elapsed)] += 1
+
+
+class Collector(object):
+    """ It aggregates the measures of the queries of a data source.
+
+    Measures are kept in memory until they are drained, by query up to
+    ``max_queries`` distinct queries, and the slowest ones individually up
+    to ``max_slow``, the oldest being dropped first.
+    """
+
+    def __init__(self, max_queries=500, max_slow=100):
+        self.max_queries = max_queries
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._slow = collections.deque(maxlen=max_slow)
+
+    def record(self, measure, slow_threshold=0):
+        """ It adds a measure, logging it as slow beyond the threshold.
+
+        Returns:
+            (bool) Whether the query was slow.
+        """
+
+        slow = bool(slow_threshold) and measure.elapsed >= slow_threshold
+        with self._lock:
+            stats = self._queries.get(measure.query)
+            if stats is None:
+                query = measure.query
+                if len(self._queries) >= self.max_queries:
+                    query = OTHER_QUERIES
+                stats = self._queries.setdefault(query, QueryStats())
+            stats.add(measure)
+            if slow:
+                self._slow.append(measure)
+        return slow
+
+    def drain(self):
+        """ It returns the measures aggregated so far and forgets them.
+
+        Returns:
+            (tuple) ``QueryStats`` by query, and list of slow ``Measure``.
+        """
+
+        with self._lock:
+            queries, self._queries = self._queries, {}
+            slow = list(self._slow)
+            self._slow.clear()
+        return queries, slow
+
+
+def current():
+    """ It returns the measure running in the current thread, if any. """
+
+    return getattr(_local, 'measure', None)
+
+
+@contextmanager
+def phase(name):
+    """ It adds the time spent within to a phase of the running measure. """
+
+    measure = current()
+    if measure is None:
+        yield
+        return
+    started = time.time()
+    try:
+        yield
+    finally:
+        measure.times[name] += (time.time() - started) * 1000
+
+
+def get_collector(key):
+    """ It returns the process-wide collector for ``key``, creating it if
+    needed.
+
+    Args:
+        key: (tuple) ``(dbname, dbsource_id)`` of the data source.
+    """
+
+    with _collectors_lock:
+        collector = _collectors.get(key)
+        if collector is None:
+            collector = _collectors[key] = Collector()
+        return collector
+
+
+def drain_collectors(dbname):
+    """ It drains the collectors of the data sources of a database.
+
+    Returns:
+        (dict) ``(queries, slow)`` tuples returned by ``Collector.drain``,
+        by data source ID.
+    """
+
+    with _collectors_lock:
+        collectors = [
+            (key[1], collector) for key, collector in _collectors.items()
+            if key[0] == dbname
+        ]
+        _flushes[dbname] = time.time()
+    return {
+        dbsource_id: collector.drain() for dbsource_id, collector in collectors
+    }
+
+
+def flush_due(dbname, interval):
+    """ It tells whether the collectors of a database are due for a flush.
+
+    Only one caller is told so per interval, so that a single thread
+    flushes them.
+    """
+
+    now = time.time()
+    with _collectors_lock:
+        last_flush = _flushes.setdefault(dbname, now)
+        if now - last_flush < interval:
+            return False
+        _flushes[dbname] = now
+        return True
+
+
+def drop_collector(dbname, dbsource_id):
+    """ It forgets the measures of the given data source. """
+
+    with _collectors_lock:
+        _collectors.pop((dbname, dbsource_id), None)
@@ -0,0 +1,60 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import csv
+
+_END = object()
+
+
+def format_csv_value(value):
+    """ It returns the CSV representation of a value.
+
+    Non-null values are always quoted, so that empty strings can be told
+    apart from NULL values, written as an unquoted empty field, like
+    PostgreSQL's ``COPY ... WITH (FORMAT csv)`` does.
+    """
+
+    if value is None:
+        return ''
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = '\\x%s' % bytes(value).hex()
+    else:
+        value = str(value)
+    return '"%s"' % value.replace('"', '""')
+
+
+def format_csv_row(row):
+    return ','.join(format_csv_value(v) for v in row) + '\n'
+
+
+def parse_csv_rows(file_obj):
+    """ It yields the rows of a CSV file, reading empty fields as NULL. """
+
+    for row in csv.reader(file_obj):
+        yield [value if value != '' else None for value in row]
+
+
+class CsvStream(object):
+    """ It exposes an iterable of rows as a readable CSV file object.
+
+    Rows are only formatted as they are read, so that the iterable can be
+    streamed to ``COPY ... FROM STDIN`` without being held in memory.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        chunks, length = [self._buffer], len(self._buffer)
+        while size is None or size < 0 or length < size:
+            row = next(self._rows, _END)
+            if row is _END:
+                break
+            line = format_csv_row(row)
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size is None or size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
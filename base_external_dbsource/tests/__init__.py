@@ -1 +1,15 @@
 from . import test_base_external_dbsource
+from . import test_pool
+from . import test_result
+from . import test_cache
+from . import test_sql
+from . import test_base_external_dbsource_sync
+from . import test_replicas
+from . import test_stats
+from . import test_base_external_dbsource_snapshot
+from . import test_spill
+from . import test_singleflight
+from . import test_partition
+from . import test_prepared
+from . import test_join
+from . import test_base_external_dbsource_model
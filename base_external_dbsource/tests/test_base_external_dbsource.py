@@ -1,10 +1,35 @@
 # Copyright 2016 LasLabs Inc.
 
+import decimal
+import io
+import logging
 import mock
+import os
+import psycopg2
+import threading
+import time
+import unittest
 
+from concurrent import futures
+
+from odoo.exceptions import ValidationError
 from odoo.tests import common
 
-from ..exceptions import ConnectionFailedError, ConnectionSuccessError
+from ..cache import drop_caches
+from ..replicas import drop_router
+from ..singleflight import SingleFlight, drop_group, get_group
+from ..stats import drop_collector, get_collector
+from ..exceptions import (
+    ConnectionFailedError, ConnectionSuccessError, StatementTimeoutError,
+)
+from ..result import RowIterator
+from ..spill import SpilledRows
+
+_logger = logging.getLogger(__name__)
+
+# Benchmarks are slow and depend on the load of the host, so that they
+# only run on demand.
+BENCHMARK = bool(os.environ.get('DBSOURCE_BENCHMARK'))
 
 
 class TestBaseExternalDbsource(common.TransactionCase):
@@ -12,6 +37,9 @@ class TestBaseExternalDbsource(common.TransactionCase):
     def setUp(self):
         super(TestBaseExternalDbsource, self).setUp()
         self.dbsource = self.env.ref('base_external_dbsource.demo_postgre')
+        drop_caches(self.env.cr.dbname, self.dbsource.id)
+        drop_router(self.env.cr.dbname, self.dbsource.id)
+        drop_collector(self.env.cr.dbname, self.dbsource.id)
 
     def _test_adapter_method(
         self, method_name, side_effect=None, return_value=None,
@@ -63,6 +91,54 @@ class TestBaseExternalDbsource(common.TransactionCase):
                 pass
             close.assert_called_once()
 
+    def test_connection_open_pool(self):
+        """ It should reuse pooled connections """
+        with self.dbsource.connection_open() as connection:
+            pass
+        with self.dbsource.connection_open() as reused:
+            self.assertIs(reused, connection)
+
+    def test_connection_open_pool_disabled(self):
+        """ It should open a connection per use if pooling is disabled """
+        self.dbsource.pool_size_max = 0
+        with mock.patch.object(
+            self.dbsource, 'connection_close_postgresql',
+        ) as close:
+            with self.dbsource.connection_open() as connection:
+                pass
+            close.assert_called_once_with(connection)
+
+    def test_write_connection_fields_disposes_pool(self):
+        """ It should dispose of the pool when connection fields change """
+        with mock.patch.object(
+            type(self.dbsource), '_connection_dispose',
+        ) as dispose:
+            self.dbsource.name = 'Renamed'
+            dispose.assert_not_called()
+            self.dbsource.pool_size_max = 2
+            dispose.assert_called_once_with()
+
+    def test_connection_dispose_single_flight(self):
+        """ It should forget the single-flight group of the data source """
+        group = get_group((self.env.cr.dbname, self.dbsource.id))
+        self.dbsource._connection_dispose()
+        self.assertIsNot(
+            get_group((self.env.cr.dbname, self.dbsource.id)), group,
+        )
+
+    def test_unlink_single_flight(self):
+        """ It should forget the single-flight group on unlink """
+        key = self.env.cr.dbname, self.dbsource.id
+        group = get_group(key)
+        self.dbsource.unlink()
+        self.assertIsNot(get_group(key), group)
+        drop_group(*key)
+
+    def test_check_pool_settings(self):
+        """ It should not allow a minimum pool size above the maximum """
+        with self.assertRaises(ValidationError):
+            self.dbsource.write({'pool_size_min': 3, 'pool_size_max': 2})
+
     def test_connection_close(self):
         """ It should call adapter's close method """
         args = [mock.MagicMock()]
@@ -107,6 +183,163 @@ class TestBaseExternalDbsource(common.TransactionCase):
              'cols': return_value[1]},
         )
 
+    def test_execute_iter_calls_adapter(self):
+        """ It should wrap the adapter generator in a row iterator """
+        res, adapter = self._test_adapter_method(
+            'execute_iter', args=['query', 'params', 10],
+        )
+        adapter.assert_called_once_with('query', 'params', 10)
+        self.assertIsInstance(res, RowIterator)
+
+    def test_execute_many_pages(self):
+        """ It should call the adapter once per page in one transaction """
+        with mock.patch.object(
+            self.dbsource, 'transaction_commit_postgresql',
+        ) as commit:
+            res, adapter = self._test_adapter_method(
+                'execute_many', args=['query', [(1, ), (2, ), (3, )], 2],
+            )
+            self.assertEqual(res, 3)
+            self.assertEqual(adapter.call_count, 2)
+            self.assertEqual(adapter.call_args[0][1:], ('query', [(3, )]))
+            commit.assert_called_once()
+
+    def test_execute_many_commit_interval(self):
+        """ It should commit every commit_interval pages """
+        with mock.patch.object(
+            self.dbsource, 'transaction_commit_postgresql',
+        ) as commit:
+            self._test_adapter_method(
+                'execute_many', args=['query', range(5), 1, 2],
+            )
+            self.assertEqual(commit.call_count, 3)
+
+    def test_execute_many_rollback(self):
+        """ It should roll back the transaction on failure """
+        with mock.patch.object(
+            self.dbsource, 'transaction_rollback_postgresql',
+        ) as rollback:
+            with self.assertRaises(ValueError):
+                self._test_adapter_method(
+                    'execute_many', args=['query', [(1, )]],
+                    side_effect=ValueError,
+                )
+            rollback.assert_called_once()
+
+    def test_execute_cache(self):
+        """ It should only call the adapter once for cached queries """
+        self.dbsource.cache_enabled = True
+        return_value = [(1, )], ['col']
+        for _i in range(2):
+            res, adapter = self._test_adapter_method(
+                'execute', args=['SELECT  col FROM t', None, True],
+                return_value=return_value,
+            )
+            self.assertEqual(res, {'rows': [(1, )], 'cols': ['col']})
+        res, adapter = self._test_adapter_method(
+            'execute', args=['SELECT col\nFROM t'],
+            return_value=return_value,
+        )
+        adapter.assert_not_called()
+        self.assertEqual(res, [(1, )])
+        self.assertEqual(self.dbsource.cache_hits, 2)
+        self.assertEqual(self.dbsource.cache_misses, 1)
+
+    def test_execute_cache_override(self):
+        """ It should bypass the cache when asked to """
+        self.dbsource.cache_enabled = True
+        return_value = [(1, )], ['col']
+        self._test_adapter_method(
+            'execute', args=['SELECT col FROM t'], return_value=return_value,
+        )
+        res, adapter = self._test_adapter_method(
+            'execute', args=['SELECT col FROM t'], kwargs={'cache': False},
+            return_value=return_value,
+        )
+        adapter.assert_called_once_with('SELECT col FROM t', None, False)
+
+    def test_execute_cache_read_only(self):
+        """ It should not cache statements that write """
+        self.dbsource.cache_enabled = True
+        for _i in range(2):
+            res, adapter = self._test_adapter_method(
+                'execute', args=['DELETE FROM t'], return_value=([], []),
+            )
+            adapter.assert_called_once()
+
+    def test_remote_create_invalidates_cache(self):
+        """ It should drop the cached results of the current table """
+        self.dbsource.cache_enabled = True
+        return_value = [(1, )], ['col']
+        for query in ('SELECT * FROM t', 'SELECT * FROM other'):
+            self._test_adapter_method(
+                'execute', args=[query], return_value=return_value,
+            )
+        self.dbsource.current_table = 't'
+        self._test_adapter_method(
+            'remote_create', create=True, args=[{'col': 2}],
+        )
+        for query, cached in (('SELECT * FROM t', False),
+                              ('SELECT * FROM other', True)):
+            res, adapter = self._test_adapter_method(
+                'execute', args=[query], return_value=return_value,
+            )
+            self.assertEqual(adapter.called, not cached)
+
+    def _test_execute_all(self, worker, **kwargs):
+        dbsources = self.dbsource | self.dbsource.copy()
+        with mock.patch.object(
+            type(self.dbsource), '_execute_all_worker', side_effect=worker,
+        ):
+            return dbsources, dbsources.execute_all('query', **kwargs)
+
+    def test_execute_all(self):
+        """ It should return the result of every data source by ID """
+        def worker(dbsource_id, starts, query, params, metadata):
+            return [(dbsource_id, query)]
+        dbsources, res = self._test_execute_all(worker)
+        self.assertEqual(res, {
+            dbsource.id: {'result': [(dbsource.id, 'query')], 'error': None}
+            for dbsource in dbsources
+        })
+
+    def test_execute_all_partial_failure(self):
+        """ It should report errors of failing data sources """
+        def worker(dbsource_id, starts, query, params, metadata):
+            if dbsource_id == self.dbsource.id:
+                raise ValueError()
+            return []
+        dbsources, res = self._test_execute_all(worker)
+        self.assertIsInstance(res[self.dbsource.id]['error'], ValueError)
+        self.assertEqual(res[dbsources[1].id], {'result': [], 'error': None})
+
+    def test_execute_all_timeout(self):
+        """ It should stop waiting for data sources that time out """
+        event = threading.Event()
+
+        def worker(dbsource_id, starts, query, params, metadata):
+            starts[dbsource_id] = time.time()
+            if dbsource_id == self.dbsource.id:
+                event.wait(5)
+            return []
+        try:
+            dbsources, res = self._test_execute_all(worker, timeout=0.2)
+        finally:
+            event.set()
+        self.assertIsInstance(
+            res[self.dbsource.id]['error'], futures.TimeoutError,
+        )
+        self.assertEqual(res[dbsources[1].id]['result'], [])
+
+    def test_execute_all_worker(self):
+        """ It should execute the query with a dedicated cursor """
+        starts = {}
+        res = self.dbsource._execute_all_worker(
+            self.dbsource.id, starts, 'SELECT %(n)s', {'n': 1}, False,
+        )
+        self.assertEqual(res, [(1, )])
+        self.assertIn(self.dbsource.id, starts)
+
     def test_remote_browse(self):
         """ It should call the adapter method with proper args """
         args = [1], 'args'
@@ -178,6 +411,17 @@ class TestBaseExternalDbsource(common.TransactionCase):
         adapter.assert_called_once_with(*args, **kwargs)
         self.assertEqual(res, adapter())
 
+    def test_remote_read_group(self):
+        """ It should call the adapter method with proper args """
+        args = [('a', '=', 1)], ['amount'], ['state'], 'args'
+        kwargs = {'kwargs': True}
+        self.dbsource.current_table = 'table'
+        res, adapter = self._test_adapter_method(
+            'remote_read_group', create=True, args=args, kwargs=kwargs,
+        )
+        adapter.assert_called_once_with(*args, **kwargs)
+        self.assertEqual(res, adapter())
+
     def test_remote_search_asserts_current_table(self):
         """ It should raise AssertionError if a table not selected """
         args = [1], 'args'
@@ -219,6 +463,809 @@ class TestBaseExternalDbsource(common.TransactionCase):
             self.dbsource.execute(*expect)
             execute.assert_called_once_with(*expect)
 
+    def test_execute_iter_postgresql(self):
+        """ It should stream rows through a server side cursor """
+        rows = self.dbsource.execute_iter(
+            'SELECT n FROM generate_series(1, %(count)s) n',
+            {'count': 10}, batch_size=3,
+        )
+        self.assertEqual(rows.cols, ['n'])
+        self.assertEqual(
+            list(rows.batches()),
+            [[(1, ), (2, ), (3, )], [(4, ), (5, ), (6, )],
+             [(7, ), (8, ), (9, )], [(10, )]],
+        )
+
+    def test_execute_iter_postgresql_close(self):
+        """ It should release the connection when closed early """
+        with mock.patch.object(
+            self.dbsource, 'connection_close',
+        ) as close:
+            with self.dbsource.execute_iter(
+                'SELECT n FROM generate_series(1, 10) n', batch_size=3,
+            ) as rows:
+                next(rows)
+                close.assert_not_called()
+            close.assert_called_once()
+
+    def test_execute_many_postgresql(self):
+        """ It should insert all rows using either batch method """
+        with self.dbsource.connection_open() as connection:
+            cursor = connection.cursor()
+            cursor.execute('CREATE TEMP TABLE items (id INT, code TEXT)')
+            self.dbsource.execute_many_postgresql(
+                connection, 'INSERT INTO items (id, code) VALUES %s',
+                [(1, 'A'), (2, 'B')],
+            )
+            self.dbsource.execute_many_postgresql(
+                connection,
+                'INSERT INTO items (id, code) VALUES (%(id)s, %(code)s)',
+                [{'id': 3, 'code': 'C'}],
+            )
+            cursor.execute('SELECT * FROM items ORDER BY id')
+            self.assertEqual(
+                cursor.fetchall(), [(1, 'A'), (2, 'B'), (3, 'C')],
+            )
+
+    def _create_temp_table(self):
+        # Temporary tables live as long as the pooled connection, which is
+        # handed out again by the next connection_open.
+        with self.dbsource.connection_open() as connection:
+            cursor = connection.cursor()
+            cursor.execute('CREATE TEMP TABLE copy_items (id INT, code TEXT)')
+            connection.commit()
+
+        def drop():
+            with self.dbsource.connection_open() as connection:
+                connection.cursor().execute('DROP TABLE copy_items')
+                connection.commit()
+        self.addCleanup(drop)
+
+    def test_copy_from_postgresql_rows(self):
+        """ It should stream rows through COPY """
+        self._create_temp_table()
+        rows = ((i, 'C%d' % i if i else '') for i in range(3))
+        self.assertEqual(self.dbsource.copy_from('copy_items', rows), 3)
+        self.dbsource.copy_from('copy_items', [(None, None)])
+        self.assertEqual(
+            self.dbsource.execute('SELECT * FROM copy_items ORDER BY id'),
+            [(0, ''), (1, 'C1'), (2, 'C2'), (None, None)],
+        )
+
+    def test_copy_from_postgresql_file(self):
+        """ It should load files in the given format and columns """
+        self._create_temp_table()
+        self.dbsource.copy_from(
+            'copy_items', io.StringIO('A\t1\nB\t2\n'), columns=['code', 'id'],
+            format='text',
+        )
+        self.assertEqual(
+            self.dbsource.execute('SELECT * FROM copy_items ORDER BY id'),
+            [(1, 'A'), (2, 'B')],
+        )
+
+    def test_copy_to_postgresql(self):
+        """ It should export a parameterized query through COPY """
+        output = io.StringIO()
+        count = self.dbsource.copy_to(
+            'SELECT n, %(code)s FROM generate_series(1, 2) n', output,
+            {'code': 'X'},
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(output.getvalue(), '1,X\n2,X\n')
+
+    def test_remote_search_postgresql(self):
+        """ It should evaluate the domain on the remote """
+        self._create_temp_table()
+        self.dbsource.copy_from('copy_items', [(1, 'A'), (2, 'b'), (3, 'B')])
+        self.dbsource.change_table('copy_items')
+        records = self.dbsource.remote_search(
+            [('code', '=ilike', 'b'), ('id', '!=', 2)], fields=['id'],
+        )
+        self.assertEqual(list(records), [{'id': 3}])
+        self.assertEqual(
+            self.dbsource.remote_search([], count=True), 3,
+        )
+
+    def _create_sales_table(self):
+        with self.dbsource.connection_open() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                'CREATE TEMP TABLE sales (state TEXT, amount INT, date DATE)'
+            )
+            cursor.execute(
+                "INSERT INTO sales VALUES ('done', 10, '2018-01-15'), "
+                "('done', 5, '2018-02-03'), ('draft', 7, '2018-02-20'), "
+                "(NULL, 1, NULL)"
+            )
+            connection.commit()
+
+        def drop():
+            with self.dbsource.connection_open() as connection:
+                connection.cursor().execute('DROP TABLE sales')
+                connection.commit()
+        self.addCleanup(drop)
+        self.dbsource.change_table('sales')
+
+    def test_remote_read_group_postgresql(self):
+        """ It should aggregate the rows by group on the remote """
+        self._create_sales_table()
+        groups = self.dbsource.remote_read_group(
+            [('amount', '>', 0)], ['state', 'amount'], ['state'],
+        )
+        self.assertEqual(groups, [{
+            'state': 'done', 'state_count': 2, 'amount': 15,
+            '__domain': ['&', ('state', '=', 'done'), ('amount', '>', 0)],
+        }, {
+            'state': 'draft', 'state_count': 1, 'amount': 7,
+            '__domain': ['&', ('state', '=', 'draft'), ('amount', '>', 0)],
+        }, {
+            'state': False, 'state_count': 1, 'amount': 1,
+            '__domain': ['&', ('state', '=', None), ('amount', '>', 0)],
+        }])
+
+    def test_remote_read_group_date_postgresql(self):
+        """ It should group dates by period, labeled like read_group """
+        self._create_sales_table()
+        groups = self.dbsource.remote_read_group(
+            [], ['total:sum(amount)'], ['date:month', 'state'],
+        )
+        self.assertEqual(
+            [(g['date:month'], g['date_count'], g['total']) for g in groups],
+            [('January 2018', 1, 10), ('February 2018', 2, 12),
+             (False, 1, 1)],
+        )
+        self.assertEqual(groups[1]['__domain'], [
+            '&', ('date', '>=', '2018-02-01'), ('date', '<', '2018-03-01'),
+        ])
+        self.assertEqual(groups[1]['__context'], {'group_by': ['state']})
+
+    def test_remote_read_group_not_lazy_postgresql(self):
+        """ It should group by every field, sorted and limited """
+        self._create_sales_table()
+        groups = self.dbsource.remote_read_group(
+            [], ['amount:max'], ['date:year', 'state'], orderby='amount desc',
+            limit=2, lazy=False,
+        )
+        self.assertEqual(
+            [(g['date:year'], g['state'], g['__count'], g['amount'])
+             for g in groups],
+            [('2018', 'done', 2, 10), ('2018', 'draft', 1, 7)],
+        )
+        self.assertNotIn('__context', groups[0])
+
+    def test_remote_read_group_invalid(self):
+        """ It should reject unknown periods and sort orders """
+        self.dbsource.change_table('sales')
+        with self.assertRaises(ValueError):
+            self.dbsource.remote_read_group([], [], ['date:hour'])
+        with self.assertRaises(ValueError):
+            self.dbsource.remote_read_group(
+                [], [], ['state'], orderby='amount',
+            )
+
+    def test_remote_browse_postgresql(self):
+        """ It should browse IDs by chunks """
+        self._create_temp_table()
+        self.dbsource.copy_from('copy_items', [(1, 'A'), (2, 'B'), (3, 'C')])
+        self.dbsource.change_table('copy_items')
+        records = self.dbsource.remote_browse([1, 3, 4], chunk_size=2)
+        self.assertEqual(
+            sorted(r['code'] for r in records), ['A', 'C'],
+        )
+
+    def test_remote_update_postgresql(self):
+        """ It should update the records in chunks """
+        self._create_temp_table()
+        self.dbsource.copy_from('copy_items', [(1, 'A'), (2, 'B'), (3, 'C')])
+        self.dbsource.change_table('copy_items')
+        records = self.dbsource.remote_update(
+            [1, 2], {'code': 'Z'}, chunk_size=1,
+        )
+        self.assertEqual(len(list(records)), 2)
+        self.assertEqual(
+            self.dbsource.execute('SELECT code FROM copy_items ORDER BY id'),
+            [('Z', ), ('Z', ), ('C', )],
+        )
+
+    def test_remote_delete_postgresql(self):
+        """ It should delete the records and tell which ones existed """
+        self._create_temp_table()
+        self.dbsource.copy_from('copy_items', [(1, 'A'), (2, 'B')])
+        self.dbsource.change_table('copy_items')
+        self.assertEqual(
+            list(self.dbsource.remote_delete([2, 5], chunk_size=1)),
+            [True, False],
+        )
+
+    def test_paginate_token(self):
+        """ It should round trip the key values through a token """
+        self.dbsource.change_table('items')
+        token = self.dbsource._paginate_token_dump('id asc', [42])
+        self.assertEqual(
+            self.dbsource._paginate_token_load(token, 'id asc'), [42],
+        )
+
+    def test_paginate_token_mismatch(self):
+        """ It should reject tokens of another table, order or format """
+        self.dbsource.change_table('items')
+        token = self.dbsource._paginate_token_dump('id asc', [42])
+        with self.assertRaises(ValueError):
+            self.dbsource._paginate_token_load(token, 'id desc')
+        with self.assertRaises(ValueError):
+            self.dbsource._paginate_token_load('not a token', 'id asc')
+        self.dbsource.change_table('other_items')
+        with self.assertRaises(ValueError):
+            self.dbsource._paginate_token_load(token, 'id asc')
+
+    def test_remote_paginate_asserts_current_table(self):
+        """ It should raise AssertionError if a table not selected """
+        with self.assertRaises(AssertionError):
+            self.dbsource.remote_paginate('id')
+
+    def _create_replica(self):
+        return self.dbsource.copy({
+            'name': 'Replica',
+            'primary_id': self.dbsource.id,
+        })
+
+    def test_unlink_replicas(self):
+        """ It should dispose of the replicas deleted with their primary """
+        replica = self._create_replica()
+        key = self.env.cr.dbname, replica.id
+        group = get_group(key)
+        self.dbsource.unlink()
+        self.assertFalse(replica.exists())
+        self.assertIsNot(get_group(key), group)
+        drop_group(*key)
+
+    def test_execute_replica(self):
+        """ It should run read-only queries on the replicas """
+        self._create_replica()
+        self.assertEqual(self.dbsource.execute('SELECT 1'), [(1, )])
+
+    def test_execute_routing(self):
+        """ It should only route reads to replicas unless overridden """
+        replica = self._create_replica()
+        with mock.patch.object(
+            type(self.dbsource), 'execute_postgresql', autospec=True,
+            return_value=([], []),
+        ) as execute:
+            self.dbsource.execute('SELECT 1')
+            self.assertEqual(execute.call_args[0][0], replica)
+            self.dbsource.execute('DELETE FROM t')
+            self.assertEqual(execute.call_args[0][0], self.dbsource)
+            self.dbsource.execute('SELECT 1', route='primary')
+            self.assertEqual(execute.call_args[0][0], self.dbsource)
+            self.dbsource.execute('SELECT 1 FOR UPDATE', route='replica')
+            self.assertEqual(execute.call_args[0][0], replica)
+
+    def test_execute_iter_routing(self):
+        """ It should stream read-only queries from the replicas """
+        replica = self._create_replica()
+        with mock.patch.object(
+            type(self.dbsource), 'execute_iter_postgresql', autospec=True,
+        ) as execute_iter:
+            self.dbsource.execute_iter('SELECT 1')
+            self.assertEqual(execute_iter.call_args[0][0], replica)
+
+    def test_execute_replica_failover(self):
+        """ It should eject unhealthy replicas and fail over """
+        replica = self._create_replica()
+
+        def execute(record, query, params, metadata):
+            if record == replica:
+                raise psycopg2.OperationalError('Connection lost')
+            return [(1, )], []
+
+        with mock.patch.object(
+            type(self.dbsource), 'execute_postgresql', autospec=True,
+            side_effect=execute,
+        ), mock.patch.object(
+            type(self.dbsource), '_replica_healthy', return_value=False,
+        ):
+            self.assertEqual(self.dbsource.execute('SELECT 1'), [(1, )])
+        self.assertTrue(
+            self.dbsource._replica_router().is_ejected(replica.id),
+        )
+
+    def test_execute_replica_query_error(self):
+        """ It should raise query errors of healthy replicas """
+        self._create_replica()
+        with mock.patch.object(
+            type(self.dbsource), 'execute_postgresql',
+            side_effect=psycopg2.ProgrammingError('Syntax error'),
+        ), mock.patch.object(
+            type(self.dbsource), '_replica_healthy', return_value=True,
+        ):
+            with self.assertRaises(psycopg2.ProgrammingError):
+                self.dbsource.execute('SELECT')
+
+    def test_check_replicas(self):
+        """ It should reject replicas of replicas """
+        replica = self._create_replica()
+        with self.assertRaises(ValidationError):
+            replica.copy({'primary_id': replica.id})
+
+    def test_session_connection(self):
+        """ It should share one connection within a session """
+        with self.dbsource.session() as session:
+            with self.dbsource.connection_open() as connection:
+                self.assertIs(connection, session.connection)
+            with self.dbsource.session() as nested:
+                self.assertIs(nested, session)
+        self.assertIsNone(self.dbsource._get_session())
+
+    def test_session_transaction(self):
+        """ It should commit writes together when the session closes """
+        self._create_temp_table()
+        with self.dbsource.session() as session:
+            session.execute_many(
+                'INSERT INTO copy_items (id) VALUES %s', [(1, ), (2, )],
+            )
+            session.rollback()
+            session.execute_many(
+                'INSERT INTO copy_items (id) VALUES %s', [(3, )],
+            )
+            self.assertEqual(
+                session.execute('SELECT id FROM copy_items'), [(3, )],
+            )
+        self.assertEqual(
+            self.dbsource.execute('SELECT id FROM copy_items'), [(3, )],
+        )
+
+    def test_session_rollback(self):
+        """ It should roll back the session on exceptions """
+        with mock.patch.object(
+            type(self.dbsource), 'transaction_rollback_postgresql',
+        ) as rollback, mock.patch.object(
+            type(self.dbsource), 'transaction_commit_postgresql',
+        ) as commit:
+            with self.assertRaises(ZeroDivisionError):
+                with self.dbsource.session():
+                    self.dbsource.execute_many('SELECT %s', [(1, )])
+                    1 / 0
+        rollback.assert_called_once()
+        commit.assert_not_called()
+
+    def test_session_bypasses_cache_and_replicas(self):
+        """ It should run every query on the session connection """
+        self._create_replica()
+        self.dbsource.cache_enabled = True
+        with self.dbsource.session() as session:
+            with mock.patch.object(
+                type(self.dbsource), 'execute_postgresql', autospec=True,
+                return_value=([], []),
+            ) as execute:
+                session.execute('SELECT 1')
+                session.execute('SELECT 1')
+            self.assertEqual(execute.call_count, 2)
+            self.assertEqual(execute.call_args[0][0], self.dbsource)
+
+    def test_statement_timeout(self):
+        """ It should cancel queries running longer than the timeout """
+        with self.assertRaises(StatementTimeoutError):
+            self.dbsource.execute('SELECT pg_sleep(1)', statement_timeout=50)
+        self.assertEqual(self.dbsource.execute('SELECT 1'), [(1, )])
+
+    def test_statement_timeout_default(self):
+        """ It should apply the timeout of the data source by default """
+        self.dbsource.statement_timeout = 50
+        with self.assertRaises(StatementTimeoutError):
+            with self.dbsource.execute_iter('SELECT pg_sleep(1)') as rows:
+                list(rows)
+        self.assertEqual(
+            self.dbsource.execute('SELECT 1', statement_timeout=0), [(1, )],
+        )
+
+    def test_check_statement_timeout(self):
+        """ It should reject negative timeouts """
+        with self.assertRaises(ValidationError):
+            self.dbsource.statement_timeout = -1
+
+    def _drain_stats(self):
+        return get_collector((self.env.cr.dbname, self.dbsource.id)).drain()
+
+    def test_execute_stats(self):
+        """ It should measure queries by their generalized text """
+        self.dbsource.execute('SELECT 1 UNION ALL SELECT 2')
+        self.dbsource.execute('SELECT 3 UNION ALL SELECT 4')
+        stats = self._drain_stats()[0]['SELECT ? UNION ALL SELECT ?']
+        self.assertEqual((stats.calls, stats.rows, stats.errors), (2, 4, 0))
+        self.assertGreater(stats.times['execute'], 0)
+
+    def test_execute_stats_error(self):
+        """ It should count failed queries """
+        with self.assertRaises(psycopg2.Error):
+            self.dbsource.execute('SELECT * FROM dbsource_missing_table')
+        stats = self._drain_stats()[0]
+        self.assertEqual(
+            stats['SELECT * FROM dbsource_missing_table'].errors, 1,
+        )
+
+    def test_execute_iter_stats(self):
+        """ It should measure the rows fetched by execute_iter """
+        query = 'SELECT generate_series(1, 5)'
+        with self.dbsource.execute_iter(query, batch_size=2) as rows:
+            list(rows)
+        stats = self._drain_stats()[0]['SELECT generate_series(?, ?)']
+        self.assertEqual((stats.calls, stats.rows), (1, 5))
+
+    def test_stats_disabled(self):
+        """ It should not measure anything when disabled """
+        self.dbsource.stats_enabled = False
+        self.dbsource.execute('SELECT 1')
+        self.assertEqual(self._drain_stats(), ({}, []))
+
+    def test_stats_store(self):
+        """ It should store statistics and slow queries """
+        self.dbsource.slow_query_threshold = 1
+        self.dbsource.execute('SELECT pg_sleep(0.01)')
+        self.dbsource.execute('SELECT 1')
+        self.dbsource._stats_store()
+        stat = self.dbsource.stat_ids.filtered(
+            lambda s: s.query == 'SELECT pg_sleep(?)',
+        )
+        self.assertEqual(stat.calls, 1)
+        self.assertGreaterEqual(stat.total_time, 10)
+        self.assertGreaterEqual(stat.latency_p95, 10)
+        self.assertEqual(self.dbsource.top_stat_ids[:1], stat)
+        self.assertGreaterEqual(self.dbsource.latency_p95, 10)
+        self.assertIn(
+            'SELECT pg_sleep(?)', self.dbsource.slow_query_ids.mapped('query'),
+        )
+        self.dbsource.execute('SELECT pg_sleep(0.01)')
+        self.dbsource._stats_store()
+        self.assertEqual(stat.calls, 2)
+
+    def test_stats_store_concurrent(self):
+        """ It should add to statistics flushed meanwhile by other workers """
+        self.dbsource.execute('SELECT 1')
+        self.dbsource._stats_store()
+        stat = self.dbsource.stat_ids.filtered(
+            lambda s: s.query == 'SELECT ?',
+        )
+        self.assertEqual(stat.calls, 1)
+        buckets = len(stat._get_histogram())
+        # Another worker flushes the same query after it was read
+        self.env.cr.execute(
+            "UPDATE base_external_dbsource_stat "
+            "SET calls = calls + 5, histogram = %s WHERE id = %s",
+            (','.join(['1'] * buckets), stat.id),
+        )
+        self.dbsource.execute('SELECT 1')
+        self.dbsource._stats_store()
+        self.assertEqual(stat.calls, 7)
+        self.assertEqual(sum(stat._get_histogram()), buckets + 1)
+
+    def test_action_stats_reset(self):
+        """ It should forget stored and collected statistics """
+        self.dbsource.execute('SELECT 1')
+        self.dbsource._stats_store()
+        self.dbsource.execute('SELECT 1')
+        self.dbsource.action_stats_reset()
+        self.assertFalse(self.dbsource.stat_ids)
+        self.assertEqual(self._drain_stats(), ({}, []))
+
+    def test_execute_spill(self):
+        """ It should spill the rows beyond the memory limit to disk """
+        rows = self.dbsource.execute(
+            'SELECT generate_series(1, 10)', max_memory_rows=4,
+        )
+        self.assertTrue(rows.spilled)
+        self.assertEqual([r[0] for r in rows], list(range(1, 11)))
+        self.assertEqual(rows[7], (8, ))
+        rows.close()
+
+    def test_execute_spill_records(self):
+        """ It should read spilled rows as records """
+        res = self.dbsource.execute(
+            'SELECT generate_series(1, 10) AS n', metadata=True,
+            max_memory_rows=4, result_format='records',
+        )
+        self.assertEqual(res['cols'], ['n'])
+        self.assertEqual(res['rows'][9].n, 10)
+
+    def test_execute_spill_columns(self):
+        """ It should not spill results returned by column """
+        with self.assertRaises(ValueError):
+            self.dbsource.execute(
+                'SELECT 1', max_memory_rows=4, result_format='columns',
+            )
+
+    def test_execute_single_flight(self):
+        """ It should share the result of the same query in flight """
+        rows = [(1, )]
+        with mock.patch.object(
+            SingleFlight, 'do', return_value=((rows, []), True),
+        ) as do, mock.patch.object(
+            type(self.dbsource), 'execute_postgresql', autospec=True,
+        ) as execute:
+            res = self.dbsource.execute(
+                'SELECT 1', {'a': 1}, single_flight=True,
+            )
+        execute.assert_not_called()
+        self.assertEqual(res, rows)
+        self.assertIsNot(res, rows)
+        self.assertEqual(do.call_args[0][0][:2], ('SELECT 1', (('a', 1), )))
+
+    def test_execute_single_flight_writes(self):
+        """ It should never share the result of writes """
+        with mock.patch.object(SingleFlight, 'do') as do, mock.patch.object(
+            type(self.dbsource), 'execute_postgresql', autospec=True,
+            return_value=([], []),
+        ):
+            self.dbsource.execute('DELETE FROM items', single_flight=True)
+        do.assert_not_called()
+
+    def _execute_partitioned(self, **kwargs):
+        with self.dbsource.execute_partitioned(
+            'pg_catalog.pg_type', 'oid', columns=['oid', 'typname'],
+            **kwargs
+        ) as rows:
+            return rows.cols, sorted(rows), rows.partitions
+
+    def test_execute_partitioned(self):
+        """ It should read every row once over concurrent partitions """
+        expect = sorted(self.dbsource.execute(
+            'SELECT oid, typname FROM pg_catalog.pg_type',
+        ))
+        cols, rows, partitions = self._execute_partitioned(partitions=3)
+        self.assertEqual(cols, ['oid', 'typname'])
+        self.assertEqual(rows, expect)
+        self.assertEqual(len(partitions), 3)
+        self.assertEqual(sum(p.rows for p in partitions), len(expect))
+
+    def test_execute_partitioned_quantiles(self):
+        """ It should split keys in ranges of about as many rows """
+        with self.dbsource.execute_partitioned(
+            'pg_catalog.pg_type', 'typname', columns=['typname'],
+            split='quantiles',
+        ) as rows:
+            names = sorted(row[0] for row in rows)
+            counts = [p.rows for p in rows.partitions]
+        self.assertEqual(names, sorted(row[0] for row in self.dbsource.execute(
+            'SELECT typname FROM pg_catalog.pg_type',
+        )))
+        self.assertLess(max(counts) - min(counts), len(names) / 4)
+
+    def test_execute_partitioned_where(self):
+        """ It should only read the rows matching the domain """
+        expect = sorted(self.dbsource.execute(
+            "SELECT oid, typname FROM pg_catalog.pg_type WHERE typtype = 'b'",
+        ))
+        _cols, rows, _partitions = self._execute_partitioned(
+            where=[('typtype', '=', 'b')],
+        )
+        self.assertEqual(rows, expect)
+
+    def test_execute_partitioned_empty(self):
+        """ It should read a single partition when no row matches """
+        cols, rows, partitions = self._execute_partitioned(
+            where=[('oid', '<', 0)],
+        )
+        self.assertEqual((cols, rows, len(partitions)), (
+            ['oid', 'typname'], [], 1,
+        ))
+
+    def test_execute_partitioned_null_keys(self):
+        """ It should not read the rows whose key is NULL """
+        with self.dbsource.execute_partitioned(
+            'pg_catalog.pg_type', 'typdefault', columns=['typname'],
+            where=[('typdefault', '=', None)],
+        ) as rows:
+            self.assertEqual(list(rows), [])
+            self.assertEqual(len(rows.partitions), 1)
+
+    def test_execute_partitioned_error(self):
+        """ It should raise the exception of a failing partition """
+        def worker(dbsource_id, query, params, batch_size, timeout):
+            yield ['oid']
+            raise psycopg2.OperationalError()
+        with mock.patch.object(
+            type(self.dbsource), '_execute_partition_worker',
+            side_effect=worker,
+        ), self.assertRaises(psycopg2.OperationalError):
+            self._execute_partitioned()
+
+    def test_execute_partitioned_invalid(self):
+        """ It should reject invalid partitionings """
+        with self.assertRaises(ValueError):
+            self.dbsource.execute_partitioned('t', 'id', partitions=0)
+        with self.assertRaises(ValueError):
+            self.dbsource.execute_partitioned('t', 'id', split='hash')
+
+    def _execute_join(self, left_count=5, key=('id', 'order_id'), **kwargs):
+        left = (
+            self.dbsource,
+            'SELECT n AS id, n * 2 AS double '
+            'FROM generate_series(1, %(count)s) n',
+            {'count': left_count},
+        )
+        right = (
+            self.dbsource,
+            "SELECT 'WH' || n AS ref, n / 2 AS order_id "
+            "FROM generate_series(1, 20) n",
+        )
+        with self.dbsource.execute_join(
+            left, right, key, batch_size=3, **kwargs
+        ) as rows:
+            return rows.cols, sorted(rows, key=repr)
+
+    def test_execute_join(self):
+        """ It should join the rows of two queries by key """
+        cols, rows = self._execute_join()
+        self.assertEqual(cols, ['id', 'double', 'ref', 'order_id'])
+        self.assertEqual(rows, sorted([
+            (n // 2, n // 2 * 2, 'WH%d' % n, n // 2) for n in range(2, 12)
+        ], key=repr))
+
+    def test_execute_join_outer(self):
+        """ It should keep the rows of the left query without match """
+        _cols, rows = self._execute_join(left_count=6, outer=True)
+        self.assertEqual(len(rows), 11)
+        self.assertIn((6, 12, None, None), rows)
+
+    def test_execute_join_spilled(self):
+        """ It should join sides spilled to disk """
+        for build in ('left', 'right'):
+            self.assertEqual(
+                self._execute_join(build=build, max_memory_bytes=1),
+                self._execute_join(),
+            )
+
+    def test_execute_join_build_smaller(self):
+        """ It should build the hash table from the smaller side """
+        sides = [
+            self.dbsource.execute_iter(
+                'SELECT generate_series(1, %s)' % count, batch_size=2,
+            )
+            for count in (20, 5)
+        ]
+        buffers = [SpilledRows(), SpilledRows()]
+        self.assertEqual(
+            self.dbsource._execute_join_build(sides, buffers, 'auto'), 1,
+        )
+        self.assertEqual(len(buffers[1]), 5)
+        for rows in sides:
+            rows.close()
+
+    def test_execute_join_invalid(self):
+        """ It should reject unknown build sides and keys """
+        with self.assertRaises(ValueError):
+            self.dbsource.execute_join(None, None, 'id', build='smaller')
+        with self.assertRaises(ValueError):
+            self._execute_join(key=('id', 'missing'))
+
+    def test_execute_prepared(self):
+        """ It should prepare a query once per connection """
+        self.dbsource.prepared_statements = True
+        query = 'SELECT typname FROM pg_catalog.pg_type WHERE oid = %(oid)s'
+        with self.dbsource.session() as session:
+            res = [
+                self.dbsource.execute(query, {'oid': oid})
+                for oid in (16, 16, 25)
+            ]
+            prepared = self.dbsource.execute(
+                'SELECT statement FROM pg_prepared_statements',
+            )
+            statements = self.dbsource._prepared_statements(
+                session.connection,
+            )
+        self.assertEqual(res, [[('bool', )], [('bool', )], [('text', )]])
+        self.assertEqual(len(prepared), 1)
+        self.assertIn('oid = $1', prepared[0][0])
+        self.assertEqual((statements.hits, statements.misses), (2, 1))
+
+    def test_execute_prepared_positional(self):
+        """ It should bind positional parameters in order """
+        self.dbsource.prepared_statements = True
+        self.assertEqual(
+            self.dbsource.execute('SELECT %s - %s', (5, 2)),
+            [(3, )],
+        )
+
+    def test_execute_prepared_types(self):
+        """ It should return the same values as plain queries """
+        query = 'SELECT %s, %s, %s, %s, %s, %s'
+        params = (1, 2 ** 40, 1.5, 'a', None, True)
+        plain = self.dbsource.execute(query, params)
+        self.dbsource.prepared_statements = True
+        with self.dbsource.session() as session:
+            prepared = self.dbsource.execute(query, params)
+            self.dbsource.execute(query, ('1', 2, 3, 4, 5, 6))
+            statements = self.dbsource._prepared_statements(
+                session.connection,
+            )
+        self.assertEqual(prepared, plain)
+        self.assertEqual(
+            [type(value) for value in prepared[0]],
+            [int, int, decimal.Decimal, str, type(None), bool],
+        )
+        # Other types of values get a statement of their own
+        self.assertEqual(len(statements), 2)
+
+    def test_execute_prepared_eviction(self):
+        """ It should release the least recently used statements """
+        self.dbsource.write({
+            'prepared_statements': True,
+            'prepared_statements_max': 1,
+        })
+        with self.dbsource.session():
+            self.dbsource.execute('SELECT %s', (1, ))
+            self.dbsource.execute('SELECT %s::text', ('a', ))
+            prepared = self.dbsource.execute(
+                'SELECT statement FROM pg_prepared_statements',
+            )
+        self.assertEqual(len(prepared), 1)
+        self.assertIn('$1::text', prepared[0][0])
+
+    def test_execute_prepared_unpooled(self):
+        """ It should not prepare statements on unpooled connections """
+        self.dbsource.write({
+            'prepared_statements': True,
+            'pool_size_max': 0,
+        })
+        with self.dbsource.connection_open() as connection:
+            self.assertIsNone(
+                self.dbsource._prepared_statements(connection),
+            )
+
+    def test_check_prepared_statements_max(self):
+        """ It should reject statement caches below one statement """
+        with self.assertRaises(ValidationError):
+            self.dbsource.prepared_statements_max = 0
+
+    @unittest.skipUnless(BENCHMARK, 'Set DBSOURCE_BENCHMARK to run it')
+    def test_benchmark_prepared(self):
+        """ It should run repeated lookups without planning them again """
+        query = (
+            'SELECT t.typname, n.nspname FROM pg_catalog.pg_type t '
+            'JOIN pg_catalog.pg_namespace n ON n.oid = t.typnamespace '
+            'WHERE t.oid = %(oid)s'
+        )
+        iterations = 10000
+        timings = {}
+        results = {}
+        for prepared in (False, True):
+            self.dbsource.prepared_statements = prepared
+            start = time.time()
+            with self.dbsource.session():
+                results[prepared] = [
+                    self.dbsource.execute(query, {'oid': 16 + i % 10})
+                    for i in range(iterations)
+                ]
+            timings[prepared] = time.time() - start
+        _logger.info(
+            'PostgreSQL %d lookups: %.2fs as plain queries, %.2fs as '
+            'prepared statements.', iterations, timings[False],
+            timings[True],
+        )
+        self.assertEqual(results[True], results[False])
+
+    def test_remote_chunk_size(self):
+        """ It should default to the configured chunk size """
+        self.dbsource.remote_chunk_size = 42
+        self.assertEqual(self.dbsource._remote_chunk_size(), 42)
+        self.assertEqual(self.dbsource._remote_chunk_size(7), 7)
+
+    def test_check_remote_chunk_size(self):
+        """ It should reject chunk sizes below one """
+        with self.assertRaises(ValidationError):
+            self.dbsource.remote_chunk_size = 0
+
+    def test_copy_format(self):
+        """ It should reject unknown formats """
+        with self.assertRaises(ValueError):
+            self.dbsource.copy_to('SELECT 1', io.StringIO(), format='xml')
+
+    def test_quote_identifier(self):
+        """ It should quote each part of identifiers """
+        self.assertEqual(
+            self.dbsource._quote_identifier('public.we"ird'),
+            '"public"."we""ird"',
+        )
+
     # Old API Compat
 
     def test_execute_calls_adapter_old_api(self):
@@ -0,0 +1,142 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import mock
+
+from odoo import fields, models
+from odoo.exceptions import MissingError, UserError
+from odoo.tests import common
+
+
+class ExternalType(models.Model):
+    _name = 'base.external.dbsource.model.test'
+    _inherit = 'base.external.dbsource.model'
+    _description = 'External Types'
+    # Only registered by the tests
+    _register = False
+    _module = 'base_external_dbsource'
+    _auto = False
+    _order = 'typname'
+    _dbsource = 'base_external_dbsource.demo_postgre'
+    _remote_table = 'pg_catalog.pg_type'
+    _remote_key = 'oid'
+
+    typname = fields.Char()
+    typlen = fields.Integer()
+    typtype = fields.Char()
+
+
+class TestBaseExternalDbsourceModel(common.TransactionCase):
+
+    def setUp(self):
+        super(TestBaseExternalDbsourceModel, self).setUp()
+        ExternalType._build_model(self.registry, self.cr)
+        self.registry.setup_models(self.cr)
+        self.registry.init_models(
+            self.cr, [ExternalType._name],
+            dict(self.env.context, update_custom_fields=True),
+        )
+        self.addCleanup(self._remove_model)
+        self.model = self.env[ExternalType._name]
+        self.model.remote_cache_clear()
+        self.dbsource = self.env.ref('base_external_dbsource.demo_postgre')
+
+    def _remove_model(self):
+        self.model.remote_cache_clear()
+        del self.registry.models[ExternalType._name]
+        self.registry.setup_models(self.cr)
+
+    def _patch_remote_browse(self):
+        return mock.patch.object(
+            type(self.dbsource), 'remote_browse', autospec=True,
+            side_effect=type(self.dbsource).remote_browse,
+        )
+
+    def test_search(self):
+        """ It should search and order the rows on the remote """
+        records = self.model.search(
+            [('typtype', '=', 'b'), ('typname', 'like', 'int')], limit=3,
+        )
+        self.assertEqual(
+            [(r.id, r.typname) for r in records],
+            self.dbsource.execute(
+                "SELECT oid, typname FROM pg_catalog.pg_type "
+                "WHERE typtype = 'b' AND typname LIKE %(like)s "
+                "ORDER BY typname LIMIT 3", {'like': '%int%'},
+            ),
+        )
+
+    def test_search_false(self):
+        """ It should search unset fields as NULL columns """
+        self.assertEqual(
+            self.model.search_count([('typname', '!=', False)]),
+            self.model.search_count([]),
+        )
+        self.assertFalse(self.model.search([('typname', '=', False)]))
+        self.assertEqual(
+            self.model._remote_domain([('typlen', '=', False)]),
+            [('typlen', '=', None)],
+        )
+
+    def test_search_count(self):
+        """ It should count the rows on the remote """
+        self.assertEqual(
+            self.model.search_count([('typtype', '=', 'c')]),
+            self.dbsource.execute(
+                "SELECT COUNT(*) FROM pg_catalog.pg_type WHERE typtype = 'c'"
+            )[0][0],
+        )
+
+    def test_search_read_cached(self):
+        """ It should read the page of a search without querying again """
+        with self._patch_remote_browse() as remote_browse:
+            rows = self.model.search_read(
+                [('typtype', '=', 'b')], ['typname', 'typlen'], limit=80,
+            )
+        self.assertEqual(len(rows), 80)
+        self.assertTrue(all(r['typname'] for r in rows))
+        remote_browse.assert_not_called()
+
+    def test_read_prefetch(self):
+        """ It should read prefetched records in a single query """
+        with mock.patch.object(type(self.model), '_remote_cache_ttl', 0):
+            records = self.model.search([('typtype', '=', 'b')], limit=80)
+            with self._patch_remote_browse() as remote_browse:
+                names = [record.typname for record in records]
+        self.assertEqual(names, sorted(names))
+        remote_browse.assert_called_once()
+        self.assertEqual(len(remote_browse.call_args[0][1]), 80)
+
+    def test_read_cache_ttl(self):
+        """ It should keep the rows read in the cache until cleared """
+        oid = self.dbsource.execute(
+            "SELECT oid FROM pg_catalog.pg_type WHERE typname = 'int4'"
+        )[0][0]
+        with self._patch_remote_browse() as remote_browse:
+            self.assertEqual(self.model.browse(oid).typlen, 4)
+            self.model.invalidate_cache()
+            self.assertEqual(self.model.browse(oid).typname, 'int4')
+            self.assertEqual(remote_browse.call_count, 1)
+            self.model.invalidate_cache()
+            self.model.remote_cache_clear([oid])
+            self.assertEqual(self.model.browse(oid).typname, 'int4')
+            self.assertEqual(remote_browse.call_count, 2)
+
+    def test_missing(self):
+        """ It should tell missing records apart """
+        record = self.model.browse(0)
+        self.assertFalse(record.exists())
+        with self.assertRaises(MissingError):
+            record.typname
+
+    def test_read_only(self):
+        """ It should refuse to write the remote rows """
+        record = self.model.search([], limit=1)
+        with self.assertRaises(UserError):
+            record.write({'typname': 'test'})
+        with self.assertRaises(UserError):
+            record.unlink()
+
+    def test_invalid_field(self):
+        """ It should refuse domains on unknown fields """
+        with self.assertRaises(ValueError):
+            self.model.search([('typcategory', '=', 'N')])
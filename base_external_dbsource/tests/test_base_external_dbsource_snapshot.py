@@ -0,0 +1,144 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import decimal
+
+import mock
+
+from odoo.exceptions import ValidationError
+from odoo.tests import common
+
+QUERY = (
+    "SELECT * FROM (VALUES (1, 'A', 1.5), (2, 'B', NULL)) "
+    "AS t (id, code, amount)"
+)
+
+
+class TestBaseExternalDbsourceSnapshot(common.TransactionCase):
+
+    def setUp(self):
+        super(TestBaseExternalDbsourceSnapshot, self).setUp()
+        self.dbsource = self.env.ref('base_external_dbsource.demo_postgre')
+        self.snapshot = self.env['base.external.dbsource.snapshot'].create({
+            'name': 'Codes',
+            'dbsource_id': self.dbsource.id,
+            'query': QUERY,
+            'table_name': 'dbsource_snapshot_test',
+            'index_columns': 'code, id+amount',
+        })
+
+    def _local_rows(self):
+        self.env.cr.execute(
+            'SELECT id, code, amount FROM dbsource_snapshot_test ORDER BY id'
+        )
+        return self.env.cr.fetchall()
+
+    def test_refresh(self):
+        """ It should load the rows of the query into the local table """
+        self.snapshot.action_refresh()
+        self.assertEqual(self._local_rows(), [(1, 'A', 1.5), (2, 'B', None)])
+        self.assertEqual(self.snapshot.row_count, 2)
+        self.assertTrue(self.snapshot.last_refresh)
+
+    def test_refresh_indexes(self):
+        """ It should index the configured columns """
+        self.snapshot.action_refresh()
+        self.env.cr.execute(
+            "SELECT COUNT(*) FROM pg_indexes "
+            "WHERE tablename = 'dbsource_snapshot_test'"
+        )
+        self.assertEqual(self.env.cr.fetchone()[0], 2)
+
+    def test_refresh_swap(self):
+        """ It should replace the previous rows at once """
+        self.snapshot.action_refresh()
+        self.snapshot.query = "SELECT 3 AS id, 'C' AS code, 2.5 AS amount"
+        self.snapshot.action_refresh()
+        self.assertEqual(
+            self._local_rows(), [(3, 'C', decimal.Decimal('2.5'))],
+        )
+        self.env.cr.execute(
+            "SELECT to_regclass('dbsource_snapshot_test__new')"
+        )
+        self.assertIsNone(self.env.cr.fetchone()[0])
+
+    def test_execute_use_snapshot(self):
+        """ It should read the rows of a matching query locally """
+        self.snapshot.action_refresh()
+        self.env.cr.execute(
+            "UPDATE dbsource_snapshot_test SET code = 'local' WHERE id = 1"
+        )
+        with mock.patch.object(
+            type(self.dbsource), 'execute_postgresql', autospec=True,
+        ) as execute:
+            res = self.dbsource.execute(
+                QUERY + ';', use_snapshot=True, metadata=True,
+            )
+        execute.assert_not_called()
+        self.assertEqual(res['cols'], ['id', 'code', 'amount'])
+        self.assertEqual(res['rows'][0], (1, 'local', 1.5))
+
+    def test_execute_use_snapshot_missing(self):
+        """ It should query the remote without a refreshed snapshot """
+        self.assertEqual(
+            len(self.dbsource.execute(QUERY, use_snapshot=True)), 2,
+        )
+        self.assertEqual(
+            self.dbsource.execute('SELECT 1', use_snapshot=True), [(1, )],
+        )
+
+    def test_cron_refresh(self):
+        """ It should only refresh the snapshots that are due """
+        self.snapshot.action_refresh()
+        with mock.patch.object(
+            type(self.snapshot), 'action_refresh', autospec=True,
+        ) as refresh:
+            self.snapshot._cron_refresh()
+            refresh.assert_not_called()
+            self.snapshot.last_refresh = datetime.datetime.utcnow() - \
+                datetime.timedelta(minutes=61)
+            self.snapshot._cron_refresh()
+            refresh.assert_called_once_with(self.snapshot)
+
+    def test_unlink(self):
+        """ It should drop the local table """
+        self.snapshot.action_refresh()
+        self.snapshot.unlink()
+        self.env.cr.execute("SELECT to_regclass('dbsource_snapshot_test')")
+        self.assertIsNone(self.env.cr.fetchone()[0])
+
+    def test_column_types_all_rows(self):
+        """ It should type columns from the values of every batch """
+        self.snapshot.write({
+            'query': "SELECT * FROM (VALUES (1, NULL, 2), (2, 1.5, NULL)) "
+                     "AS t (id, amount, qty)",
+            'batch_size': 1,
+            'index_columns': False,
+        })
+        self.snapshot.action_refresh()
+        self.env.cr.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_name = 'dbsource_snapshot_test' "
+            "ORDER BY ordinal_position"
+        )
+        self.assertEqual(self.env.cr.fetchall(), [
+            ('id', 'bigint'), ('amount', 'numeric'), ('qty', 'bigint'),
+        ])
+        self.env.cr.execute(
+            'SELECT id, amount, qty FROM dbsource_snapshot_test ORDER BY id'
+        )
+        self.assertEqual(self.env.cr.fetchall(), [
+            (1, None, 2), (2, decimal.Decimal('1.5'), None),
+        ])
+
+    def test_check_table_name(self):
+        """ It should only accept prefixed lowercase table names """
+        names = 'res_partner', 'dbsource_snapshot_X', 'dbsource_snapshot_'
+        for name in names:
+            with self.assertRaises(ValidationError):
+                self.snapshot.table_name = name
+
+    def test_check_query(self):
+        """ It should reject queries that write """
+        with self.assertRaises(ValidationError):
+            self.snapshot.query = 'DELETE FROM items'
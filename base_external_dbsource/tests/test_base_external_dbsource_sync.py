@@ -0,0 +1,212 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import decimal
+
+import mock
+
+from odoo.exceptions import UserError, ValidationError
+from odoo.tests import common
+
+
+class TestBaseExternalDbsourceSync(common.TransactionCase):
+
+    def setUp(self):
+        super(TestBaseExternalDbsourceSync, self).setUp()
+        self.Partner = self.env['res.partner']
+        partner_fields = self.env['ir.model.fields'].search([
+            ('model', '=', 'res.partner'), ('name', 'in', ['ref', 'name']),
+        ])
+        field = {f.name: f for f in partner_fields}
+        self.sync = self.env['base.external.dbsource.sync'].create({
+            'name': 'Partners',
+            'dbsource_id': self.env.ref(
+                'base_external_dbsource.demo_postgre',
+            ).id,
+            'query': self._query(
+                (1, 'Sync A', 10), (2, 'Sync B', 20), (3, 'Sync C', 20),
+            ),
+            'model_id': self.env.ref('base.model_res_partner').id,
+            'key_column': 'code',
+            'key_field_id': field['ref'].id,
+            'watermark_column': 'seq',
+            'batch_size': 2,
+            'line_ids': [(0, 0, {
+                'column': 'label',
+                'field_id': field['name'].id,
+            })],
+        })
+
+    def _query(self, *rows):
+        return 'SELECT * FROM (VALUES %s) AS t (code, label, seq)' % ', '.join(
+            "('SYNC%d', '%s', %d)" % row for row in rows
+        )
+
+    def _partners(self):
+        return self.Partner.search(
+            [('ref', '=like', 'SYNC%')], order='ref',
+        ).mapped(lambda p: (p.ref, p.name))
+
+    def test_run(self):
+        """ It should create the records and store the last watermark """
+        self.sync.action_run()
+        self.assertEqual(self._partners(), [
+            ('SYNC1', 'Sync A'), ('SYNC2', 'Sync B'), ('SYNC3', 'Sync C'),
+        ])
+        self.assertEqual(self.sync.watermark, '20')
+        self.assertEqual(self.sync.watermark_type, 'integer')
+        self.assertEqual(self.sync.last_count, 3)
+
+    def test_run_incremental(self):
+        """ It should only read rows from the watermark and update them """
+        self.sync.action_run()
+        self.sync.query = self._query(
+            (1, 'Old A', 10), (3, 'New C', 20), (4, 'Sync D', 30),
+        )
+        self.sync.action_run()
+        self.assertEqual(self._partners(), [
+            ('SYNC1', 'Sync A'), ('SYNC2', 'Sync B'), ('SYNC3', 'New C'),
+            ('SYNC4', 'Sync D'),
+        ])
+        self.assertEqual(self.sync.watermark, '30')
+        self.assertEqual(self.sync.last_count, 2)
+
+    def test_run_resume(self):
+        """ It should resume an interrupted run without duplicates """
+        original = type(self.sync)._sync_batch
+        calls = []
+
+        def sync_batch(record, cols, rows):
+            calls.append(rows)
+            if len(calls) > 1:
+                raise RuntimeError('Connection lost')
+            return original(record, cols, rows)
+
+        with mock.patch.object(type(self.sync), '_sync_batch', sync_batch):
+            with self.assertRaises(RuntimeError):
+                self.sync.action_run()
+        self.assertEqual(self.sync.watermark, '20')
+        self.sync.action_run()
+        self.assertEqual(len(self._partners()), 3)
+
+    def test_run_skip_unchanged(self):
+        """ It should only write the rows that changed """
+        self.sync.action_run()
+        self.sync.query = self._query(
+            (1, 'Sync A', 10), (2, 'Sync B', 20), (3, 'New C', 20),
+        )
+        with mock.patch.object(
+            type(self.Partner), 'write', autospec=True,
+            side_effect=type(self.Partner).write,
+        ) as write:
+            self.sync.action_run()
+        self.assertEqual(write.call_count, 1)
+        run = self.sync.run_ids[0]
+        self.assertEqual(
+            (run.created, run.updated, run.skipped), (0, 1, 1),
+        )
+        self.assertEqual(self._partners()[-1], ('SYNC3', 'New C'))
+
+    def test_run_report(self):
+        """ It should report the counts and duration of every run """
+        self.sync.action_run()
+        run = self.sync.run_ids
+        self.assertEqual(len(run), 1)
+        self.assertEqual(
+            (run.created, run.updated, run.skipped), (3, 0, 0),
+        )
+        self.assertGreaterEqual(run.duration, 0)
+
+    def test_run_deactivate_missing(self):
+        """ It should archive vanished records and restore them """
+        self.sync.deactivate_missing = True
+        self.sync.action_run()
+        self.sync.query = self._query((2, 'Sync B', 20), (3, 'Sync C', 20))
+        self.sync.action_run()
+        self.assertEqual(self.sync.run_ids[0].deactivated, 1)
+        self.assertEqual(
+            self._partners(), [('SYNC2', 'Sync B'), ('SYNC3', 'Sync C')],
+        )
+        self.sync.watermark = False
+        self.sync.query = self._query((1, 'Sync A', 10))
+        self.sync.action_run()
+        self.assertEqual(self._partners(), [('SYNC1', 'Sync A')])
+
+    def test_run_restore_below_watermark(self):
+        """ It should restore archived records whose rows come back """
+        self.sync.deactivate_missing = True
+        self.sync.action_run()
+        self.sync.query = self._query((2, 'Sync B', 20), (3, 'Sync C', 20))
+        self.sync.action_run()
+        self.assertEqual(self.sync.run_ids[0].deactivated, 1)
+        self.sync.action_run()
+        self.assertEqual(self.sync.run_ids[0].deactivated, 0)
+        # Its watermark is below the stored one
+        self.sync.query = self._query(
+            (1, 'Sync A', 10), (2, 'Sync B', 20), (3, 'Sync C', 20),
+        )
+        self.sync.action_run()
+        self.assertEqual(self.sync.watermark, '20')
+        self.assertEqual(self._partners(), [
+            ('SYNC1', 'Sync A'), ('SYNC2', 'Sync B'), ('SYNC3', 'Sync C'),
+        ])
+
+    def test_get_query_typed_watermark(self):
+        """ It should bind the watermark with the type of its column """
+        self.sync.write({'watermark': '9', 'watermark_type': 'integer'})
+        _query, params = self.sync._get_query()
+        self.assertIn(9, params.values())
+        self.sync.watermark_type = 'char'
+        _query, params = self.sync._get_query()
+        self.assertIn('9', params.values())
+
+    def test_watermark_types(self):
+        """ It should store watermarks with their type and read them back """
+        values = [
+            9, 1.5, decimal.Decimal('2.50'), 'b',
+            datetime.date(2018, 1, 2),
+            datetime.datetime(2018, 1, 2, 3, 4, 5, 6),
+            datetime.datetime(
+                2018, 1, 2, 3, 4, tzinfo=datetime.timezone.utc,
+            ),
+        ]
+        for value in values:
+            self.sync.write(self.sync._watermark_dump(value))
+            loaded = self.sync._watermark_load()
+            self.assertEqual((loaded, type(loaded)), (value, type(value)))
+
+    def test_watermark_invalid(self):
+        """ It should reject watermarks that do not match their type """
+        self.sync.write({'watermark': 'abc', 'watermark_type': 'integer'})
+        with self.assertRaises(UserError):
+            self.sync._get_query()
+
+    def test_check_deactivate_missing(self):
+        """ It should only archive records of models with an active field """
+        with self.assertRaises(ValidationError):
+            self.sync.copy({
+                'model_id': self.env.ref('base.model_res_country').id,
+                'key_field_id': self.env['ir.model.fields'].search([
+                    ('model', '=', 'res.country'), ('name', '=', 'code'),
+                ]).id,
+                'line_ids': [],
+                'deactivate_missing': True,
+            })
+
+    def test_run_missing_column(self):
+        """ It should reject queries missing mapped columns """
+        self.sync.line_ids.column = 'missing'
+        with self.assertRaises(UserError):
+            self.sync.action_run()
+
+    def test_check_query(self):
+        """ It should reject queries that could write """
+        with self.assertRaises(ValidationError):
+            self.sync.query = 'DELETE FROM res_partner'
+
+    def test_check_fields(self):
+        """ It should reject fields of another model """
+        with self.assertRaises(ValidationError):
+            self.sync.key_field_id = self.env['ir.model.fields'].search([
+                ('model', '=', 'res.users'), ('name', '=', 'login'),
+            ])
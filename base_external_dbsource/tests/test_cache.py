@@ -0,0 +1,64 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import mock
+
+from odoo.tests import common
+
+from ..cache import MISSING, ResultCache, freeze
+
+
+class TestResultCache(common.TransactionCase):
+
+    def setUp(self):
+        super(TestResultCache, self).setUp()
+        self.cache = ResultCache()
+
+    def test_get_set(self):
+        """ It should return cached values and count hits and misses """
+        self.assertIs(self.cache.get('key'), MISSING)
+        self.cache.set('key', [(1, )])
+        self.assertEqual(self.cache.get('key'), [(1, )])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_ttl(self):
+        """ It should expire values after their time to live """
+        with mock.patch('time.time') as time:
+            time.return_value = 100
+            self.cache.set('key', [(1, )], ttl=10)
+            time.return_value = 111
+            self.assertIs(self.cache.get('key'), MISSING)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_max_entries(self):
+        """ It should evict the least recently used entries """
+        self.cache.set('a', [], max_entries=2)
+        self.cache.set('b', [], max_entries=2)
+        self.cache.get('a')
+        self.cache.set('c', [], max_entries=2)
+        self.assertIs(self.cache.get('b'), MISSING)
+        self.assertEqual(self.cache.get('a'), [])
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_max_bytes(self):
+        """ It should evict entries beyond the size limit """
+        self.cache.set('a', [], size=6, max_bytes=10)
+        self.cache.set('b', [], size=6, max_bytes=10)
+        self.assertIs(self.cache.get('a'), MISSING)
+        self.assertEqual(self.cache.size, 6)
+        self.assertFalse(self.cache.set('c', [], size=11, max_bytes=10))
+
+    def test_invalidate(self):
+        """ It should drop the entries matching the predicate """
+        self.cache.set('a', [])
+        self.cache.set('b', [])
+        self.cache.invalidate(lambda key: key == 'a')
+        self.assertIs(self.cache.get('a'), MISSING)
+        self.assertEqual(self.cache.get('b'), [])
+
+    def test_freeze(self):
+        """ It should turn parameters into equivalent hashable keys """
+        self.assertEqual(
+            freeze({'b': [1], 'a': 2}), freeze({'a': 2, 'b': [1]}),
+        )
+        self.assertNotEqual(freeze([1]), freeze((1, )))
+        hash(freeze({'a': {'b': [1, {2}]}}))
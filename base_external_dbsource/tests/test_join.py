@@ -0,0 +1,68 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+from odoo.tests import common
+
+from ..join import hash_join
+from ..spill import SpilledRows
+
+
+class TestHashJoin(common.TransactionCase):
+
+    def setUp(self):
+        super(TestHashJoin, self).setUp()
+        self.orders = [(1, 'SO1'), (2, 'SO2'), (3, 'SO3'), (None, 'SO4')]
+        self.shipments = [
+            ('WH1', 1), ('WH2', 3), ('WH3', 3), ('WH4', 5), ('WH5', None),
+        ]
+
+    def _join(self, build_left=True, outer=False, max_bytes=0):
+        build, probe = self.orders, self.shipments
+        indexes, widths = (0, 1), (2, 2)
+        if not build_left:
+            build, probe = probe, build
+            indexes, widths = indexes[::-1], widths[::-1]
+        rows = SpilledRows(max_bytes=max_bytes)
+        rows.extend(build)
+        return sorted(hash_join(
+            rows, iter(probe), indexes[0], indexes[1], widths[0], widths[1],
+            build_left=build_left, outer=outer, max_bytes=max_bytes,
+        ), key=repr)
+
+    def test_hash_join(self):
+        """ It should return the matching rows, left columns first """
+        expect = [
+            (1, 'SO1', 'WH1', 1), (3, 'SO3', 'WH2', 3), (3, 'SO3', 'WH3', 3),
+        ]
+        self.assertEqual(self._join(), expect)
+        self.assertEqual(self._join(build_left=False), expect)
+
+    def test_hash_join_outer(self):
+        """ It should keep the rows of the left side without match """
+        expect = [
+            (1, 'SO1', 'WH1', 1), (2, 'SO2', None, None),
+            (3, 'SO3', 'WH2', 3), (3, 'SO3', 'WH3', 3),
+            (None, 'SO4', None, None),
+        ]
+        self.assertEqual(self._join(outer=True), expect)
+        self.assertEqual(self._join(build_left=False, outer=True), expect)
+
+    def test_hash_join_spilled(self):
+        """ It should join by partitions when the build side spilled """
+        for build_left in (True, False):
+            for outer in (True, False):
+                self.assertEqual(
+                    self._join(build_left, outer, max_bytes=1),
+                    self._join(build_left, outer),
+                )
+
+    def test_hash_join_spilled_many(self):
+        """ It should join large sides spilled to disk """
+        build = SpilledRows(max_bytes=10000)
+        build.extend((i, i * 2) for i in range(5000))
+        rows = list(hash_join(
+            build, ((i, ) for i in range(0, 10000, 2)), 0, 0, 2, 1,
+            max_bytes=10000,
+        ))
+        self.assertEqual(sorted(rows), [
+            (i, i * 2, i) for i in range(0, 5000, 2)
+        ])
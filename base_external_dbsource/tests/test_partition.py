@@ -0,0 +1,107 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import threading
+
+from odoo.tests import common
+
+from ..partition import (
+    Partition, is_interpolable, merge_batches, split_range,
+)
+
+
+class TestPartition(common.TransactionCase):
+
+    def _source(self, index, count, produced=None, error=None):
+        yield ['n']
+        for batch in range(count):
+            if produced is not None:
+                produced.append(index)
+            yield [(index, batch)]
+        if error is not None:
+            raise error
+
+    def test_is_interpolable(self):
+        """ It should only interpolate numbers and dates """
+        self.assertTrue(is_interpolable(1))
+        self.assertTrue(is_interpolable(datetime.date(2018, 1, 1)))
+        self.assertFalse(is_interpolable('a'))
+        self.assertFalse(is_interpolable(True))
+
+    def test_split_range_int(self):
+        """ It should split integer ranges in equal ranges """
+        self.assertEqual(split_range(0, 100, 4), [0, 25, 50, 75, 100])
+
+    def test_split_range_narrow(self):
+        """ It should return fewer ranges than keys """
+        self.assertEqual(split_range(1, 3, 8), [1, 2, 3])
+        self.assertEqual(split_range(5, 5, 4), [5, 5])
+
+    def test_split_range_date(self):
+        """ It should split date ranges """
+        day = datetime.date(2018, 1, 1)
+        self.assertEqual(
+            split_range(day, day + datetime.timedelta(days=10), 2),
+            [day, day + datetime.timedelta(days=5),
+             day + datetime.timedelta(days=10)],
+        )
+
+    def test_partition_domain(self):
+        """ It should include the upper bound of the last partition only """
+        self.assertEqual(
+            Partition(0, 1, 5, last=False).domain('id'),
+            [('id', '>=', 1), ('id', '<', 5)],
+        )
+        self.assertEqual(
+            Partition(1, 5, 9).domain('id'),
+            [('id', '>=', 5), ('id', '<=', 9)],
+        )
+        self.assertEqual(
+            Partition(0, None, None).domain('id'), [('id', '!=', None)],
+        )
+
+    def test_merge_batches(self):
+        """ It should yield the columns once, then every batch """
+        partitions = [Partition(0, 0, 1), Partition(1, 1, 2)]
+        batches = list(merge_batches(
+            [self._source(0, 3), self._source(1, 2)], partitions, 2,
+        ))
+        self.assertEqual(batches[0], ['n'])
+        self.assertEqual(sorted(row for b in batches[1:] for row in b), [
+            (0, 0), (0, 1), (0, 2), (1, 0), (1, 1),
+        ])
+        self.assertEqual([p.rows for p in partitions], [3, 2])
+        self.assertTrue(all(p.finished for p in partitions))
+
+    def test_merge_batches_back_pressure(self):
+        """ It should stop reading sources while batches are pending """
+        produced = []
+        partitions = [Partition(0, 0, 1), Partition(1, 1, 2)]
+        batches = merge_batches([
+            self._source(0, 100, produced), self._source(1, 100, produced),
+        ], partitions, 3)
+        next(batches)
+        next(batches)
+        threading.Event().wait(0.3)
+        # Pending batches, plus the one waiting in each thread
+        self.assertLessEqual(len(produced), 1 + 3 + 2)
+        batches.close()
+
+    def test_merge_batches_close(self):
+        """ It should stop the threads when closed """
+        batches = merge_batches(
+            [self._source(0, 100)], [Partition(0, 0, 1)], 1,
+        )
+        next(batches)
+        before = threading.active_count()
+        batches.close()
+        self.assertEqual(threading.active_count(), before - 1)
+
+    def test_merge_batches_error(self):
+        """ It should raise the exception of a failing source """
+        partitions = [Partition(0, 0, 1), Partition(1, 1, 2)]
+        with self.assertRaises(ValueError):
+            list(merge_batches([
+                self._source(0, 1, error=ValueError()), self._source(1, 5),
+            ], partitions, 2))
+        self.assertIsInstance(partitions[0].error, ValueError)
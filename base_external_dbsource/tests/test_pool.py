@@ -0,0 +1,121 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import mock
+
+from odoo.tests import common
+
+from ..pool import ConnectionPool, dispose_pools, find_pool, get_pool
+
+
+class TestConnectionPool(common.TransactionCase):
+
+    def setUp(self):
+        super(TestConnectionPool, self).setUp()
+        self.opener = mock.MagicMock(
+            side_effect=lambda: mock.MagicMock(closed=False),
+        )
+        self.closer = mock.MagicMock()
+
+    def _pool(self, **kwargs):
+        options = {'size_min': 0, 'size_max': 2}
+        options.update(kwargs)
+        return ConnectionPool(**options)
+
+    def test_checkout_reuses_idle_connection(self):
+        """ It should hand out a released connection again """
+        pool = self._pool()
+        connection = pool.checkout(self.opener, self.closer)
+        self.assertTrue(pool.checkin(connection, self.closer))
+        self.assertIs(pool.checkout(self.opener, self.closer), connection)
+        self.opener.assert_called_once_with()
+
+    def test_checkout_overflow(self):
+        """ It should not manage connections beyond the maximum size """
+        pool = self._pool(size_max=1)
+        pool.checkout(self.opener, self.closer)
+        overflow = pool.checkout(self.opener, self.closer)
+        self.assertFalse(pool.checkin(overflow, self.closer))
+
+    def test_checkin_reset(self):
+        """ It should reset connections before pooling them """
+        pool = self._pool()
+        reset = mock.MagicMock()
+        connection = pool.checkout(self.opener, self.closer)
+        pool.checkin(connection, self.closer, reset)
+        reset.assert_called_once_with(connection)
+        self.closer.assert_not_called()
+
+    def test_checkin_reset_failure(self):
+        """ It should close connections that cannot be reset """
+        pool = self._pool()
+        reset = mock.MagicMock(side_effect=Exception)
+        connection = pool.checkout(self.opener, self.closer)
+        pool.checkin(connection, self.closer, reset)
+        self.closer.assert_called_once_with(connection)
+
+    def test_checkin_closed(self):
+        """ It should not pool connections that were closed """
+        pool = self._pool()
+        connection = pool.checkout(self.opener, self.closer)
+        connection.closed = True
+        pool.checkin(connection, self.closer)
+        self.assertIsNot(pool.checkout(self.opener, self.closer), connection)
+
+    def test_max_lifetime(self):
+        """ It should close connections older than their lifetime """
+        pool = self._pool(max_lifetime=10)
+        with mock.patch('time.time') as time:
+            time.return_value = 100
+            connection = pool.checkout(self.opener, self.closer)
+            pool.checkin(connection, self.closer)
+            time.return_value = 111
+            self.assertIsNot(
+                pool.checkout(self.opener, self.closer), connection,
+            )
+        self.closer.assert_called_once_with(connection)
+
+    def test_idle_timeout(self):
+        """ It should close connections idle for too long above minimum """
+        pool = self._pool(size_min=1, idle_timeout=10)
+        with mock.patch('time.time') as time:
+            time.return_value = 100
+            first = pool.checkout(self.opener, self.closer)
+            second = pool.checkout(self.opener, self.closer)
+            pool.checkin(first, self.closer)
+            pool.checkin(second, self.closer)
+            time.return_value = 111
+            self.assertIs(pool.checkout(self.opener, self.closer), second)
+        self.closer.assert_called_once_with(first)
+
+    def test_dispose(self):
+        """ It should close idle and released connections once disposed """
+        pool = self._pool()
+        idle = pool.checkout(self.opener, self.closer)
+        used = pool.checkout(self.opener, self.closer)
+        pool.checkin(idle, self.closer)
+        pool.dispose(self.closer)
+        self.closer.assert_called_once_with(idle)
+        pool.checkin(used, self.closer)
+        self.closer.assert_called_with(used)
+
+    def test_get_pool_options(self):
+        """ It should only replace the pool when its options change """
+        old = get_pool(('db', 1), self.closer, size_max=5, idle_timeout=0)
+        self.assertIs(get_pool(('db', 1), self.closer), old)
+        new = get_pool(('db', 1), self.closer, size_max=2)
+        self.assertIsNot(new, old)
+        self.assertTrue(old.disposed)
+        self.assertIs(find_pool(('db', 1)), new)
+        dispose_pools('db', 1, self.closer)
+
+    def test_get_pool_supersedes(self):
+        """ It should dispose of pools of a former configuration """
+        old = get_pool(('db', 1, 'old'), self.closer, size_max=1)
+        self.assertIs(get_pool(('db', 1, 'old'), self.closer, size_max=1),
+                      old)
+        self.assertFalse(old.disposed)
+        new = get_pool(('db', 1, 'new'), self.closer, size_max=1)
+        self.assertTrue(old.disposed)
+        self.assertIsNone(find_pool(('db', 1, 'old')))
+        dispose_pools('db', 1, self.closer)
+        self.assertTrue(new.disposed)
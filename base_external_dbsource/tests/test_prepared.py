@@ -0,0 +1,95 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import datetime
+import decimal
+
+from odoo.tests import common
+
+from ..prepared import (
+    StatementCache, convert_placeholders, is_preparable, param_type,
+    params_signature,
+)
+
+
+class TestPrepared(common.TransactionCase):
+
+    def test_convert_placeholders_named(self):
+        """ It should number named parameters once each """
+        self.assertEqual(
+            convert_placeholders(
+                "SELECT %(a)s, %(b)s FROM t WHERE x = %(a)s AND y LIKE 'a%%'",
+            ),
+            ("SELECT $1, $2 FROM t WHERE x = $1 AND y LIKE 'a%'",
+             ['a', 'b']),
+        )
+
+    def test_convert_placeholders_positional(self):
+        """ It should number positional parameters in order """
+        self.assertEqual(
+            convert_placeholders('UPDATE t SET a = %s WHERE id = %s'),
+            ('UPDATE t SET a = $1 WHERE id = $2', [0, 1]),
+        )
+
+    def test_is_preparable(self):
+        """ It should only prepare single parameterized statements """
+        self.assertTrue(is_preparable('SELECT %s', (1, )))
+        self.assertTrue(is_preparable(' with a AS (SELECT 1) SELECT %s;',
+                                      [1]))
+        self.assertFalse(is_preparable('SELECT 1', None))
+        self.assertFalse(is_preparable('SET a = %s', (1, )))
+        self.assertFalse(is_preparable('SELECT %s; SELECT 1', (1, )))
+        self.assertFalse(is_preparable('SELECT $$a$$ || %s', (1, )))
+
+    def test_is_preparable_tuple(self):
+        """ It should not prepare queries given tuples of values """
+        self.assertFalse(
+            is_preparable('SELECT 1 WHERE a IN %(a)s', {'a': (1, 2)}),
+        )
+
+    def test_is_preparable_untyped(self):
+        """ It should not prepare queries given values of unknown types """
+        self.assertFalse(is_preparable('SELECT %s', [[1, 2]]))
+        self.assertFalse(is_preparable('SELECT %s', [object()]))
+
+    def test_param_type(self):
+        """ It should declare the types of the literals of psycopg2 """
+        self.assertEqual(
+            [param_type(v) for v in (
+                1, 2 ** 40, 2 ** 70, True, 1.5, float('inf'),
+                decimal.Decimal('1'), 'a', None, b'a',
+                datetime.date(2018, 1, 1), datetime.datetime(2018, 1, 1),
+            )],
+            ['integer', 'bigint', 'numeric', 'boolean', 'numeric',
+             'double precision', 'numeric', 'unknown', 'unknown', 'bytea',
+             'date', 'timestamp'],
+        )
+
+    def test_params_signature(self):
+        """ It should tell parameters of other types apart """
+        self.assertEqual(
+            params_signature({'b': 'x', 'a': 1}),
+            (('a', 'integer'), ('b', 'unknown')),
+        )
+        self.assertNotEqual(params_signature((1, )), params_signature(('1', )))
+
+    def test_statement_cache(self):
+        """ It should count hits and misses """
+        cache = StatementCache()
+        self.assertIsNone(cache.get('q'))
+        statement, evicted = cache.add('q', ['a'])
+        self.assertEqual(cache.get('q'), statement)
+        self.assertEqual(statement.keys, ['a'])
+        self.assertEqual((cache.hits, cache.misses, evicted), (1, 1, []))
+
+    def test_statement_cache_eviction(self):
+        """ It should evict the least recently used statement """
+        cache = StatementCache(max_size=2)
+        first, _evicted = cache.add('a', [])
+        cache.add('b', [])
+        cache.get('a')
+        second = cache.get('b')
+        _statement, evicted = cache.add('c', [])
+        self.assertEqual(evicted, [first.name])
+        self.assertEqual(cache.get('b'), second)
+        self.assertIsNone(cache.get('a'))
+        self.assertNotEqual(first.name, second.name)
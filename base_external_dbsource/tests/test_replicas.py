@@ -0,0 +1,56 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import mock
+
+from odoo.tests import common
+
+from ..replicas import ReplicaRouter, drop_router, get_router
+
+
+class TestReplicaRouter(common.TransactionCase):
+
+    def setUp(self):
+        super(TestReplicaRouter, self).setUp()
+        self.router = ReplicaRouter()
+
+    def test_choose_round_robin(self):
+        """ It should spread choices evenly """
+        self.assertEqual(
+            [self.router.choose([1, 2, 3]) for i in range(4)], [1, 2, 3, 1],
+        )
+
+    def test_choose_latency(self):
+        """ It should prefer unmeasured, then the fastest replicas """
+        self.router.record(1, 0.5)
+        self.assertEqual(self.router.choose([1, 2], 'latency'), 2)
+        self.router.record(2, 1.0)
+        self.assertEqual(self.router.choose([1, 2], 'latency'), 1)
+
+    def test_record_average(self):
+        """ It should smooth the latency of a replica """
+        self.router.record(1, 1.0)
+        self.router.record(1, 2.0)
+        self.assertAlmostEqual(self.router.latency(1), 1.3)
+
+    def test_choose_exclude(self):
+        """ It should not choose excluded replicas """
+        self.assertEqual(self.router.choose([1, 2], exclude={1}), 2)
+        self.assertIsNone(self.router.choose([1], exclude={1}))
+
+    def test_eject(self):
+        """ It should not choose ejected replicas until they expire """
+        with mock.patch('time.time') as now:
+            now.return_value = 100
+            self.router.eject(1, 30)
+            self.assertTrue(self.router.is_ejected(1))
+            self.assertEqual(self.router.choose([1, 2]), 2)
+            now.return_value = 131
+            self.assertFalse(self.router.is_ejected(1))
+
+    def test_get_router(self):
+        """ It should share routers by key until dropped """
+        router = get_router(('db', 1))
+        self.assertIs(get_router(('db', 1)), router)
+        drop_router('db', 1)
+        self.assertIsNot(get_router(('db', 1)), router)
+        drop_router('db', 1)
@@ -0,0 +1,123 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import array
+import unittest
+
+from odoo.tests import common
+
+from ..result import (
+    RowIterator, format_result, numpy, record_class, to_columns, to_records,
+)
+
+
+class TestRowIterator(common.TransactionCase):
+
+    def setUp(self):
+        super(TestRowIterator, self).setUp()
+        self.executed = False
+        self.released = False
+
+    def _batches(self):
+        self.executed = True
+        try:
+            yield ['id', 'name']
+            yield [(1, 'a'), (2, 'b')]
+            yield [(3, 'c')]
+        finally:
+            self.released = True
+
+    def test_lazy(self):
+        """ It should not execute anything before being used """
+        RowIterator(self._batches())
+        self.assertFalse(self.executed)
+
+    def test_cols(self):
+        """ It should expose the column names """
+        self.assertEqual(RowIterator(self._batches()).cols, ['id', 'name'])
+
+    def test_iter(self):
+        """ It should iterate over the rows of every batch """
+        rows = RowIterator(self._batches())
+        self.assertEqual(list(rows), [(1, 'a'), (2, 'b'), (3, 'c')])
+        self.assertTrue(self.released)
+
+    def test_batches(self):
+        """ It should yield the remaining rows by batch """
+        rows = RowIterator(self._batches())
+        next(rows)
+        self.assertEqual(list(rows.batches()), [[(2, 'b')], [(3, 'c')]])
+
+    def test_mappings(self):
+        """ It should yield rows as dicts keyed by column name """
+        rows = RowIterator(self._batches())
+        self.assertEqual(
+            list(rows.mappings())[-1], {'id': 3, 'name': 'c'},
+        )
+        self.assertTrue(self.released)
+
+    def test_close(self):
+        """ It should release the connection when closed early """
+        with RowIterator(self._batches()) as rows:
+            next(rows)
+        self.assertTrue(self.released)
+
+    def test_records(self):
+        """ It should yield rows also read by column name """
+        rows = RowIterator(self._batches())
+        record = list(rows.records())[-1]
+        self.assertEqual((record.id, record['name']), (3, 'c'))
+        self.assertTrue(self.released)
+
+
+class TestResultFormats(common.TransactionCase):
+
+    def setUp(self):
+        super(TestResultFormats, self).setUp()
+        self.cols = ['id', 'name', 'amount', 'rate']
+        self.rows = [(1, 'a', 1.5, None), (2, 'b', 2, 0.5)]
+
+    def test_record(self):
+        """ It should read values by position, name and attribute """
+        record = to_records(self.rows, self.cols)[0]
+        self.assertEqual(record, self.rows[0])
+        self.assertEqual((record[1], record['name'], record.name), ('a',) * 3)
+        self.assertEqual(record.get('missing', 0), 0)
+        self.assertEqual(list(record._asdict()), self.cols)
+
+    def test_record_missing(self):
+        """ It should raise for unknown columns """
+        record = to_records(self.rows, self.cols)[0]
+        with self.assertRaises(KeyError):
+            record['missing']
+        with self.assertRaises(AttributeError):
+            record.missing
+
+    def test_record_class_shared(self):
+        """ It should not give rows a dict of their own """
+        record = record_class(self.cols)(self.rows[0])
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_to_columns(self):
+        """ It should store numeric columns in arrays """
+        columns = to_columns(self.rows, self.cols)
+        self.assertEqual(list(columns), self.cols)
+        self.assertEqual(columns['id'], array.array('q', [1, 2]))
+        self.assertEqual(columns['amount'], array.array('d', [1.5, 2.0]))
+        self.assertEqual(columns['name'], ['a', 'b'])
+        self.assertEqual(columns['rate'], [None, 0.5])
+
+    def test_to_columns_empty(self):
+        """ It should return empty columns without rows """
+        self.assertEqual(to_columns([], ['id']), {'id': []})
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_to_columns_numpy(self):
+        """ It should return NumPy arrays """
+        columns = to_columns(self.rows, self.cols, use_numpy=True)
+        self.assertEqual(columns['id'].dtype, numpy.int64)
+        self.assertEqual(columns['name'].dtype, object)
+
+    def test_format_result_unknown(self):
+        """ It should reject unknown formats """
+        with self.assertRaises(ValueError):
+            format_result(self.rows, self.cols, 'dicts')
@@ -0,0 +1,82 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import threading
+
+from odoo.tests import common
+
+from ..singleflight import SingleFlight, drop_group, get_group
+
+
+class TestSingleFlight(common.TransactionCase):
+
+    def setUp(self):
+        super(TestSingleFlight, self).setUp()
+        self.group = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def _function(self):
+        self.calls += 1
+        self.release.wait(5)
+        return self.calls
+
+    def _start(self, count, function=None):
+        results = []
+
+        function = function or self._function
+
+        def target():
+            try:
+                results.append(self.group.do('key', function))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=target) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def _wait_in_flight(self, waiters):
+        # Waits for the other threads to join the call in flight
+        for i in range(500):
+            if self.group.shared >= waiters:
+                return
+            threading.Event().wait(0.01)
+
+    def test_do_shared(self):
+        """ It should call the function once for concurrent calls """
+        threads, results = self._start(4)
+        self._wait_in_flight(3)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(results), [(1, False)] + [(1, True)] * 3)
+        self.assertEqual(self.group.in_flight(), 0)
+
+    def test_do_error(self):
+        """ It should raise the error of the call to every caller """
+        def function():
+            self.release.wait(5)
+            raise ValueError('failed')
+        threads, results = self._start(2, function)
+        self._wait_in_flight(1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([type(r) for r in results], [ValueError] * 2)
+
+    def test_do_sequential(self):
+        """ It should call the function again once a call completed """
+        self.release.set()
+        self.assertEqual(self.group.do('key', self._function), (1, False))
+        self.assertEqual(self.group.do('key', self._function), (2, False))
+
+    def test_get_group(self):
+        """ It should share groups by data source """
+        try:
+            self.assertIs(get_group(('db', 1)), get_group(('db', 1)))
+            self.assertIsNot(get_group(('db', 1)), get_group(('db', 2)))
+        finally:
+            drop_group('db', 1)
+            drop_group('db', 2)
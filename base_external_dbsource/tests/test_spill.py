@@ -0,0 +1,77 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import gc
+
+from odoo.tests import common
+
+from ..spill import SpilledRows
+
+
+class TestSpilledRows(common.TransactionCase):
+
+    def _rows(self, count=10, **kwargs):
+        rows = SpilledRows(**kwargs)
+        rows.extend((i, 'row %d' % i) for i in range(count))
+        return rows
+
+    def test_memory_only(self):
+        """ It should not create any file within the limits """
+        rows = self._rows(max_rows=10)
+        self.assertFalse(rows.spilled)
+        self.assertIsNone(rows._file)
+
+    def test_spill_rows(self):
+        """ It should spill the rows beyond the row limit """
+        rows = self._rows(max_rows=3)
+        self.assertTrue(rows.spilled)
+        self.assertEqual(len(rows._rows), 3)
+        self.assertEqual(len(rows), 10)
+
+    def test_spill_bytes(self):
+        """ It should spill the rows beyond the size limit """
+        rows = self._rows(max_bytes=500)
+        self.assertTrue(rows.spilled)
+        self.assertLess(len(rows._rows), 10)
+
+    def test_getitem(self):
+        """ It should read rows from memory and disk by index """
+        rows = self._rows(max_rows=3)
+        self.assertEqual(rows[1], (1, 'row 1'))
+        self.assertEqual(rows[7], (7, 'row 7'))
+        self.assertEqual(rows[-1], (9, 'row 9'))
+        self.assertEqual(rows[2:5], [(i, 'row %d' % i) for i in (2, 3, 4)])
+        with self.assertRaises(IndexError):
+            rows[10]
+
+    def test_iter(self):
+        """ It should iterate over every row, even if read meanwhile """
+        rows = self._rows(max_rows=3)
+        iterator = iter(rows)
+        first = [next(iterator) for i in range(5)]
+        rows[8]
+        self.assertEqual(
+            first + list(iterator), [(i, 'row %d' % i) for i in range(10)],
+        )
+
+    def test_row_factory(self):
+        """ It should apply the row factory to every row read """
+        rows = self._rows(max_rows=3, row_factory=list)
+        self.assertEqual(rows[5], [5, 'row 5'])
+        self.assertEqual(list(rows)[0], [0, 'row 0'])
+
+    def test_close(self):
+        """ It should remove the file when closed """
+        rows = self._rows(max_rows=3)
+        temp_file = rows._file
+        with rows:
+            pass
+        self.assertTrue(temp_file.closed)
+        self.assertEqual(len(rows), 0)
+
+    def test_garbage_collected(self):
+        """ It should remove the file when garbage collected """
+        rows = self._rows(max_rows=3)
+        temp_file = rows._file
+        del rows
+        gc.collect()
+        self.assertTrue(temp_file.closed)
@@ -0,0 +1,167 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+from odoo.tests import common
+
+from ..sql import (
+    DomainCompiler, compile_order, generalize_query, is_read_only,
+    keyset_domain, normalize_query, parse_aggregate, parse_group_order,
+    parse_order, references_table,
+)
+
+
+class TestSql(common.TransactionCase):
+
+    def test_normalize_query(self):
+        """ It should collapse whitespace outside quoted literals """
+        self.assertEqual(
+            normalize_query(" SELECT  *\n FROM t WHERE a = 'x  y' "),
+            "SELECT * FROM t WHERE a = 'x  y'",
+        )
+
+    def test_generalize_query(self):
+        """ It should replace literals and collapse lists of values """
+        self.assertEqual(
+            generalize_query(
+                'SELECT "a1" FROM t\nWHERE b = \'x\' AND c > 2.5 '
+                'AND d IN (%(p0)s, %(p1)s) AND e IN (1, 2)'
+            ),
+            'SELECT "a1" FROM t WHERE b = ? AND c > ? AND d IN (...) '
+            'AND e IN (...)',
+        )
+
+    def test_is_read_only(self):
+        """ It should only accept statements that cannot write """
+        self.assertTrue(is_read_only('SELECT * FROM t'))
+        self.assertTrue(is_read_only("select 'delete' from t"))
+        self.assertTrue(is_read_only('WITH x AS (SELECT 1) SELECT * FROM x'))
+        self.assertFalse(is_read_only('UPDATE t SET a = 1'))
+        self.assertFalse(is_read_only('SELECT * INTO t2 FROM t'))
+        self.assertFalse(is_read_only('SELECT * FROM t FOR UPDATE'))
+        self.assertFalse(is_read_only(
+            'WITH x AS (DELETE FROM t RETURNING *) SELECT * FROM x',
+        ))
+
+    def test_references_table(self):
+        """ It should find whole, possibly quoted, table names """
+        self.assertTrue(references_table('SELECT * FROM "items"', 'items'))
+        self.assertTrue(references_table('select * from ITEMS', 's.items'))
+        self.assertFalse(references_table('SELECT * FROM items_x', 'items'))
+
+
+class TestDomainCompiler(common.TransactionCase):
+
+    def _compile(self, domain):
+        compiler = DomainCompiler(
+            lambda name: '"%s"' % name, lambda name: '%%(%s)s' % name,
+        )
+        return compiler.compile(domain), compiler.params
+
+    def test_empty(self):
+        """ It should match everything for an empty domain """
+        self.assertEqual(self._compile([]), ('1=1', {}))
+
+    def test_leaf(self):
+        """ It should quote the column and pass the value as parameter """
+        self.assertEqual(
+            self._compile([('code', '=', "x'; DROP TABLE t")]),
+            ('"code" = %(p0)s', {'p0': "x'; DROP TABLE t"}),
+        )
+
+    def test_implicit_and(self):
+        """ It should join consecutive terms with AND """
+        self.assertEqual(
+            self._compile([('a', '>', 1), ('b', '!=', 2)])[0],
+            '("a" > %(p0)s AND "b" <> %(p1)s)',
+        )
+
+    def test_operators(self):
+        """ It should compile prefix OR and NOT operators """
+        self.assertEqual(
+            self._compile(['|', ('a', '=', 1), '!', ('b', '=', None)])[0],
+            '("a" = %(p0)s OR (NOT "b" IS NULL))',
+        )
+
+    def test_in(self):
+        """ It should compile IN lists, including empty ones and NULL """
+        self.assertEqual(
+            self._compile([('a', 'in', [1, 2])]),
+            ('"a" IN (%(p0)s, %(p1)s)', {'p0': 1, 'p1': 2}),
+        )
+        self.assertEqual(self._compile([('a', 'in', [])])[0], '1=0')
+        self.assertEqual(
+            self._compile([('a', 'in', [1, None])])[0],
+            '("a" IN (%(p0)s) OR "a" IS NULL)',
+        )
+        self.assertEqual(
+            self._compile([('a', 'not in', [1])])[0],
+            '("a" NOT IN (%(p0)s) OR "a" IS NULL)',
+        )
+
+    def test_like(self):
+        """ It should compile like operators with Odoo semantics """
+        self.assertEqual(
+            self._compile([('a', 'ilike', 'x')]),
+            ('LOWER("a") LIKE LOWER(%(p0)s)', {'p0': '%x%'}),
+        )
+        self.assertEqual(
+            self._compile([('a', '=like', 'x_')]),
+            ('"a" LIKE %(p0)s', {'p0': 'x_'}),
+        )
+        self.assertEqual(
+            self._compile([('a', 'not like', 'x')])[0],
+            '"a" NOT LIKE %(p0)s',
+        )
+
+    def test_invalid(self):
+        """ It should reject malformed domains and unknown operators """
+        for domain in (['|', ('a', '=', 1)], [('a', 'child_of', 1)], ['x']):
+            with self.assertRaises(ValueError):
+                self._compile(domain)
+
+    def test_compile_order(self):
+        """ It should quote the ordering columns and reject anything else """
+        quote = '"%s"'.__mod__
+        self.assertEqual(
+            compile_order('name desc, id', quote), '"name" DESC, "id" ASC',
+        )
+        with self.assertRaises(ValueError):
+            compile_order('name; DROP TABLE t', quote)
+
+    def test_parse_order(self):
+        """ It should parse the columns and directions of an order """
+        self.assertEqual(
+            parse_order('date DESC, id'), [('date', True), ('id', False)],
+        )
+
+    def test_keyset_domain(self):
+        """ It should match the rows sorted after the key values """
+        self.assertEqual(
+            keyset_domain([('date', True), ('id', False)], ['2020', 5]),
+            ['|', ('date', '<', '2020'),
+             '&', ('date', '=', '2020'), ('id', '>', 5)],
+        )
+
+    def test_parse_aggregate(self):
+        """ It should parse the name, function and column of aggregates """
+        self.assertEqual(parse_aggregate('amount'),
+                         ('amount', 'sum', 'amount'))
+        self.assertEqual(parse_aggregate('amount:max'),
+                         ('amount', 'max', 'amount'))
+        self.assertEqual(parse_aggregate('total:count_distinct(ref)'),
+                         ('total', 'count_distinct', 'ref'))
+
+    def test_parse_aggregate_invalid(self):
+        """ It should reject unknown functions and expressions """
+        for spec in ('amount:median', 'a:sum(b + c)', 'a; DROP TABLE t'):
+            with self.assertRaises(ValueError):
+                parse_aggregate(spec)
+
+    def test_parse_group_order(self):
+        """ It should only sort groups by the given names """
+        self.assertEqual(
+            parse_group_order('date:month desc, total', {'date:month',
+                                                         'total'}),
+            [('date:month', True), ('total', False)],
+        )
+        with self.assertRaises(ValueError):
+            parse_group_order('amount', {'total'})
@@ -0,0 +1,104 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
+
+import mock
+
+from odoo.tests import common
+
+from ..stats import (
+    BUCKETS, OTHER_QUERIES, Collector, Measure, current, drain_collectors,
+    drop_collector, flush_due, get_collector, percentile, phase,
+)
+
+
+class TestStats(common.TransactionCase):
+
+    def _measure(self, query='SELECT 1', elapsed=0.0, rows=0):
+        measure = Measure(query)
+        measure.times['execute'] = elapsed
+        measure.rows = rows
+        return measure
+
+    def test_percentile(self):
+        """ It should return the bound of the bucket of a percentile """
+        histogram = [0] * (len(BUCKETS) + 1)
+        histogram[0], histogram[5] = 9, 1
+        self.assertEqual(percentile(histogram, 0.5), BUCKETS[0])
+        self.assertEqual(percentile(histogram, 0.95), BUCKETS[5])
+        self.assertEqual(percentile(histogram, 0.95, 30.0), 30.0)
+
+    def test_percentile_empty(self):
+        """ It should return 0 without any query """
+        self.assertEqual(percentile([0] * (len(BUCKETS) + 1), 0.5), 0.0)
+
+    def test_running(self):
+        """ It should split time between phases and record errors """
+        measure = Measure('SELECT 1')
+        with mock.patch('time.time') as time:
+            time.side_effect = [0.0, 0.001, 0.004, 0.010]
+            with self.assertRaises(ValueError):
+                with measure.running('execute'):
+                    self.assertIs(current(), measure)
+                    with phase('connect'):
+                        pass
+                    raise ValueError()
+        self.assertIsNone(current())
+        self.assertAlmostEqual(measure.times['connect'], 3.0)
+        self.assertAlmostEqual(measure.times['execute'], 7.0)
+        self.assertEqual(measure.error, 'ValueError')
+
+    def test_phase_without_measure(self):
+        """ It should do nothing outside of a measure """
+        with phase('fetch'):
+            self.assertIsNone(current())
+
+    def test_collector(self):
+        """ It should aggregate measures by query """
+        collector = Collector()
+        collector.record(self._measure(elapsed=3.0, rows=2))
+        collector.record(self._measure(elapsed=700.0, rows=1))
+        queries, slow = collector.drain()
+        stats = queries['SELECT 1']
+        self.assertEqual((stats.calls, stats.rows), (2, 3))
+        self.assertEqual(stats.times['execute'], 703.0)
+        self.assertEqual(stats.max_time, 700.0)
+        self.assertEqual(sum(stats.histogram), 2)
+        self.assertFalse(slow)
+        self.assertEqual(collector.drain(), ({}, []))
+
+    def test_collector_slow(self):
+        """ It should keep the measures above the slow query threshold """
+        collector = Collector()
+        self.assertFalse(collector.record(self._measure(elapsed=10.0), 50))
+        slow = self._measure(elapsed=60.0)
+        self.assertTrue(collector.record(slow, 50))
+        self.assertEqual(collector.drain()[1], [slow])
+
+    def test_collector_max_queries(self):
+        """ It should gather the queries beyond the limit """
+        collector = Collector(max_queries=1)
+        collector.record(self._measure('SELECT 1'))
+        collector.record(self._measure('SELECT 2'))
+        self.assertEqual(
+            sorted(collector.drain()[0]), [OTHER_QUERIES, 'SELECT 1'],
+        )
+
+    def test_drain_collectors(self):
+        """ It should drain the collectors of a database only """
+        get_collector(('stats_db', 1)).record(self._measure())
+        get_collector(('other_db', 1)).record(self._measure())
+        try:
+            drained = drain_collectors('stats_db')
+            self.assertEqual(list(drained), [1])
+            self.assertIn('SELECT 1', drained[1][0])
+        finally:
+            drop_collector('stats_db', 1)
+            drop_collector('other_db', 1)
+
+    def test_flush_due(self):
+        """ It should only tell one caller per interval """
+        with mock.patch('time.time') as time:
+            time.return_value = 1000.0
+            self.assertFalse(flush_due('flush_db', 60))
+            time.return_value = 1061.0
+            self.assertTrue(flush_due('flush_db', 60))
+            self.assertFalse(flush_due('flush_db', 60))
@@ -4,6 +4,8 @@
 
 import logging
 
+from contextlib import contextmanager
+
 from odoo import api, models
 
 _logger = logging.getLogger(__name__)
@@ -15,6 +17,7 @@ try:
     CONNECTORS = base_external_dbsource.BaseExternalDbsource.CONNECTORS
     try:
         import MySQLdb
+        import sqlalchemy
         CONNECTORS.append(('mysql', 'MySQL'))
         assert MySQLdb
     except (ImportError, AssertionError):
@@ -29,6 +32,21 @@ class BaseExternalDbsource(models.Model):
 
     _inherit = "base.external.dbsource"
 
+    IDENTIFIER_QUOTE_MYSQL = '`'
+    # ER_QUERY_TIMEOUT, raised when max_execution_time is exceeded
+    QUERY_TIMEOUT_ERROR_MYSQL = 3024
+    NO_LIMIT_MYSQL = '18446744073709551615'
+    # The SQLAlchemy engine pools connections itself
+    CONNECTION_POOL_MYSQL = False
+    DATE_GROUPS_MYSQL = {
+        'day': 'DATE({})',
+        'week': 'DATE(DATE_SUB({0}, INTERVAL WEEKDAY({0}) DAY))',
+        'month': 'DATE(DATE_SUB({0}, INTERVAL DAYOFMONTH({0}) - 1 DAY))',
+        'quarter': 'MAKEDATE(YEAR({0}), 1) + INTERVAL QUARTER({0}) - 1 '
+                   'QUARTER',
+        'year': 'MAKEDATE(YEAR({}), 1)',
+    }
+
     @api.multi
     def connection_close_mysql(self, connection):
         return connection.close()
@@ -40,3 +58,71 @@ class BaseExternalDbsource(models.Model):
     @api.multi
     def execute_mysql(self, sqlquery, sqlparams, metadata):
         return self._execute_sqlalchemy(sqlquery, sqlparams, metadata)
+
+    @api.multi
+    def execute_many_mysql(self, connection, sqlquery, sqlparams_seq):
+        return self._execute_many_sqlalchemy(
+            connection, sqlquery, sqlparams_seq,
+        )
+
+    @api.multi
+    def execute_connection_mysql(self, connection, sqlquery, sqlparams):
+        return self._execute_connection_sqlalchemy(
+            connection, sqlquery, sqlparams,
+        )
+
+    @api.multi
+    def execute_iter_mysql(self, sqlquery, sqlparams, batch_size):
+        return self._execute_iter_sqlalchemy(sqlquery, sqlparams, batch_size)
+
+    @api.multi
+    def remote_browse_mysql(self, record_ids, *args, **kwargs):
+        return self._remote_browse_sql(record_ids, *args, **kwargs)
+
+    @api.multi
+    def remote_delete_mysql(self, record_ids, *args, **kwargs):
+        return self._remote_delete_sql(record_ids, *args, **kwargs)
+
+    @api.multi
+    def remote_read_group_mysql(self, domain, fields, groupby, *args,
+                                **kwargs):
+        return self._remote_read_group_sql(
+            domain, fields, groupby, *args, **kwargs
+        )
+
+    @api.multi
+    def remote_search_mysql(self, query, *args, **kwargs):
+        return self._remote_search_sql(query, *args, **kwargs)
+
+    @api.multi
+    def remote_update_mysql(self, record_ids, vals, *args, **kwargs):
+        return self._remote_update_sql(record_ids, vals, *args, **kwargs)
+
+    @api.multi
+    @contextmanager
+    def statement_timeout_mysql(self, connection, timeout):
+        # Only applies to SELECT statements, from MySQL 5.7.8 on
+        connection.execute(
+            'SET SESSION max_execution_time = %d' % int(timeout),
+        )
+        try:
+            yield
+        except sqlalchemy.exc.OperationalError as e:
+            if e.orig.args and \
+                    e.orig.args[0] == self.QUERY_TIMEOUT_ERROR_MYSQL:
+                self._raise_statement_timeout(e)
+            raise
+        finally:
+            connection.execute('SET SESSION max_execution_time = DEFAULT')
+
+    @api.multi
+    def transaction_begin_mysql(self, connection):
+        return self._transaction_begin_sqlalchemy(connection)
+
+    @api.multi
+    def transaction_commit_mysql(self, connection, transaction):
+        return self._transaction_commit_sqlalchemy(connection, transaction)
+
+    @api.multi
+    def transaction_rollback_mysql(self, connection, transaction):
+        return self._transaction_rollback_sqlalchemy(connection, transaction)
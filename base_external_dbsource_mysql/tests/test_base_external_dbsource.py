@@ -1,9 +1,15 @@
 # Copyright 2016 LasLabs Inc.
 
 import mock
+import MySQLdb
+import sqlalchemy
 
 from odoo.tests import common
 
+from odoo.addons.base_external_dbsource.exceptions import (
+    StatementTimeoutError,
+)
+
 
 ADAPTER = ('odoo.addons.base_external_dbsource_mysql.models'
            '.base_external_dbsource.MySQLdb')
@@ -31,6 +37,36 @@ class TestBaseExternalDbsource(common.TransactionCase):
             self.dbsource.connection_open_mysql()
             parent_method.assert_called_once_with()
 
+    def test_execute_iter_mysql(self):
+        """ It should pass args to SQLAlchemy execute_iter """
+        expect = 'sqlquery', 'sqlparams', 'batch_size'
+        with mock.patch.object(
+            self.dbsource, '_execute_iter_sqlalchemy'
+        ) as parent_method:
+            self.dbsource.execute_iter_mysql(*expect)
+            parent_method.assert_called_once_with(*expect)
+
+    def test_execute_many_mysql(self):
+        """ It should pass args to SQLAlchemy execute_many """
+        expect = 'connection', 'sqlquery', 'sqlparams_seq'
+        with mock.patch.object(
+            self.dbsource, '_execute_many_sqlalchemy'
+        ) as parent_method:
+            self.dbsource.execute_many_mysql(*expect)
+            parent_method.assert_called_once_with(*expect)
+
+    def test_transaction_mysql(self):
+        """ It should pass args to SQLAlchemy transaction methods """
+        for method in ('begin', 'commit', 'rollback'):
+            args = ['connection', 'transaction']
+            if method == 'begin':
+                args = args[:1]
+            with mock.patch.object(
+                self.dbsource, '_transaction_%s_sqlalchemy' % method
+            ) as parent_method:
+                getattr(self.dbsource, 'transaction_%s_mysql' % method)(*args)
+                parent_method.assert_called_once_with(*args)
+
     def test_excecute_mysql(self):
         """ It should pass args to SQLAlchemy execute """
         expect = 'sqlquery', 'sqlparams', 'metadata'
@@ -39,3 +75,23 @@ class TestBaseExternalDbsource(common.TransactionCase):
         ) as parent_method:
             self.dbsource.execute_mysql(*expect)
             parent_method.assert_called_once_with(*expect)
+
+    def test_statement_timeout_mysql(self):
+        """ It should set and reset the maximum execution time """
+        connection = mock.MagicMock()
+        with self.dbsource.statement_timeout_mysql(connection, 50):
+            connection.execute.assert_called_once_with(
+                'SET SESSION max_execution_time = 50',
+            )
+        connection.execute.assert_called_with(
+            'SET SESSION max_execution_time = DEFAULT',
+        )
+
+    def test_statement_timeout_mysql_error(self):
+        """ It should raise StatementTimeoutError on interrupted queries """
+        error = sqlalchemy.exc.OperationalError(
+            'SELECT 1', {}, MySQLdb.OperationalError(3024, 'interrupted'),
+        )
+        with self.assertRaises(StatementTimeoutError):
+            with self.dbsource.statement_timeout_mysql(mock.MagicMock(), 50):
+                raise error
@@ -3,7 +3,7 @@
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 {
     'name': 'External Database Source - SQLite',
-    'version': '11.0.1.0.1',
+    'version': '11.0.1.1.0',
     'category': 'Tools',
     'author': "Daniel Reis, "
               "LasLabs, "
@@ -18,6 +18,9 @@
             'sqlalchemy',
         ],
     },
+    'data': [
+        'views/base_external_dbsource.xml',
+    ],
     'demo': [
         'demo/base_external_dbsource.xml',
     ],
@@ -2,13 +2,25 @@
 # Copyright 2016 LasLabs Inc.
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html).
 
+import hashlib
 import logging
+import os
+import threading
+import time
 
-from odoo import api, models
+from contextlib import ExitStack, contextmanager
+
+from odoo import api, fields, models
 
 _logger = logging.getLogger(__name__)
 
+# SQLAlchemy engines shared by the worker, keyed by database, data source
+# and connection string hash. Values are ``(engine, settings, pid)``.
+_engines = {}
+_engines_lock = threading.Lock()
+
 try:
+    from odoo.addons.base_external_dbsource import stats as query_stats
     from odoo.addons.base_external_dbsource.models import (
         base_external_dbsource,
     )
@@ -16,6 +28,9 @@ try:
     try:
         import sqlalchemy
         CONNECTORS.append(('sqlite', 'SQLite'))
+        base_external_dbsource.BaseExternalDbsource.CONNECTION_FIELDS.append(
+            'pool_pre_ping',
+        )
     except ImportError:
         _logger.info('SQLAlchemy library not available. Please '
                      'install "sqlalchemy" python package.')
@@ -29,6 +44,28 @@ class BaseExternalDbsource(models.Model):
     _inherit = "base.external.dbsource"
 
     PWD_STRING_SQLITE = 'Password=%s;'
+    PLACEHOLDER_SQLITE = ':%s'
+    NO_LIMIT_SQLITE = '-1'
+    # SQLITE_MAX_VARIABLE_NUMBER of builds older than 3.32
+    MAX_PARAMS_SQLITE = 999
+    # The engine pools connections, which SQLite binds to their thread
+    CONNECTION_POOL_SQLITE = False
+    DATE_GROUPS_SQLITE = {
+        'day': 'date({})',
+        'week': "date({}, '-6 days', 'weekday 1')",
+        'month': "date({}, 'start of month')",
+        'quarter': "date({0}, 'start of month', '-' || "
+                   "((CAST(strftime('%m', {0}) AS INTEGER) - 1) % 3) || "
+                   "' months')",
+        'year': "date({}, 'start of year')",
+    }
+
+    pool_pre_ping = fields.Boolean(
+        'Test connections before use',
+        help='SQLAlchemy connectors only: issue a lightweight ping whenever '
+             'a connection is taken from the engine pool, and transparently '
+             'replace it if the server closed it.',
+    )
 
     @api.multi
     def connection_close_sqlite(self, connection):
@@ -42,20 +79,229 @@ class BaseExternalDbsource(models.Model):
     def execute_sqlite(self, sqlquery, sqlparams, metadata):
         return self._execute_sqlalchemy(sqlquery, sqlparams, metadata)
 
+    @api.multi
+    def execute_many_sqlite(self, connection, sqlquery, sqlparams_seq):
+        return self._execute_many_sqlalchemy(
+            connection, sqlquery, sqlparams_seq,
+        )
+
+    @api.multi
+    def execute_connection_sqlite(self, connection, sqlquery, sqlparams):
+        return self._execute_connection_sqlalchemy(
+            connection, sqlquery, sqlparams,
+        )
+
+    @api.multi
+    def execute_iter_sqlite(self, sqlquery, sqlparams, batch_size):
+        return self._execute_iter_sqlalchemy(
+            sqlquery, sqlparams, batch_size, timeout_per_call=True,
+        )
+
+    @api.multi
+    def remote_browse_sqlite(self, record_ids, *args, **kwargs):
+        return self._remote_browse_sql(record_ids, *args, **kwargs)
+
+    @api.multi
+    def remote_delete_sqlite(self, record_ids, *args, **kwargs):
+        return self._remote_delete_sql(record_ids, *args, **kwargs)
+
+    @api.multi
+    def remote_read_group_sqlite(self, domain, fields, groupby, *args,
+                                 **kwargs):
+        return self._remote_read_group_sql(
+            domain, fields, groupby, *args, **kwargs
+        )
+
+    @api.multi
+    def remote_search_sqlite(self, query, *args, **kwargs):
+        return self._remote_search_sql(query, *args, **kwargs)
+
+    @api.multi
+    def remote_update_sqlite(self, record_ids, vals, *args, **kwargs):
+        return self._remote_update_sql(record_ids, vals, *args, **kwargs)
+
+    @api.multi
+    @contextmanager
+    def statement_timeout_sqlite(self, connection, timeout):
+        # SQLite has no timeout, but interrupts queries when asked to by a
+        # handler called every few virtual machine instructions.
+        dbapi_connection = connection.connection
+        deadline = time.time() + timeout / 1000.0
+        dbapi_connection.set_progress_handler(
+            lambda: time.time() > deadline, 1000,
+        )
+        try:
+            yield
+        except sqlalchemy.exc.OperationalError as e:
+            if 'interrupted' in str(e.orig):
+                self._raise_statement_timeout(e)
+            raise
+        finally:
+            dbapi_connection.set_progress_handler(None, 0)
+
+    @api.multi
+    def transaction_begin_sqlite(self, connection):
+        return self._transaction_begin_sqlalchemy(connection)
+
+    @api.multi
+    def transaction_commit_sqlite(self, connection, transaction):
+        return self._transaction_commit_sqlalchemy(connection, transaction)
+
+    @api.multi
+    def transaction_rollback_sqlite(self, connection, transaction):
+        return self._transaction_rollback_sqlalchemy(connection, transaction)
+
+    @api.multi
+    def _connection_dispose(self):
+        super(BaseExternalDbsource, self)._connection_dispose()
+        for record in self:
+            record._dispose_sqlalchemy_engines()
+
     @api.multi
     def _connection_open_sqlalchemy(self):
-        return sqlalchemy.create_engine(self.conn_string_full).connect()
+        return self._get_sqlalchemy_engine().connect()
+
+    @api.multi
+    def _dispose_sqlalchemy_engines(self):
+        """ It disposes of the cached SQLAlchemy engines of the record. """
+        self.ensure_one()
+        prefix = self.env.cr.dbname, self.id
+        with _engines_lock:
+            engines = [
+                _engines.pop(key) for key in list(_engines)
+                if key[:2] == prefix
+            ]
+        for engine, settings, pid in engines:
+            if pid == os.getpid():
+                engine.dispose()
+
+    @api.multi
+    def _get_sqlalchemy_engine(self):
+        """ It returns the SQLAlchemy engine of the data source.
+
+        Engines are created once per worker and data source, so that their
+        dialect state, statement cache and connection pool are reused.
+        """
+        self.ensure_one()
+        conn_string_hash = hashlib.sha1(
+            self.conn_string_full.encode('utf-8'),
+        ).hexdigest()
+        key = self.env.cr.dbname, self.id, conn_string_hash
+        settings = (
+            self.pool_pre_ping, self.pool_max_lifetime, self.pool_size_max,
+        )
+        engine, engine_settings, pid = _engines.get(key, (None, None, None))
+        if engine is not None and engine_settings == settings and \
+                pid == os.getpid():
+            return engine
+        # Also drops engines of a former connection string.
+        self._dispose_sqlalchemy_engines()
+        engine = sqlalchemy.create_engine(
+            self.conn_string_full, **self._get_sqlalchemy_engine_options()
+        )
+        with _engines_lock:
+            _engines[key] = engine, settings, os.getpid()
+        return engine
+
+    @api.multi
+    def _get_sqlalchemy_engine_options(self):
+        """ It returns the keyword arguments for ``create_engine``. """
+        self.ensure_one()
+        options = {
+            'pool_pre_ping': self.pool_pre_ping,
+        }
+        if self.pool_max_lifetime:
+            options['pool_recycle'] = self.pool_max_lifetime
+        url = sqlalchemy.engine.url.make_url(self.conn_string_full)
+        pool_class = url.get_dialect().get_pool_class(url)
+        # Dialects such as file based SQLite do not use a sized pool.
+        if issubclass(pool_class, sqlalchemy.pool.QueuePool):
+            if self.pool_size_max > 0:
+                options['pool_size'] = self.pool_size_max
+            else:
+                options['poolclass'] = sqlalchemy.pool.NullPool
+        return options
+
+    @api.multi
+    def _execute_connection_sqlalchemy(self, connection, sqlquery, sqlparams):
+        if sqlparams is None:
+            result = connection.execute(sqlquery)
+        else:
+            result = connection.execute(sqlquery, sqlparams)
+        try:
+            if not result.returns_rows:
+                return [], [], result.rowcount
+            with query_stats.phase('fetch'):
+                rows = result.fetchall()
+            return rows, list(result.keys()), result.rowcount
+        finally:
+            result.close()
+
+    @api.multi
+    def _execute_many_sqlalchemy(self, connection, sqlquery, sqlparams_seq):
+        # A list of parameter sets makes SQLAlchemy call executemany
+        return connection.execute(sqlquery, sqlparams_seq)
 
     @api.multi
     def _execute_sqlalchemy(self, sqlquery, sqlparams, metadata):
-        rows, cols = list(), list()
-        for record in self:
-            with record.connection_open() as connection:
-                if sqlparams is None:
-                    cur = connection.execute(sqlquery)
-                else:
-                    cur = connection.execute(sqlquery, sqlparams)
-                if metadata:
-                    cols = list(cur.keys())
+        # Use execute_all to query several data sources
+        self.ensure_one()
+        cols = list()
+        with self.connection_open() as connection, \
+                self._statement_timeout(connection):
+            if sqlparams is None:
+                cur = connection.execute(sqlquery)
+            else:
+                cur = connection.execute(sqlquery, sqlparams)
+            if not cur.returns_rows:
+                return [], cols
+            if metadata:
+                cols = list(cur.keys())
+            with query_stats.phase('fetch'):
                 rows = [r for r in cur]
         return rows, cols
+
+    @api.multi
+    def _execute_iter_sqlalchemy(self, sqlquery, sqlparams, batch_size,
+                                 timeout_per_call=False):
+        # The statement timeout spans the whole iteration, unless it is
+        # applied to each call of the driver on its own, so that the time
+        # the consumer spends between batches does not count.
+        def call_timeout():
+            if timeout_per_call:
+                return self._statement_timeout(connection)
+            return ExitStack()
+
+        with self.connection_open() as connection, ExitStack() as stack:
+            if not timeout_per_call:
+                stack.enter_context(self._statement_timeout(connection))
+            # Server side cursors for dialects supporting them, such as the
+            # unbuffered cursor of MySQL.
+            connection = connection.execution_options(stream_results=True)
+            with call_timeout():
+                if sqlparams is None:
+                    result = connection.execute(sqlquery)
+                else:
+                    result = connection.execute(sqlquery, sqlparams)
+            try:
+                yield list(result.keys())
+                while True:
+                    with call_timeout():
+                        rows = result.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                result.close()
+
+    @api.multi
+    def _transaction_begin_sqlalchemy(self, connection):
+        return connection.begin()
+
+    @api.multi
+    def _transaction_commit_sqlalchemy(self, connection, transaction):
+        return transaction.commit()
+
+    @api.multi
+    def _transaction_rollback_sqlalchemy(self, connection, transaction):
+        return transaction.rollback()
@@ -1,9 +1,29 @@
 # Copyright 2016 LasLabs Inc.
 
+import io
+import logging
 import mock
+import os
+import sqlalchemy
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
 
 from odoo.tests import common
 
+from odoo.addons.base_external_dbsource import result
+from odoo.addons.base_external_dbsource.exceptions import (
+    StatementTimeoutError,
+)
+
+_logger = logging.getLogger(__name__)
+
+# Benchmarks are slow and depend on the load of the host, so that they
+# only run on demand.
+BENCHMARK = bool(os.environ.get('DBSOURCE_BENCHMARK'))
+
 
 ADAPTER = ('odoo.addons.base_external_dbsource_sqlite.models'
            '.base_external_dbsource.sqlalchemy')
@@ -31,6 +51,38 @@ class TestBaseExternalDbsource(common.TransactionCase):
             self.dbsource.connection_open_sqlite()
             parent_method.assert_called_once_with()
 
+    def test_execute_iter_sqlite(self):
+        """ It should pass args to SQLAlchemy execute_iter """
+        expect = 'sqlquery', 'sqlparams', 'batch_size'
+        with mock.patch.object(
+            self.dbsource, '_execute_iter_sqlalchemy'
+        ) as parent_method:
+            self.dbsource.execute_iter_sqlite(*expect)
+            parent_method.assert_called_once_with(
+                *expect, timeout_per_call=True
+            )
+
+    def test_execute_many_sqlite(self):
+        """ It should pass args to SQLAlchemy execute_many """
+        expect = 'connection', 'sqlquery', 'sqlparams_seq'
+        with mock.patch.object(
+            self.dbsource, '_execute_many_sqlalchemy'
+        ) as parent_method:
+            self.dbsource.execute_many_sqlite(*expect)
+            parent_method.assert_called_once_with(*expect)
+
+    def test_transaction_sqlite(self):
+        """ It should pass args to SQLAlchemy transaction methods """
+        for method in ('begin', 'commit', 'rollback'):
+            args = ['connection', 'transaction']
+            if method == 'begin':
+                args = args[:1]
+            with mock.patch.object(
+                self.dbsource, '_transaction_%s_sqlalchemy' % method
+            ) as parent_method:
+                getattr(self.dbsource, 'transaction_%s_sqlite' % method)(*args)
+                parent_method.assert_called_once_with(*args)
+
     def test_excecute_sqlite(self):
         """ It should pass args to SQLAlchemy execute """
         expect = 'sqlquery', 'sqlparams', 'metadata'
@@ -48,3 +100,557 @@ class TestBaseExternalDbsource(common.TransactionCase):
         ) as parent_method:
             self.dbsource.execute_sqlite(*expect)
             parent_method.assert_called_once_with(*expect)
+
+
+class SqliteFileCase(common.TransactionCase):
+    """ Common setup for tests using a temporary SQLite database. """
+
+    def setUp(self):
+        super(SqliteFileCase, self).setUp()
+        handle, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.dbsource = self.env.ref(
+            'base_external_dbsource_sqlite.demo_sqlite',
+        )
+        self.dbsource.write({
+            'password': False,
+            'conn_string': 'sqlite:///%s' % self.db_path,
+        })
+        self.dbsource.execute(
+            'CREATE TABLE items (id INTEGER PRIMARY KEY, code TEXT)',
+        )
+        self.dbsource.execute(
+            "INSERT INTO items (code) VALUES ('A'), ('B'), ('C')",
+        )
+
+    def tearDown(self):
+        self.dbsource._connection_dispose()
+        os.unlink(self.db_path)
+        super(SqliteFileCase, self).tearDown()
+
+
+class TestSqlalchemyEngine(SqliteFileCase):
+
+    def test_engine_reused(self):
+        """ It should create the engine once per data source """
+        engine = self.dbsource._get_sqlalchemy_engine()
+        self.assertIs(self.dbsource._get_sqlalchemy_engine(), engine)
+
+    def test_engine_disposed_on_write(self):
+        """ It should replace the engine when connection fields change """
+        engine = self.dbsource._get_sqlalchemy_engine()
+        self.dbsource.pool_pre_ping = True
+        new_engine = self.dbsource._get_sqlalchemy_engine()
+        self.assertIsNot(new_engine, engine)
+        self.assertTrue(new_engine.pool._pre_ping)
+
+    def test_engine_disposed_on_unlink(self):
+        """ It should dispose of the engine when the source is deleted """
+        engine = self.dbsource._get_sqlalchemy_engine()
+        with mock.patch.object(type(engine), 'dispose') as dispose:
+            self.dbsource.unlink()
+            dispose.assert_called_once_with()
+
+    def test_engine_options_file(self):
+        """ It should not size the pool of file based SQLite engines """
+        options = self.dbsource._get_sqlalchemy_engine_options()
+        self.assertNotIn('pool_size', options)
+        self.assertEqual(
+            options['pool_recycle'], self.dbsource.pool_max_lifetime,
+        )
+
+    def test_engine_options_queue_pool(self):
+        """ It should size the pool of server based engines """
+        self.dbsource.conn_string = 'mysql://user@localhost/db'
+        options = self.dbsource._get_sqlalchemy_engine_options()
+        self.assertEqual(options['pool_size'], self.dbsource.pool_size_max)
+
+    def test_engine_options_no_pool(self):
+        """ It should not pool connections when the pool size is 0 """
+        self.dbsource.write({
+            'conn_string': 'mysql://user@localhost/db',
+            'pool_size_min': 0,
+            'pool_size_max': 0,
+        })
+        options = self.dbsource._get_sqlalchemy_engine_options()
+        self.assertNotIn('pool_size', options)
+        self.assertIs(options['poolclass'], sqlalchemy.pool.NullPool)
+
+    def test_connection_pool_engine(self):
+        """ It should leave pooling to the engine """
+        self.assertIsNone(self.dbsource._connection_pool())
+
+    def test_connection_other_thread(self):
+        """ It should query from several threads in turn """
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            self.dbsource.execute('SELECT COUNT(*) FROM items'),
+        ))
+        thread.start()
+        thread.join()
+        results.append(self.dbsource.execute('SELECT COUNT(*) FROM items'))
+        self.assertEqual(results, [[(3, )], [(3, )]])
+
+    def test_engine_cache_queries(self):
+        """ It should run every query on the engine created once """
+        engine = self.dbsource._get_sqlalchemy_engine()
+        with mock.patch('%s.create_engine' % ADAPTER) as create_engine:
+            for _i in range(20):
+                self.dbsource.execute(
+                    'SELECT code FROM items WHERE id = ?', (1, ),
+                )
+        create_engine.assert_not_called()
+        self.assertIs(self.dbsource._get_sqlalchemy_engine(), engine)
+
+    @unittest.skipUnless(BENCHMARK, 'Set DBSOURCE_BENCHMARK to run it')
+    def test_benchmark_engine_cache(self):
+        """ It should run queries faster than with a new engine each time """
+        query = 'SELECT code FROM items WHERE id = ?'
+        iterations = 200
+
+        def create_engine():
+            return sqlalchemy.create_engine(self.dbsource.conn_string_full)
+
+        start = time.time()
+        with mock.patch.object(
+            type(self.dbsource), '_get_sqlalchemy_engine',
+            side_effect=create_engine,
+        ):
+            for _i in range(iterations):
+                self.dbsource.execute(query, (1, ))
+        uncached = (time.time() - start) / iterations
+        start = time.time()
+        for _i in range(iterations):
+            self.dbsource.execute(query, (1, ))
+        cached = (time.time() - start) / iterations
+        _logger.info(
+            'SQLite per-query latency: %.3f ms with a new engine, '
+            '%.3f ms with the cached engine.', uncached * 1000, cached * 1000,
+        )
+        self.assertLess(cached, uncached)
+
+
+class TestSqlalchemyExecute(SqliteFileCase):
+
+    def test_execute_without_rows(self):
+        """ It should return no rows for statements that return none """
+        self.assertEqual(
+            self.dbsource.execute("UPDATE items SET code = 'X'"), [],
+        )
+
+    def test_execute_iter(self):
+        """ It should stream rows by batch """
+        rows = self.dbsource.execute_iter(
+            'SELECT id, code FROM items ORDER BY id', batch_size=2,
+        )
+        self.assertEqual(rows.cols, ['id', 'code'])
+        self.assertEqual(
+            [list(batch) for batch in rows.batches()],
+            [[(1, 'A'), (2, 'B')], [(3, 'C')]],
+        )
+
+    def test_execute_iter_params(self):
+        """ It should pass parameters to the query """
+        rows = self.dbsource.execute_iter(
+            'SELECT code FROM items WHERE id > ?', (1, ),
+        )
+        self.assertEqual([tuple(r) for r in rows], [('B', ), ('C', )])
+
+    def test_execute_iter_close(self):
+        """ It should release the connection when closed early """
+        with mock.patch.object(
+            type(self.dbsource), 'connection_close',
+        ) as close:
+            with self.dbsource.execute_iter('SELECT * FROM items') as rows:
+                next(rows)
+            close.assert_called_once()
+
+    def test_execute_many(self):
+        """ It should insert every parameter set """
+        count = self.dbsource.execute_many(
+            'INSERT INTO items (code) VALUES (?)',
+            (('X%d' % i, ) for i in range(5)), page_size=2,
+        )
+        self.assertEqual(count, 5)
+        self.assertEqual(
+            self.dbsource.execute('SELECT COUNT(*) FROM items')[0][0], 8,
+        )
+
+    def test_execute_many_rollback(self):
+        """ It should roll back every page on failure """
+        with self.assertRaises(Exception):
+            self.dbsource.execute_many(
+                'INSERT INTO items (id, code) VALUES (?, ?)',
+                [(10, 'X'), (11, 'Y'), (1, 'duplicate')], page_size=2,
+            )
+        self.assertEqual(
+            self.dbsource.execute('SELECT COUNT(*) FROM items')[0][0], 3,
+        )
+
+    def test_copy_from_rows(self):
+        """ It should fall back to inserts for rows """
+        count = self.dbsource.copy_from(
+            'items', iter([('D', ), ('E', )]), columns=['code'],
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            self.dbsource.execute('SELECT code FROM items WHERE id > 3'),
+            [('D', ), ('E', )],
+        )
+
+    def test_copy_from_file(self):
+        """ It should fall back to inserts for CSV files """
+        self.dbsource.copy_from('items', io.StringIO('10,"D"\n11,\n'))
+        self.assertEqual(
+            self.dbsource.execute('SELECT * FROM items WHERE id >= 10'),
+            [(10, 'D'), (11, None)],
+        )
+
+    def test_copy_to(self):
+        """ It should fall back to writing CSV rows """
+        output = io.StringIO()
+        count = self.dbsource.copy_to(
+            'SELECT id, code FROM items WHERE id < :max', output, {'max': 3},
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(output.getvalue(), '1,A\n2,B\n')
+
+    def test_remote_search(self):
+        """ It should filter, order and limit rows on the remote """
+        self.dbsource.change_table('items')
+        records = self.dbsource.remote_search(
+            ['|', ('code', '=', 'A'), ('code', 'ilike', 'c')],
+            fields=['code'], order='id desc', limit=1,
+        )
+        self.assertEqual(list(records), [{'code': 'C'}])
+
+    def test_remote_search_offset(self):
+        """ It should skip rows without a limit """
+        self.dbsource.change_table('items')
+        records = self.dbsource.remote_search([], order='id', offset=2)
+        self.assertEqual(list(records), [{'id': 3, 'code': 'C'}])
+
+    def test_remote_search_count(self):
+        """ It should count the matching rows """
+        self.dbsource.change_table('items')
+        self.assertEqual(
+            self.dbsource.remote_search([('id', 'in', [1, 2])], count=True),
+            2,
+        )
+
+    def test_remote_read_group(self):
+        """ It should aggregate groups and date periods on the remote """
+        self.dbsource.execute(
+            'CREATE TABLE sales (state TEXT, amount INTEGER, date TEXT)',
+        )
+        self.dbsource.execute(
+            "INSERT INTO sales VALUES ('done', 10, '2018-01-15'), "
+            "('done', 5, '2018-05-03'), ('draft', 7, '2018-05-20'), "
+            "(NULL, 1, NULL)",
+        )
+        self.dbsource.change_table('sales')
+        groups = self.dbsource.remote_read_group(
+            [], ['amount:sum'], ['date:quarter', 'state'], lazy=False,
+        )
+        self.assertEqual(
+            [(g['date:quarter'], g['state'], g['__count'], g['amount'])
+             for g in groups],
+            [(False, False, 1, 1), ('Q1 2018', 'done', 1, 10),
+             ('Q2 2018', 'done', 1, 5), ('Q2 2018', 'draft', 1, 7)],
+        )
+        self.assertEqual(groups[2]['__domain'], [
+            '&', '&', ('date', '>=', '2018-04-01'),
+            ('date', '<', '2018-07-01'), ('state', '=', 'done'),
+        ])
+
+    def test_remote_browse(self):
+        """ It should browse IDs by chunks over one connection """
+        self.dbsource.change_table('items')
+        with mock.patch.object(
+            type(self.dbsource), 'connection_open',
+            wraps=self.dbsource.connection_open,
+        ) as connection_open:
+            records = self.dbsource.remote_browse(
+                iter([3, 1, 4]), fields=['code'], chunk_size=2,
+            )
+            self.assertEqual(
+                sorted(r['code'] for r in records), ['A', 'C'],
+            )
+            connection_open.assert_called_once()
+
+    def test_remote_chunk_size_sqlite(self):
+        """ It should respect the bound parameter limit of SQLite """
+        self.assertEqual(self.dbsource._remote_chunk_size(5000, 2), 997)
+
+    def test_remote_update(self):
+        """ It should update the records and return them """
+        self.dbsource.change_table('items')
+        records = self.dbsource.remote_update(
+            [1, 3, 5], {'code': 'Z'}, chunk_size=1,
+        )
+        self.assertEqual(
+            sorted(r['id'] for r in records if r['code'] == 'Z'), [1, 3],
+        )
+        self.assertEqual(
+            self.dbsource.execute('SELECT code FROM items ORDER BY id'),
+            [('Z', ), ('B', ), ('Z', )],
+        )
+
+    def test_remote_update_closed(self):
+        """ It should roll back the update when not consumed entirely """
+        self.dbsource.change_table('items')
+        records = self.dbsource.remote_update(
+            [1, 3], {'code': 'Z'}, chunk_size=1,
+        )
+        self.assertEqual(next(records)['code'], 'Z')
+        records.close()
+        self.assertEqual(
+            self.dbsource.execute('SELECT code FROM items ORDER BY id'),
+            [('A', ), ('B', ), ('C', )],
+        )
+
+    def test_remote_delete(self):
+        """ It should delete the records and tell which ones existed """
+        self.dbsource.change_table('items')
+        statuses = self.dbsource.remote_delete([2, 7, 3], chunk_size=2)
+        self.assertEqual(list(statuses), [True, False, True])
+        self.assertEqual(
+            self.dbsource.execute('SELECT id FROM items'), [(1, )],
+        )
+
+    def test_remote_delete_rollback(self):
+        """ It should roll back every chunk on failure """
+        self.dbsource.change_table('items')
+        original = type(self.dbsource)._execute_connection
+        calls = []
+
+        def execute_connection(record, *args):
+            calls.append(args)
+            if len(calls) > 2:
+                raise RuntimeError('Connection lost')
+            return original(record, *args)
+
+        with mock.patch.object(
+            type(self.dbsource), '_execute_connection', execute_connection,
+        ):
+            with self.assertRaises(RuntimeError):
+                self.dbsource.remote_delete([1, 2, 3], chunk_size=2)
+        self.assertEqual(
+            self.dbsource.execute('SELECT COUNT(*) FROM items')[0][0], 3,
+        )
+
+    def test_remote_paginate(self):
+        """ It should resume each page after the previous one """
+        self.dbsource.change_table('items')
+        records, token = self.dbsource.remote_paginate('id', page_size=2)
+        self.assertEqual([r['id'] for r in records], [1, 2])
+        records, token = self.dbsource.remote_paginate(
+            'id', page_size=2, after=token, fields=['code'],
+        )
+        self.assertEqual(records, [{'code': 'C', 'id': 3}])
+        records, last_token = self.dbsource.remote_paginate(
+            'id', page_size=2, after=token,
+        )
+        self.assertEqual((records, last_token), ([], token))
+        self.dbsource.execute("INSERT INTO items (code) VALUES ('D')")
+        records, token = self.dbsource.remote_paginate(
+            'id', page_size=2, after=token,
+        )
+        self.assertEqual([r['code'] for r in records], ['D'])
+
+    def test_remote_paginate_composite(self):
+        """ It should page on composite keys in any direction """
+        self.dbsource.execute("UPDATE items SET code = 'A' WHERE id = 3")
+        self.dbsource.change_table('items')
+        order = 'code desc, id'
+        records, token = self.dbsource.remote_paginate(order, page_size=2)
+        self.assertEqual([r['id'] for r in records], [2, 1])
+        records, token = self.dbsource.remote_paginate(
+            order, page_size=2, after=token,
+        )
+        self.assertEqual([r['id'] for r in records], [3])
+
+    def test_remote_paginate_qualified(self):
+        """ It should page on columns qualified by the table """
+        self.dbsource.change_table('items')
+        records, token = self.dbsource.remote_paginate(
+            'items.id', page_size=2, fields=['code'],
+        )
+        self.assertEqual(records, [
+            {'code': 'A', 'id': 1}, {'code': 'B', 'id': 2},
+        ])
+        records, token = self.dbsource.remote_paginate(
+            'items.id', page_size=2, after=token, fields=['code', 'id'],
+        )
+        self.assertEqual(records, [{'code': 'C', 'id': 3}])
+
+    def _partition_worker(self, dbsource_id, query, params, batch_size,
+                          statement_timeout):
+        # Worker cursors would not see the data source of the test
+        with self.dbsource.execute_iter(query, params, batch_size) as rows:
+            yield rows.cols
+            yield from rows.batches()
+
+    def test_execute_partitioned(self):
+        """ It should read disjoint key ranges concurrently """
+        self.dbsource.execute(
+            "INSERT INTO items (code) VALUES ('D'), ('E'), ('F'), ('G')",
+        )
+        for key, split, counts in (('id', 'range', [1, 2, 3]),
+                                   ('code', 'quantiles', [2, 2, 2])):
+            with mock.patch.object(
+                type(self.dbsource), '_execute_partition_worker',
+                side_effect=self._partition_worker,
+            ), self.dbsource.execute_partitioned(
+                'items', key, partitions=3, columns=['code'],
+                where=[('code', '!=', 'B')], split=split, batch_size=1,
+            ) as rows:
+                self.assertEqual(sorted(row[0] for row in rows), [
+                    'A', 'C', 'D', 'E', 'F', 'G',
+                ])
+                self.assertEqual([p.rows for p in rows.partitions], counts)
+
+    def test_session(self):
+        """ It should commit the statements of a session together """
+        with self.dbsource.session() as session:
+            session.execute("INSERT INTO items (code) VALUES ('D')")
+            self.dbsource.change_table('items')
+            list(session.remote_delete([1]))
+        self.assertEqual(
+            self.dbsource.execute('SELECT code FROM items ORDER BY id'),
+            [('B', ), ('C', ), ('D', )],
+        )
+
+    def test_session_rollback(self):
+        """ It should roll back every statement of a failed session """
+        with self.assertRaises(ZeroDivisionError):
+            with self.dbsource.session() as session:
+                session.execute_many(
+                    'INSERT INTO items (code) VALUES (?)', [('D', )],
+                )
+                session.execute("DELETE FROM items WHERE code = 'A'")
+                1 / 0
+        self.assertEqual(
+            self.dbsource.execute('SELECT COUNT(*) FROM items')[0][0], 3,
+        )
+
+    def test_statement_timeout(self):
+        """ It should interrupt queries running longer than the timeout """
+        query = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) '
+            'SELECT COUNT(*) FROM n'
+        )
+        with self.assertRaises(StatementTimeoutError):
+            self.dbsource.execute(query, statement_timeout=50)
+        self.assertEqual(
+            self.dbsource.execute('SELECT COUNT(*) FROM items')[0][0], 3,
+        )
+
+    def test_statement_timeout_iter_consumer(self):
+        """ It should not count the time spent between batches """
+        query = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n '
+            'WHERE i < 5000) SELECT i FROM n'
+        )
+        count = 0
+        with self.dbsource.execute_iter(
+            query, batch_size=1000, statement_timeout=50,
+        ) as rows:
+            for batch in rows.batches():
+                time.sleep(0.1)
+                count += len(batch)
+        self.assertEqual(count, 5000)
+
+    def test_statement_timeout_iter(self):
+        """ It should interrupt slow fetches of an iteration """
+        query = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) '
+            'SELECT i FROM n WHERE i % 10000000 = 0'
+        )
+        with self.assertRaises(StatementTimeoutError):
+            with self.dbsource.execute_iter(
+                query, statement_timeout=50,
+            ) as rows:
+                list(rows)
+
+    def test_execute_records(self):
+        """ It should return rows read by column name """
+        rows = self.dbsource.execute(
+            'SELECT id, code FROM items ORDER BY id', result_format='records',
+        )
+        self.assertEqual([(r.id, r['code']) for r in rows][0], (1, 'A'))
+
+    def test_execute_result_formats(self):
+        """ It should return the same values in every result format """
+        query = 'SELECT id, code FROM items ORDER BY id'
+        self.assertEqual(
+            self.dbsource.execute(query, result_format='tuples'),
+            [(1, 'A'), (2, 'B'), (3, 'C')],
+        )
+        records = self.dbsource.execute(query, result_format='records')
+        self.assertEqual([tuple(r) for r in records],
+                         [(1, 'A'), (2, 'B'), (3, 'C')])
+        columns = self.dbsource.execute(query, result_format='columns')
+        self.assertEqual(list(columns['id']), [1, 2, 3])
+        self.assertEqual(columns['code'], ['A', 'B', 'C'])
+
+    @unittest.skipIf(result.numpy is None, 'NumPy is not installed')
+    def test_execute_numpy(self):
+        """ It should return numeric columns as NumPy arrays """
+        res = self.dbsource.execute(
+            'SELECT id, code FROM items ORDER BY id', result_format='numpy',
+        )
+        self.assertEqual(res['id'].tolist(), [1, 2, 3])
+        self.assertEqual(list(res['code']), ['A', 'B', 'C'])
+
+    def test_execute_columns(self):
+        """ It should return values by column """
+        res = self.dbsource.execute(
+            'SELECT id, code FROM items ORDER BY id',
+            metadata=True, result_format='columns',
+        )
+        self.assertEqual(res['cols'], ['id', 'code'])
+        self.assertEqual(list(res['rows']['id']), [1, 2, 3])
+        self.assertEqual(res['rows']['code'], ['A', 'B', 'C'])
+
+    @unittest.skipUnless(BENCHMARK, 'Set DBSOURCE_BENCHMARK to run it')
+    def test_benchmark_result_formats(self):
+        """ It should hold large results in less memory than dicts """
+        rows = self.dbsource.execute(
+            'WITH RECURSIVE n(i) AS '
+            '(SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT 1000000) '
+            "SELECT i AS id, 'code' || i AS code, i * 0.5 AS amount FROM n",
+        )
+        rows = [tuple(row) for row in rows]
+        cols = ['id', 'code', 'amount']
+        builders = [
+            ('dicts', lambda: [dict(zip(cols, row)) for row in rows]),
+            ('records', lambda: result.to_records(rows, cols)),
+            ('columns', lambda: result.to_columns(rows, cols)),
+        ]
+        sizes = {}
+        for name, builder in builders:
+            # Values are shared with the rows, only containers are counted
+            tracemalloc.start()
+            try:
+                res = builder()
+                sizes[name] = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            del res
+        _logger.info(
+            'Memory of 1M SQLite rows beyond their values: %.1f MB as '
+            'dicts, %.1f MB as records, %.1f MB as columns.',
+            sizes['dicts'] / 1e6, sizes['records'] / 1e6,
+            sizes['columns'] / 1e6,
+        )
+        self.assertLess(sizes['records'], sizes['dicts'] / 2)
+        self.assertLess(sizes['columns'], sizes['records'])
+
+    def test_execute_spill(self):
+        """ It should spill the rows beyond the memory limit to disk """
+        rows = self.dbsource.execute(
+            'SELECT code FROM items ORDER BY id', max_memory_bytes=1,
+        )
+        self.assertTrue(rows.spilled)
+        self.assertEqual(list(rows), [('A', ), ('B', ), ('C', )])